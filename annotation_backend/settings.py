@@ -107,4 +107,111 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
-}
\ No newline at end of file
+}
+# AI processing
+# Default number of concurrent calls per provider; override per provider
+# with the "max_concurrency" key of AIProvider.config.
+AI_PROVIDER_CONCURRENCY = env.int('AI_PROVIDER_CONCURRENCY', default=4)
+# Lease held by a run_ai_worker process on the jobs it claimed; workers
+# heartbeat every third of it, and expired leases are reclaimed.
+AI_JOB_LEASE_SECONDS = env.int('AI_JOB_LEASE_SECONDS', default=300)
+AI_JOB_MAX_ATTEMPTS = env.int('AI_JOB_MAX_ATTEMPTS', default=3)
+# Adapter used for AIProvider.service_name values without a registered
+# adapter (see products/ai_providers.py).
+AI_DEFAULT_ADAPTER = env('AI_DEFAULT_ADAPTER', default='simulated')
+# Response cache shared by all workers; a provider opts out with
+# "cache": false in AIProvider.config.
+AI_CACHE_ENABLED = env.bool('AI_CACHE_ENABLED', default=True)
+AI_CACHE_TTL_SECONDS = env.int('AI_CACHE_TTL_SECONDS', default=7 * 24 * 3600)
+AI_CACHE_MAX_ENTRIES = env.int('AI_CACHE_MAX_ENTRIES', default=100000)
+# Each worker trims the cache to AI_CACHE_MAX_ENTRIES at most this often.
+AI_CACHE_EVICT_INTERVAL_SECONDS = env.int('AI_CACHE_EVICT_INTERVAL_SECONDS', default=300)
+# Retries for provider calls that were rate limited or timed out; request
+# and token budgets come from "requests_per_min"/"tokens_per_min" in
+# AIProvider.config (see products/ai_limits.py).
+AI_PROVIDER_MAX_RETRIES = env.int('AI_PROVIDER_MAX_RETRIES', default=3)
+# Products committed per checkpoint while a batch runs, and how long an
+# in-progress AI batch may go without a checkpoint before the reaper
+# (reap_ai_batches) treats it as abandoned.
+AI_CHECKPOINT_PRODUCTS = env.int('AI_CHECKPOINT_PRODUCTS', default=10)
+# AI passes a product gets while provider calls for it keep failing; after
+# the last one it is marked ai_done with the answers it has.
+AI_PRODUCT_MAX_ATTEMPTS = env.int('AI_PRODUCT_MAX_ATTEMPTS', default=3)
+AI_STALE_BATCH_SECONDS = env.int('AI_STALE_BATCH_SECONDS', default=900)
+# Minimum seconds between progress writes (and stream events) per batch.
+AI_PROGRESS_INTERVAL = env.float('AI_PROGRESS_INTERVAL', default=1.0)
+# Progress stream (products/progress.py): lifetime of the ?token= handed out
+# for EventSource clients, and of one stream, which holds a worker thread.
+AI_STREAM_TOKEN_SECONDS = env.int('AI_STREAM_TOKEN_SECONDS', default=60)
+AI_STREAM_MAX_SECONDS = env.int('AI_STREAM_MAX_SECONDS', default=300)
+# AI backlog priority (see Product.refresh_priorities): new products get a
+# bonus, price adds one point per step up to a cap, and a share of every
+# claim goes to the oldest pending work so low priorities never starve.
+AI_PRIORITY_NEW_DAYS = env.int('AI_PRIORITY_NEW_DAYS', default=30)
+AI_PRIORITY_NEW_BONUS = env.int('AI_PRIORITY_NEW_BONUS', default=50)
+AI_PRIORITY_PRICE_STEP = env.int('AI_PRIORITY_PRICE_STEP', default=10)
+AI_PRIORITY_PRICE_CAP = env.int('AI_PRIORITY_PRICE_CAP', default=50)
+AI_PRIORITY_AGING_SHARE = env.float('AI_PRIORITY_AGING_SHARE', default=0.2)
+# Adaptive AI batch sizing (products/ai_batching.py): sizes stay within
+# [AI_BATCH_MIN_SIZE, AI_BATCH_MAX_SIZE] and aim for batches of about
+# AI_BATCH_TARGET_SECONDS; providers failing above AI_BATCH_ERROR_THRESHOLD
+# or DB writes above AI_BATCH_DB_SHARE of the time add a delay between
+# batches, up to AI_BATCH_MAX_DELAY seconds.
+AI_BATCH_MIN_SIZE = env.int('AI_BATCH_MIN_SIZE', default=5)
+AI_BATCH_MAX_SIZE = env.int('AI_BATCH_MAX_SIZE', default=100)
+AI_BATCH_INITIAL_SIZE = env.int('AI_BATCH_INITIAL_SIZE', default=10)
+AI_BATCH_TARGET_SECONDS = env.float('AI_BATCH_TARGET_SECONDS', default=10.0)
+AI_BATCH_ERROR_THRESHOLD = env.float('AI_BATCH_ERROR_THRESHOLD', default=0.1)
+AI_BATCH_DB_SHARE = env.float('AI_BATCH_DB_SHARE', default=0.5)
+AI_BATCH_MAX_DELAY = env.float('AI_BATCH_MAX_DELAY', default=30.0)
+# Consensus strategy for AI suggestions: weighted_majority, calibrated or
+# dawid_skene (see products/consensus.py).
+AI_CONSENSUS_METHOD = env('AI_CONSENSUS_METHOD', default='weighted_majority')
+# dawid_skene falls back to weighted_majority with fewer votes than this per
+# provider in a batch.
+AI_DAWID_SKENE_MIN_ITEMS = env.int('AI_DAWID_SKENE_MIN_ITEMS', default=20)
+# Tail-latency protection for provider calls (products/ai_pipeline.py):
+# calls are given up after the provider's deadline, hedged to its
+# "backup_provider" once slower than its observed AI_HEDGE_QUANTILE latency
+# (after AI_HEDGE_MIN_SAMPLES calls), and skipped for
+# AI_BREAKER_RESET_SECONDS after AI_BREAKER_FAILURES consecutive failures.
+# Providers override these with "deadline_seconds", "breaker_failures" and
+# "breaker_reset_seconds" in AIProvider.config.
+AI_PROVIDER_DEADLINE_SECONDS = env.float('AI_PROVIDER_DEADLINE_SECONDS', default=60.0)
+AI_HEDGE_QUANTILE = env.float('AI_HEDGE_QUANTILE', default=0.95)
+AI_HEDGE_MIN_SAMPLES = env.int('AI_HEDGE_MIN_SAMPLES', default=20)
+AI_BREAKER_FAILURES = env.int('AI_BREAKER_FAILURES', default=5)
+AI_BREAKER_RESET_SECONDS = env.float('AI_BREAKER_RESET_SECONDS', default=30.0)
+# Early-exit consensus: for attributes with an early_exit_threshold, ask the
+# first AI_EARLY_EXIT_AGREEING providers (by "query_order" in
+# AIProvider.config, then id) and skip the rest when they agree at or above
+# the threshold.
+AI_EARLY_EXIT = env.bool('AI_EARLY_EXIT', default=False)
+AI_EARLY_EXIT_AGREEING = env.int('AI_EARLY_EXIT_AGREEING', default=2)
+# Image prefetch (products/image_store.py): before provider calls, product
+# images are downloaded once into a content-addressed store under
+# AI_IMAGE_STORE_DIR, bounded to AI_IMAGE_STORE_MAX_BYTES by LRU eviction.
+AI_IMAGE_PREFETCH = env.bool('AI_IMAGE_PREFETCH', default=False)
+AI_IMAGE_STORE_DIR = env('AI_IMAGE_STORE_DIR', default=str(BASE_DIR / 'image_store'))
+AI_IMAGE_STORE_MAX_BYTES = env.int('AI_IMAGE_STORE_MAX_BYTES', default=1024 ** 3)
+# Each process trims the store to AI_IMAGE_STORE_MAX_BYTES at most this often.
+AI_IMAGE_STORE_EVICT_INTERVAL_SECONDS = env.int('AI_IMAGE_STORE_EVICT_INTERVAL_SECONDS', default=300)
+AI_IMAGE_MAX_BYTES = env.int('AI_IMAGE_MAX_BYTES', default=10 * 1024 * 1024)
+AI_IMAGE_FETCH_TIMEOUT = env.float('AI_IMAGE_FETCH_TIMEOUT', default=10.0)
+AI_IMAGE_PREFETCH_CONCURRENCY = env.int('AI_IMAGE_PREFETCH_CONCURRENCY', default=8)
+AI_IMAGE_RETRY_SECONDS = env.int('AI_IMAGE_RETRY_SECONDS', default=3600)
+# Image URLs must be http(s) on public addresses; only for local stand-in
+# providers may loopback and private hosts be allowed.
+AI_IMAGE_ALLOW_PRIVATE_HOSTS = env.bool('AI_IMAGE_ALLOW_PRIVATE_HOSTS', default=False)
+# History archival (products/history.py): archive_history moves inactive
+# consensus and final attribute versions older than HISTORY_RETENTION_DAYS
+# into the partitioned archive tables, HISTORY_ARCHIVE_CHUNK_SIZE rows per
+# transaction.
+HISTORY_RETENTION_DAYS = env.int('HISTORY_RETENTION_DAYS', default=90)
+HISTORY_ARCHIVE_CHUNK_SIZE = env.int('HISTORY_ARCHIVE_CHUNK_SIZE', default=5000)
+# Attribute applicability (products/taxonomy.py) is served from an in-process
+# snapshot of the mappings. Each process checks the shared version stamp at
+# most every TAXONOMY_CHECK_SECONDS (the bound on staleness after a change)
+# and reloads at least every TAXONOMY_MAX_AGE_SECONDS.
+TAXONOMY_CHECK_SECONDS = env.float('TAXONOMY_CHECK_SECONDS', default=2.0)
+TAXONOMY_MAX_AGE_SECONDS = env.int('TAXONOMY_MAX_AGE_SECONDS', default=300)
@@ -4,7 +4,7 @@ from .models import *
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'created_at']
+    list_display = ['name', 'ai_priority_weight', 'created_at']
     search_fields = ['name']
     readonly_fields = ['created_at', 'updated_at']
 
@@ -19,14 +19,18 @@ class SubCategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'external_sku', 'category', 'subcategory', 'status', 'created_at']
+    list_display = ['name', 'external_sku', 'category', 'subcategory', 'status', 'priority', 'created_at']
     list_filter = ['status', 'category', 'subcategory', 'created_at']
     search_fields = ['name', 'external_sku', 'description']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['priority', 'created_at', 'updated_at']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        Product.refresh_priorities([obj.id])
 
 @admin.register(Attribute)
 class AttributeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'data_type', 'created_at']
+    list_display = ['name', 'data_type', 'early_exit_threshold', 'created_at']
     list_filter = ['data_type']
     readonly_fields = ['created_at', 'updated_at']
 
@@ -81,4 +85,45 @@ class FinalAttributeAdmin(admin.ModelAdmin):
     list_display = ['product', 'attribute', 'final_value', 'source', 'decided_by', 'created_at']
     list_filter = ['source']
     readonly_fields = ['created_at']
-    search_fields = ['product__name', 'attribute__name']
\ No newline at end of file
+    search_fields = ['product__name', 'attribute__name']
+
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    list_display = ['product', 'batch', 'status', 'attempts', 'lease_owner', 'lease_expires_at', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'updated_at']
+    search_fields = ['product__name', 'lease_owner']
+    raw_id_fields = ['product', 'batch']
+    list_per_page = 50
+
+@admin.register(AIResponseCache)
+class AIResponseCacheAdmin(admin.ModelAdmin):
+    list_display = ['key', 'model', 'suggested_value', 'hit_count', 'last_used_at', 'expires_at']
+    list_filter = ['model']
+    readonly_fields = ['created_at']
+    search_fields = ['key', 'suggested_value']
+    list_per_page = 50
+
+@admin.register(StoredImage)
+class StoredImageAdmin(admin.ModelAdmin):
+    list_display = ['sha256', 'size', 'content_type', 'last_used_at', 'created_at']
+    readonly_fields = ['created_at']
+    search_fields = ['sha256']
+
+@admin.register(ProductImage)
+class ProductImageAdmin(admin.ModelAdmin):
+    list_display = ['product', 'url', 'image', 'error', 'fetched_at']
+    search_fields = ['product__name', 'url']
+    raw_id_fields = ['product', 'image']
+
+@admin.register(AIBatchStats)
+class AIBatchStatsAdmin(admin.ModelAdmin):
+    list_display = ['batch', 'products', 'provider_calls', 'provider_errors', 'elapsed_seconds', 'slowest_stage', 'created_at']
+    readonly_fields = ['stages']
+    raw_id_fields = ['batch']
+    list_per_page = 50
+
+@admin.register(AttributeVersionHead)
+class AttributeVersionHeadAdmin(admin.ModelAdmin):
+    list_display = ['product', 'attribute', 'consensus_version', 'final_version']
+    raw_id_fields = ['product', 'attribute']
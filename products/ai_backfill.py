@@ -0,0 +1,162 @@
+"""
+Incremental backfill for a newly activated AI provider.
+
+Products that are already past AI processing only lack the new provider's
+suggestions. For each chunk of such products a single set-difference query
+finds the applicable (product, attribute) pairs without a suggestion from the
+provider; only those are requested, from that provider alone, and consensus
+is recomputed only for the pairs that received a new suggestion, from every
+stored suggestion of the active providers.
+
+Applicability follows CategoryAttributeMapping: the category-wide mappings
+plus those of the product's subcategory, or every attribute when none apply.
+"""
+import time
+
+from django.db import connection, transaction
+
+from .ai_pipeline import run_cached_provider_calls
+from .ai_providers import ProviderCall, get_adapter
+from .consensus import Vote, compute_consensus, mark_missing_providers
+from .models import Product, Attribute, CategoryAttributeMapping, AIProvider, AISuggestion, AIConsensus
+
+# Products still waiting for (or in) a regular AI run get every active provider anyway.
+BACKFILL_EXCLUDED_STATUSES = ('pending_ai', 'ai_running')
+
+
+def missing_pairs(provider, product_ids):
+    """(product_id, attribute_id) pairs of ``product_ids`` without a suggestion from ``provider``."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH targets AS (
+                SELECT id, category_id, subcategory_id
+                FROM {Product._meta.db_table}
+                WHERE id = ANY(%s::bigint[])
+            ),
+            mapped AS (
+                SELECT DISTINCT t.id AS product_id, m.attribute_id
+                FROM targets AS t
+                JOIN {CategoryAttributeMapping._meta.db_table} AS m
+                  ON m.category_id = t.category_id
+                 AND (m.subcategory_id IS NULL OR m.subcategory_id = t.subcategory_id)
+            ),
+            applicable AS (
+                SELECT product_id, attribute_id FROM mapped
+                UNION ALL
+                SELECT t.id, a.id
+                FROM targets AS t
+                CROSS JOIN {Attribute._meta.db_table} AS a
+                WHERE NOT EXISTS (SELECT 1 FROM mapped WHERE mapped.product_id = t.id)
+            )
+            SELECT product_id, attribute_id FROM applicable
+            EXCEPT
+            SELECT product_id, attribute_id
+            FROM {AISuggestion._meta.db_table}
+            WHERE provider_id = %s
+              AND product_id = ANY(%s::bigint[])
+            ORDER BY 1, 2
+            """,
+            [product_ids, provider.id, product_ids]
+        )
+        return cursor.fetchall()
+
+
+def stored_votes(pairs, provider_ids):
+    """Votes of every stored suggestion of ``provider_ids`` for the given pairs."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT s.product_id, s.attribute_id, s.provider_id, s.suggested_value, s.confidence_score
+            FROM {AISuggestion._meta.db_table} AS s
+            JOIN unnest(%s::bigint[], %s::bigint[]) AS p(product_id, attribute_id)
+              ON s.product_id = p.product_id AND s.attribute_id = p.attribute_id
+            WHERE s.provider_id = ANY(%s::bigint[])
+              AND s.suggested_value IS NOT NULL
+            """,
+            [[pair[0] for pair in pairs], [pair[1] for pair in pairs], list(provider_ids)]
+        )
+        return [Vote(*row) for row in cursor.fetchall()]
+
+
+def backfill_provider(provider, chunk_size=200, dry_run=False, log=print):
+    """
+    Request the suggestions ``provider`` is missing for already processed products.
+
+    Works through the products in id order, ``chunk_size`` at a time, each
+    chunk committed on its own, so an interrupted backfill resumes where it
+    stopped when run again. Returns totals: products, missing, calls, errors,
+    stored, consensus, hits, lookups, elapsed.
+    """
+    started = time.monotonic()
+    adapters = {provider.id: get_adapter(provider)}
+    provider_ids = set(AIProvider.objects.filter(is_active=True).values_list('id', flat=True)) | {provider.id}
+    products = (
+        Product.objects.exclude(status__in=BACKFILL_EXCLUDED_STATUSES)
+        .order_by('id')
+        .values_list('id', flat=True)
+    )
+
+    totals = dict.fromkeys(('products', 'missing', 'calls', 'errors', 'stored', 'consensus', 'hits', 'lookups'), 0)
+    last_id = 0
+    while True:
+        product_ids = list(products.filter(id__gt=last_id)[:chunk_size])
+        if not product_ids:
+            break
+        last_id = product_ids[-1]
+        totals['products'] += len(product_ids)
+
+        pairs = missing_pairs(provider, product_ids)
+        totals['missing'] += len(pairs)
+        if not pairs or dry_run:
+            continue
+
+        products_by_id = Product.objects.in_bulk({product_id for product_id, _ in pairs})
+        attributes_by_id = Attribute.objects.in_bulk({attribute_id for _, attribute_id in pairs})
+        calls = [
+            ProviderCall(products_by_id[product_id], attributes_by_id[attribute_id], provider)
+            for product_id, attribute_id in pairs
+        ]
+        results, hits, lookups = run_cached_provider_calls(calls, adapters)
+        totals['calls'] += len(calls)
+        totals['hits'] += hits
+        totals['lookups'] += lookups
+
+        suggestions = []
+        for result in results:
+            call = result.call
+            if result.error or result.suggested_value is None:
+                totals['errors'] += 1
+                log(f"Provider {provider.name} failed for {call.product.name} / {call.attribute.name}: "
+                    f"{result.error or 'no value returned'}")
+                continue
+            suggestions.append(AISuggestion(
+                product=call.product,
+                attribute=call.attribute,
+                provider=provider,
+                suggested_value=result.suggested_value,
+                confidence_score=result.confidence,
+                raw_response=result.raw_response
+            ))
+        if not suggestions:
+            continue
+
+        affected = sorted({(suggestion.product_id, suggestion.attribute_id) for suggestion in suggestions})
+        label_counts = {
+            attribute.id: len(attribute.allowed_values)
+            for attribute in attributes_by_id.values()
+            if isinstance(attribute.allowed_values, list)
+        }
+        with transaction.atomic():
+            # A regular run may have stored the same triple meanwhile; keep the first.
+            AISuggestion.objects.bulk_create(suggestions, ignore_conflicts=True)
+            votes = stored_votes(affected, provider_ids)
+            entries = mark_missing_providers(compute_consensus(votes, label_counts=label_counts), votes, provider_ids)
+            AIConsensus.record_many(entries)
+        totals['stored'] += len(suggestions)
+        totals['consensus'] += len(entries)
+        log(f"  up to product {last_id}: {len(suggestions)} suggestions stored, "
+            f"{len(entries)} consensus values recomputed")
+
+    totals['elapsed'] = time.monotonic() - started
+    return totals
@@ -0,0 +1,88 @@
+"""
+Adaptive sizing of AI batches.
+
+Every loop that claims AI batches keeps an ``AdaptiveBatchSizer`` and feeds it
+the stats returned by ``run_ai_batch``. The sizer tracks exponentially
+weighted averages of the time per product, the provider error rate and the
+share of time spent writing to the database, and derives:
+
+* the next batch size: as many products as fit in AI_BATCH_TARGET_SECONDS,
+  at most doubling per step, halved while providers are failing;
+* the delay before the next batch: zero while healthy, growing
+  exponentially while providers fail, and long enough to keep database
+  writes within AI_BATCH_DB_SHARE of the time otherwise.
+
+Sizes always stay within AI_BATCH_MIN_SIZE..AI_BATCH_MAX_SIZE and delays
+below AI_BATCH_MAX_DELAY.
+"""
+from django.conf import settings
+
+
+def batch_size_bounds():
+    return (
+        max(1, getattr(settings, 'AI_BATCH_MIN_SIZE', 5)),
+        max(1, getattr(settings, 'AI_BATCH_MAX_SIZE', 100)),
+    )
+
+
+class AdaptiveBatchSizer:
+
+    def __init__(self, min_size=None, max_size=None, initial_size=None, target_seconds=None,
+                 max_delay=None, error_threshold=None, db_share=None, alpha=0.3):
+        default_min, default_max = batch_size_bounds()
+        self.min_size = min_size or default_min
+        self.max_size = max(self.min_size, max_size or default_max)
+        self.target_seconds = target_seconds or getattr(settings, 'AI_BATCH_TARGET_SECONDS', 10.0)
+        self.max_delay = getattr(settings, 'AI_BATCH_MAX_DELAY', 30.0) if max_delay is None else max_delay
+        self.error_threshold = (
+            getattr(settings, 'AI_BATCH_ERROR_THRESHOLD', 0.1) if error_threshold is None else error_threshold
+        )
+        self.db_share = getattr(settings, 'AI_BATCH_DB_SHARE', 0.5) if db_share is None else db_share
+        self.alpha = alpha
+
+        self.size = self._clamp(initial_size or getattr(settings, 'AI_BATCH_INITIAL_SIZE', 10))
+        self.delay = 0.0
+        self.seconds_per_product = None
+        self.error_rate = 0.0
+        self.db_ratio = 0.0
+
+    def _clamp(self, size):
+        return max(self.min_size, min(self.max_size, int(size)))
+
+    def _ewma(self, current, sample):
+        if current is None:
+            return sample
+        return self.alpha * sample + (1 - self.alpha) * current
+
+    def record(self, stats):
+        """Update the estimates from one batch's stats and pick the next size and delay."""
+        products = stats.get('products', 0)
+        elapsed = stats.get('elapsed', 0.0)
+        if not products or elapsed <= 0:
+            return
+
+        calls = stats.get('calls', 0)
+        self.seconds_per_product = self._ewma(self.seconds_per_product, elapsed / products)
+        self.error_rate = self._ewma(self.error_rate, stats.get('errors', 0) / calls if calls else 0.0)
+        self.db_ratio = self._ewma(self.db_ratio, stats.get('db_seconds', 0.0) / elapsed)
+
+        if self.error_rate > self.error_threshold:
+            self.size = self._clamp(self.size // 2)
+            self.delay = min(self.max_delay, max(1.0, self.delay * 2))
+            return
+
+        ideal = self.target_seconds / self.seconds_per_product if self.seconds_per_product > 0 else self.max_size
+        self.size = self._clamp(min(ideal, self.size * 2))
+
+        if self.db_ratio > self.db_share:
+            # Give the database enough idle time to bring its share back to target.
+            self.delay = min(self.max_delay, elapsed * (self.db_ratio / self.db_share - 1))
+        else:
+            self.delay = self.delay / 2 if self.delay >= 0.1 else 0.0
+
+    def describe(self):
+        spp = f"{self.seconds_per_product * 1000:.0f}ms" if self.seconds_per_product is not None else 'n/a'
+        return (
+            f"next batch {self.size} products, delay {self.delay:.1f}s "
+            f"({spp}/product, {self.error_rate:.0%} errors, {self.db_ratio:.0%} db)"
+        )
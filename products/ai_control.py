@@ -0,0 +1,69 @@
+"""
+Pause/resume signalling for AI processing.
+
+Saving AIProcessingControl publishes the new state on the control channel
+(see notifications) once the transaction commits. Every process running AI
+work keeps a ``ProcessingGate`` fed by the notification listener, so workers
+block on an event instead of re-reading the control row. Publishing also
+updates the gate of the current process directly.
+"""
+import os
+import threading
+
+from .notifications import CONTROL_CHANNEL, listener, notify
+
+
+class ProcessingGate:
+    """Process-wide view of the pause flag that callers can block on."""
+
+    def __init__(self):
+        self._running = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+        listener.subscribe(CONTROL_CHANNEL, self._on_notification, on_connect=self._resync)
+
+    @property
+    def is_paused(self):
+        self.start()
+        return not self._running.is_set()
+
+    def set_paused(self, paused):
+        if paused:
+            self._running.clear()
+        else:
+            self._running.set()
+
+    def wait_until_running(self, timeout=None):
+        """Block until processing is not paused; returns False on timeout."""
+        self.start()
+        return self._running.wait(timeout)
+
+    def start(self):
+        """Load the current state and start listening; once per process."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            from .models import AIProcessingControl
+            self.set_paused(AIProcessingControl.get_control().is_paused)
+            listener.start()
+            self._pid = os.getpid()
+
+    def _on_notification(self, payload):
+        self.set_paused(payload == 'paused')
+
+    def _resync(self, cursor):
+        # A change may have been missed while the listener was disconnected.
+        cursor.execute('SELECT is_paused FROM ai_processing_control WHERE id = 1')
+        row = cursor.fetchone()
+        self.set_paused(bool(row and row[0]))
+
+
+processing_gate = ProcessingGate()
+
+
+def publish_control_state(is_paused, using='default'):
+    """Deliver a pause/resume to this process and to all others."""
+    processing_gate.set_paused(is_paused)
+    notify(CONTROL_CHANNEL, 'paused' if is_paused else 'running', using=using)
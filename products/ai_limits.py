@@ -0,0 +1,254 @@
+"""
+Client-side rate limiting for AI providers.
+
+Each AIProvider gets a ``ProviderLimiter`` built from its config JSON:
+
+    requests_per_min   request budget (token bucket), optional
+    tokens_per_min     token budget (token bucket), optional
+    max_concurrency    ceiling for in-flight calls (AI_PROVIDER_CONCURRENCY)
+    min_concurrency    floor the adaptive limit never drops below (1)
+    target_latency_ms  latency considered healthy; defaults to twice the
+                       best latency observed so far
+    breaker_failures   consecutive failures that open the circuit
+                       (AI_BREAKER_FAILURES)
+    breaker_reset_seconds
+                       how long an open circuit skips the provider before
+                       letting one trial call through (AI_BREAKER_RESET_SECONDS)
+
+The concurrency limit follows AIMD: it is halved when the provider throttles
+us or times out and grows by one after a full window of healthy calls. The
+limiter also keeps a window of recent call latencies, from which the pipeline
+reads the p95 that triggers hedged requests.
+Limiters live for the whole process, so what they learn carries over from
+one batch to the next.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate`` tokens per second."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount):
+        # Allow a burst of one second's worth of budget.
+        return cls(amount / 60, amount / 60)
+
+    def acquire(self, amount=1):
+        """
+        Take ``amount`` tokens, sleeping until they are available; returns the wait.
+
+        Tokens are reserved before sleeping, so requests larger than the bucket
+        still go through (the bucket runs into debt) and waiters are served in
+        arrival order.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveConcurrency:
+    """Concurrency limit with additive increase and multiplicative decrease."""
+
+    def __init__(self, maximum, minimum=1, initial=None):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = initial if initial is not None else self.maximum
+        self.in_flight = 0
+        self._healthy_streak = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self, healthy):
+        with self._condition:
+            if not healthy:
+                self._healthy_streak = 0
+                return
+            self._healthy_streak += 1
+            if self._healthy_streak >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self._healthy_streak = 0
+                self._condition.notify()
+
+    def on_backoff(self):
+        with self._condition:
+            self.limit = max(self.minimum, self.limit // 2)
+            self._healthy_streak = 0
+
+
+class CircuitBreaker:
+    """
+    Skips a provider that keeps failing.
+
+    After ``failures`` consecutive failures the circuit opens and ``allow``
+    refuses calls for ``reset_seconds``. Then a single trial call is let
+    through (half-open): success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failures, reset_seconds):
+        self.failures = max(1, failures)
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return 'open'
+            return 'half_open'
+
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_seconds or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self._trial_running or self.consecutive_failures >= self.failures:
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class ProviderLimiter:
+    """Request/token budgets, adaptive concurrency and circuit breaker for one provider."""
+
+    # Recent call latencies kept for the hedging quantile.
+    LATENCY_WINDOW = 200
+
+    def __init__(self, config, default_concurrency):
+        self.requests = self._bucket(config.get('requests_per_min'))
+        self.tokens = self._bucket(config.get('tokens_per_min'))
+        maximum = self._int(config.get('max_concurrency'), default_concurrency)
+        self.concurrency = AdaptiveConcurrency(
+            maximum=maximum,
+            minimum=self._int(config.get('min_concurrency'), 1)
+        )
+        self.target_latency = None
+        if config.get('target_latency_ms'):
+            self.target_latency = float(config['target_latency_ms']) / 1000
+        self.best_latency = None
+        self.latencies = deque(maxlen=self.LATENCY_WINDOW)
+        self.breaker = CircuitBreaker(
+            failures=self._int(config.get('breaker_failures'), getattr(settings, 'AI_BREAKER_FAILURES', 5)),
+            reset_seconds=float(
+                config.get('breaker_reset_seconds') or getattr(settings, 'AI_BREAKER_RESET_SECONDS', 30.0)
+            )
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _int(value, default):
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _bucket(per_minute):
+        try:
+            per_minute = float(per_minute)
+        except (TypeError, ValueError):
+            return None
+        return TokenBucket.per_minute(per_minute) if per_minute > 0 else None
+
+    def acquire(self, estimated_tokens=0):
+        """Wait for a concurrency slot and for budget in both buckets."""
+        self.concurrency.acquire()
+        try:
+            if self.requests:
+                self.requests.acquire(1)
+            if self.tokens and estimated_tokens:
+                self.tokens.acquire(estimated_tokens)
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self, latency=None, throttled=False):
+        """Give the slot back and feed the outcome into the concurrency limit."""
+        if throttled:
+            self.concurrency.on_backoff()
+        elif latency is not None:
+            self.concurrency.on_success(self._is_healthy(latency))
+        self.concurrency.release()
+
+    def latency_quantile(self, quantile, min_samples=1):
+        """Observed call latency at ``quantile``, or None with fewer than ``min_samples`` calls."""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if not samples or len(samples) < min_samples:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(quantile * len(samples)) - 1)]
+
+    def _is_healthy(self, latency):
+        with self._lock:
+            self.latencies.append(latency)
+            if self.best_latency is None or latency < self.best_latency:
+                self.best_latency = latency
+            target = self.target_latency or 2 * self.best_latency
+        return latency <= target
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider):
+    """Process-wide limiter for ``provider``; rebuilt when its config changes."""
+    config = provider.config if isinstance(provider.config, dict) else {}
+    default_concurrency = getattr(settings, 'AI_PROVIDER_CONCURRENCY', 4)
+    signature = repr(sorted(
+        (key, config.get(key)) for key in (
+            'requests_per_min', 'tokens_per_min', 'max_concurrency',
+            'min_concurrency', 'target_latency_ms', 'breaker_failures',
+            'breaker_reset_seconds'
+        )
+    ))
+    with _limiters_lock:
+        entry = _limiters.get(provider.id)
+        if entry is None or entry[0] != signature:
+            entry = (signature, ProviderLimiter(config, default_concurrency))
+            _limiters[provider.id] = entry
+        return entry[1]
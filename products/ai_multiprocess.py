@@ -0,0 +1,68 @@
+"""
+Process-pool entry point for ``run_ai_processing --workers``.
+
+Django is imported lazily so the worker also starts under the ``spawn``
+start method, where the child re-imports this module from scratch.
+"""
+import time
+
+
+def process_worker(worker_index, batch_size, continuous):
+    """
+    Claim and process disjoint AI batches in a child process; returns its stats.
+
+    ``batch_size`` of None sizes batches adaptively, per worker.
+    """
+    import django
+    django.setup()
+
+    from django.db import connections
+    from django.utils import timezone
+    from .ai_pipeline import claim_ai_batch, run_ai_batch, release_ai_batch
+    from .ai_control import processing_gate
+    from .ai_batching import AdaptiveBatchSizer
+
+    if batch_size is None:
+        sizer = AdaptiveBatchSizer()
+    else:
+        sizer = AdaptiveBatchSizer(min_size=batch_size, max_size=batch_size)
+
+    def log(message):
+        print(f"[worker {worker_index}] {message}", flush=True)
+
+    started = time.monotonic()
+    batches = 0
+    products_done = 0
+    try:
+        while True:
+            processing_gate.wait_until_running()
+            batch, products = claim_ai_batch(
+                sizer.size,
+                name=f"AI Batch w{worker_index} - {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+            )
+            if batch is None:
+                break
+
+            log(f"Processing batch {batch.id} with {len(products)} products")
+            try:
+                stats = run_ai_batch(batch, products, log=lambda message: None)
+            except Exception as e:
+                release_ai_batch(batch, products, reason=f'Failed: {e}')
+                raise
+            batches += 1
+            products_done += len(products)
+
+            if not continuous:
+                break
+            sizer.record(stats)
+            if sizer.delay:
+                time.sleep(sizer.delay)
+    finally:
+        connections.close_all()
+
+    return {
+        'worker': worker_index,
+        'batches': batches,
+        'products': products_done,
+        'elapsed': time.monotonic() - started,
+    }
@@ -0,0 +1,794 @@
+"""
+Shared AI batch processing used by the batch viewset, the run_ai_worker
+queue workers and the run_ai_processing management command.
+"""
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait as futures_wait
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Q, When
+from django.utils import timezone
+
+from .models import (
+    Product, AnnotationBatch, BatchItem, AIProvider, AISuggestion, AIConsensus, AIResponseCache,
+    AIBatchStats, aging_slots
+)
+from .ai_providers import ProviderCall, ProviderResult, ProviderRateLimited, ProviderTimeout, get_adapter
+from .ai_limits import get_limiter
+from .ai_control import processing_gate
+from .progress import ProgressReporter, publish_batch, publish_status_delta
+from .consensus import Vote, compute_consensus, mark_missing_providers
+from .ai_timing import StageTimer
+from .image_store import prefetch_images
+
+
+def provider_concurrency(provider):
+    """Maximum number of in-flight calls allowed for a provider."""
+    default = getattr(settings, 'AI_PROVIDER_CONCURRENCY', 4)
+    config = provider.config if isinstance(provider.config, dict) else {}
+    try:
+        limit = int(config.get('max_concurrency', default))
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, limit)
+
+
+def provider_deadline(provider):
+    """Seconds a single provider call may take before it is given up."""
+    default = getattr(settings, 'AI_PROVIDER_DEADLINE_SECONDS', 60.0)
+    config = provider.config if isinstance(provider.config, dict) else {}
+    try:
+        return max(0.1, float(config.get('deadline_seconds', default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def attach_backup_adapters(adapters):
+    """
+    Give every adapter whose provider names a ``backup_provider`` (id or name)
+    in its config the adapter of that provider, for hedged requests.
+    """
+    wanted = {}
+    for adapter in adapters.values():
+        backup = adapter.config.get('backup_provider')
+        if backup not in (None, ''):
+            wanted[adapter.provider.id] = str(backup)
+    if not wanted:
+        return adapters
+
+    lookups = set(wanted.values())
+    backups = {}
+    for provider in AIProvider.objects.filter(
+        Q(id__in=[int(value) for value in lookups if value.isdigit()]) | Q(name__in=lookups)
+    ):
+        backups[str(provider.id)] = backups[provider.name] = provider
+    backup_adapters = {}
+    for provider_id, lookup in wanted.items():
+        backup = backups.get(lookup)
+        if backup is None or backup.id == provider_id:
+            continue
+        if backup.id not in backup_adapters:
+            backup_adapters[backup.id] = adapters.get(backup.id) or get_adapter(backup)
+        adapters[provider_id].backup = backup_adapters[backup.id]
+    return adapters
+
+
+class CallAttempt:
+    """
+    A chunk of calls submitted to one provider; ``started`` is set while a
+    request is in flight.
+
+    The chunk's outcome is counted on the provider's circuit breaker once,
+    by whichever of the calling thread and the deadline check in
+    run_provider_calls settles it first.
+    """
+
+    def __init__(self, adapter, chunk):
+        self.adapter = adapter
+        self.chunk = chunk
+        self.limiter = get_limiter(adapter.provider)
+        self.deadline = provider_deadline(adapter.provider)
+        self.started = None
+        self.future = None
+        self.settled = False
+        self._lock = threading.Lock()
+
+    def elapsed(self, now):
+        started = self.started
+        return None if started is None else now - started
+
+    def expired(self, now):
+        elapsed = self.elapsed(now)
+        return elapsed is not None and elapsed > self.deadline
+
+    def results(self):
+        return self.future.result() if self.future is not None and self.future.done() else None
+
+    def record_outcome(self, success, final=True):
+        """
+        Count a success or failure on the breaker unless the chunk is settled
+        already; ``final=False`` counts a failed request that is retried.
+        """
+        with self._lock:
+            if self.settled:
+                return
+            self.settled = final
+        if success:
+            self.limiter.breaker.record_success()
+        else:
+            self.limiter.breaker.record_failure()
+
+
+def failed_results(chunk, error):
+    return [ProviderResult(call, None, None, None, error) for call in chunk]
+
+
+def error_count(results):
+    return sum(1 for result in results if result.error)
+
+
+def run_provider_calls(calls, adapters):
+    """
+    Fan out provider calls concurrently and return their results in call order.
+
+    ``adapters`` maps provider id to its adapter. Calls are grouped per
+    provider into chunks of the adapter's ``batch_size`` and every provider
+    gets its own pool, so a slow provider cannot starve the others. Each
+    provider's limiter (see ai_limits) enforces its request/token budgets and
+    adapts the number of in-flight calls; throttled or timed-out chunks are
+    retried with exponential backoff. Every chunk waits for the processing
+    gate first, so a pause takes effect between provider calls. Exceptions
+    raised by an adapter are captured on the results instead of aborting
+    the whole batch.
+
+    Tail latency is bounded per chunk:
+
+    * a request still running past its provider's observed p95
+      (AI_HEDGE_QUANTILE) is hedged: the same calls go to the adapter's
+      ``backup`` (see ``attach_backup_adapters``) and the first complete
+      answer wins. A chunk that failed outright fails over the same way;
+    * a request not answered within the provider's deadline
+      (``deadline_seconds`` in its config, AI_PROVIDER_DEADLINE_SECONDS) is
+      given up;
+    * while a provider's circuit breaker is open its calls are not sent.
+
+    Results answered by a backup stand in for the primary provider's: they
+    keep the primary's call, and the backup provider's id is kept in
+    ``raw_response['answered_by']``.
+    """
+    if not calls:
+        return []
+
+    max_retries = getattr(settings, 'AI_PROVIDER_MAX_RETRIES', 3)
+    hedge_quantile = getattr(settings, 'AI_HEDGE_QUANTILE', 0.95)
+    hedge_min_samples = getattr(settings, 'AI_HEDGE_MIN_SAMPLES', 20)
+
+    def invoke(attempt):
+        adapter, limiter, chunk = attempt.adapter, attempt.limiter, attempt.chunk
+        retries = 0
+        while True:
+            if not limiter.breaker.allow():
+                return failed_results(chunk, f"{adapter.provider.name} skipped: circuit open")
+            processing_gate.wait_until_running()
+            limiter.acquire(adapter.estimate_tokens(chunk) if limiter.tokens else 0)
+            started = attempt.started = time.monotonic()
+            try:
+                if len(chunk) == 1:
+                    results = [adapter.call(chunk[0])]
+                else:
+                    results = adapter.call_many(chunk)
+            except (ProviderRateLimited, ProviderTimeout) as e:
+                attempt.started = None
+                limiter.release(throttled=True)
+                retries += 1
+                attempt.record_outcome(False, final=retries > max_retries)
+                if retries > max_retries:
+                    return failed_results(chunk, str(e))
+                time.sleep(min(30, 0.5 * 2 ** (retries - 1)) * random.uniform(0.5, 1.5))
+                continue
+            except Exception as e:
+                attempt.started = None
+                limiter.release()
+                attempt.record_outcome(False)
+                return failed_results(chunk, str(e))
+            finished = time.monotonic()
+            # A late answer is a failure even if the deadline check has not
+            # given the chunk up yet; it must not close the breaker.
+            expired = attempt.expired(finished)
+            attempt.started = None
+            limiter.release(latency=finished - started)
+            attempt.record_outcome(not expired)
+            return results
+
+    executors = {}
+
+    def submit(attempt):
+        provider = attempt.adapter.provider
+        executor = executors.get(provider.id)
+        if executor is None:
+            # The pool is sized to the ceiling; the limiter decides how many
+            # of its threads may actually be calling the provider.
+            executor = executors[provider.id] = ThreadPoolExecutor(
+                max_workers=provider_concurrency(provider),
+                thread_name_prefix=f"ai-provider-{provider.id}"
+            )
+        attempt.future = executor.submit(invoke, attempt)
+        return attempt
+
+    def hedge(primary):
+        backup = primary.adapter.backup
+        if backup is None or get_limiter(backup.provider).breaker.state == 'open':
+            return None
+        chunk = [call._replace(provider=backup.provider) for call in primary.chunk]
+        return submit(CallAttempt(backup, chunk))
+
+    def settle(primary, backup, now):
+        """Final results of a chunk, or None while it is still undecided."""
+        primary_results, backup_results = primary.results(), backup.results() if backup else None
+        if backup_results is not None:
+            backup_results = [
+                result._replace(
+                    call=call,
+                    raw_response=dict(result.raw_response or {}, answered_by=backup.adapter.provider.id)
+                )
+                for call, result in zip(primary.chunk, backup_results)
+            ]
+        if primary_results is not None and not error_count(primary_results):
+            if backup is not None:
+                backup.future.cancel()
+            return primary_results
+        if backup_results is not None and not error_count(backup_results):
+            # Drops the primary request if it is still queued.
+            primary.future.cancel()
+            return backup_results
+        primary_over = primary_results is not None or primary.expired(now)
+        backup_over = backup is None or backup_results is not None or backup.expired(now)
+        if not (primary_over and backup_over):
+            return None
+        if primary_results is None:
+            primary_results = failed_results(
+                primary.chunk, f"{primary.adapter.provider.name} missed its {primary.deadline:g}s deadline"
+            )
+            primary.record_outcome(False)
+        if backup is not None and backup_results is None:
+            backup.record_outcome(False)
+        if backup_results is not None and error_count(backup_results) < error_count(primary_results):
+            return backup_results
+        return primary_results
+
+    pending = []
+    indexes_by_provider = {}
+    for index, call in enumerate(calls):
+        indexes_by_provider.setdefault(call.provider.id, []).append(index)
+
+    results = [None] * len(calls)
+    # Starting the gate reads the control row; doing it here keeps that
+    # query, and the database connection it opens, out of the pool threads.
+    processing_gate.wait_until_running()
+    try:
+        for provider_id, indexes in indexes_by_provider.items():
+            adapter = adapters[provider_id]
+            step = adapter.batch_size
+            for start in range(0, len(indexes), step):
+                chunk_indexes = indexes[start:start + step]
+                primary = submit(CallAttempt(adapter, [calls[index] for index in chunk_indexes]))
+                pending.append([chunk_indexes, primary, None])
+
+        while pending:
+            now = time.monotonic()
+            undecided = []
+            for entry in pending:
+                chunk_indexes, primary, backup = entry
+                if backup is None and primary.adapter.backup is not None:
+                    primary_results = primary.results()
+                    if primary_results is not None:
+                        failed = error_count(primary_results) > 0
+                    else:
+                        elapsed = primary.elapsed(now)
+                        threshold = primary.limiter.latency_quantile(hedge_quantile, hedge_min_samples)
+                        failed = primary.expired(now)
+                        slow = elapsed is not None and threshold is not None and elapsed > threshold
+                        failed = failed or slow
+                    if failed:
+                        backup = entry[2] = hedge(primary)
+                chunk_results = settle(primary, backup, now)
+                if chunk_results is None:
+                    undecided.append(entry)
+                    continue
+                for index, result in zip(chunk_indexes, chunk_results):
+                    results[index] = result
+            pending = undecided
+            if pending:
+                # Wake up regularly as well, to hedge slow requests and enforce deadlines.
+                waiting = [
+                    attempt.future for _, primary, backup in pending for attempt in (primary, backup)
+                    if attempt is not None and not attempt.future.done()
+                ]
+                if waiting:
+                    futures_wait(waiting, timeout=0.05, return_when=FIRST_COMPLETED)
+        return results
+    finally:
+        # Requests given up at their deadline are left to finish in the background.
+        for executor in executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def provider_uses_cache(provider):
+    if not getattr(settings, 'AI_CACHE_ENABLED', True):
+        return False
+    config = provider.config if isinstance(provider.config, dict) else {}
+    return config.get('cache', True) is not False
+
+
+def run_cached_provider_calls(calls, adapters, timer=None):
+    """
+    Answer calls from AIResponseCache where possible and dispatch only the misses.
+
+    Identical content (e.g. colour/size variants sharing name, description and
+    images) hashes to the same key, so it is requested from a provider once
+    per model. Successful answers are written back in bulk. Returns
+    ``(results, hits, lookups)``.
+    """
+    timer = timer or StageTimer()
+    with timer.span('cache_lookup'):
+        keys = [
+            AIResponseCache.make_key(call.provider.model, call.product, call.attribute)
+            if provider_uses_cache(call.provider) else None
+            for call in calls
+        ]
+        cached = AIResponseCache.lookup([key for key in keys if key])
+
+    results = [None] * len(calls)
+    miss_indexes = []
+    for index, (call, key) in enumerate(zip(calls, keys)):
+        entry = cached.get(key) if key else None
+        if entry is None:
+            miss_indexes.append(index)
+            continue
+        results[index] = ProviderResult(
+            call,
+            entry.suggested_value,
+            entry.confidence_score,
+            dict(entry.raw_response or {}, cached=True),
+            None
+        )
+
+    # Duplicate keys within the batch are only requested once.
+    first_index_by_key = {}
+    dispatch_indexes = []
+    for index in miss_indexes:
+        key = keys[index]
+        if key is None:
+            dispatch_indexes.append(index)
+        elif key not in first_index_by_key:
+            first_index_by_key[key] = index
+            dispatch_indexes.append(index)
+
+    with timer.span('provider_calls'):
+        dispatched = run_provider_calls([calls[index] for index in dispatch_indexes], adapters)
+    for index, result in zip(dispatch_indexes, dispatched):
+        results[index] = result
+
+    new_entries = {}
+    for key, index in first_index_by_key.items():
+        result = results[index]
+        if result.error or result.suggested_value is None or 'answered_by' in (result.raw_response or {}):
+            # Answers from a backup provider are not the keyed model's.
+            continue
+        new_entries[key] = AIResponseCache(
+            key=key,
+            model=calls[index].provider.model,
+            suggested_value=result.suggested_value,
+            confidence_score=result.confidence,
+            raw_response=result.raw_response
+        )
+    for index in miss_indexes:
+        key = keys[index]
+        if key is None or first_index_by_key[key] == index:
+            continue
+        source = results[first_index_by_key[key]]
+        results[index] = source._replace(
+            call=calls[index]._replace(provider=source.call.provider),
+            raw_response=dict(source.raw_response or {}, cached=True) if not source.error else source.raw_response
+        )
+
+    if new_entries:
+        with timer.span('cache_store'):
+            AIResponseCache.store(
+                list(new_entries.values()),
+                ttl_seconds=getattr(settings, 'AI_CACHE_TTL_SECONDS', 7 * 24 * 3600)
+            )
+            AIResponseCache.evict_if_due(
+                getattr(settings, 'AI_CACHE_MAX_ENTRIES', 100000),
+                getattr(settings, 'AI_CACHE_EVICT_INTERVAL_SECONDS', 300)
+            )
+
+    lookups = sum(1 for key in keys if key)
+    hits = lookups - len(first_index_by_key)
+    return results, hits, lookups
+
+
+def claim_ai_batch(batch_size, name, product_ids=None):
+    """
+    Move up to ``batch_size`` pending products into a new in-progress AI batch.
+
+    Products are taken by priority, with a share of aging slots reserved for
+    the oldest pending products.
+
+    Rows locked by a concurrent claim are skipped, so parallel callers always
+    get disjoint products. Returns ``(batch, products)``, or ``(None, [])``
+    when nothing is left to claim. The claim's duration is kept in
+    ``batch.stage_timer`` for ``run_ai_batch`` to report.
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        pending = Product.objects.select_for_update(skip_locked=True).filter(status='pending_ai')
+        if product_ids is not None:
+            pending = pending.filter(id__in=product_ids)
+        # Highest priority first, except the aging slots taken by the oldest.
+        products = list(pending.order_by('id')[:aging_slots(batch_size)])
+        products += list(
+            pending.exclude(id__in=[product.id for product in products])
+            .order_by('-priority', 'id')[:batch_size - len(products)]
+        )
+        if not products:
+            return None, []
+
+        batch = AnnotationBatch.objects.create(
+            name=name,
+            batch_type='ai',
+            status='in_progress',
+            batch_size=len(products)
+        )
+        BatchItem.objects.bulk_create([BatchItem(batch=batch, product=product) for product in products])
+        Product.objects.filter(id__in=[product.id for product in products]).update(
+            status='ai_running',
+            updated_at=timezone.now()
+        )
+        for product in products:
+            product.status = 'ai_running'
+        publish_status_delta('pending_ai', 'ai_running', len(products))
+        publish_batch(batch)
+
+    batch.stage_timer = StageTimer()
+    batch.stage_timer.add('claim', time.perf_counter() - started)
+    return batch, products
+
+
+def run_ai_batch(batch, products, log=print, ai_providers=None, lease=None):
+    """
+    Run the provider calls of a batch and persist them checkpoint by checkpoint.
+
+    Products are processed in chunks of ``AI_CHECKPOINT_PRODUCTS``; each chunk
+    is committed (suggestions, consensus, ``ai_done``) before the next one
+    starts, so a crash only loses the chunk in flight. Only (product,
+    attribute, provider) triples without a stored suggestion are requested,
+    which makes re-running a half-finished batch cheap.
+
+    ``ai_providers`` defaults to every active provider. A queue worker passes
+    its ``lease``; ``lease.ensure_held()`` is called before every checkpoint
+    is persisted and raises once the worker no longer owns the jobs.
+
+    Returns the batch stats (products, calls, errors, cache hits/lookups,
+    provider_seconds, db_seconds, elapsed) used by the adaptive batch sizer,
+    plus the per-stage timings, which are also saved as the batch's
+    ``AIBatchStats``.
+    """
+    started = time.monotonic()
+    timer = getattr(batch, 'stage_timer', None) or StageTimer()
+    products = list(products)
+    with timer.span('setup'):
+        if ai_providers is None:
+            ai_providers = list(AIProvider.objects.filter(is_active=True).order_by('id'))
+        adapters = attach_backup_adapters({provider.id: get_adapter(provider) for provider in ai_providers})
+    checkpoint_size = max(1, getattr(settings, 'AI_CHECKPOINT_PRODUCTS', 10))
+    reporter = ProgressReporter(batch)
+
+    totals = dict.fromkeys(
+        ('done', 'calls', 'errors', 'skipped_calls', 'hits', 'lookups', 'provider_seconds', 'db_seconds'), 0
+    )
+    for start in range(0, len(products), checkpoint_size):
+        chunk = products[start:start + checkpoint_size]
+        stats = run_ai_chunk(chunk, ai_providers, adapters, log=log, timer=timer, lease=lease)
+        for key in totals:
+            totals[key] += stats[key]
+        # Progress doubles as the batch heartbeat watched by the reaper.
+        with timer.span('progress'):
+            reporter.update(round(100 * (start + len(chunk)) / len(products), 1))
+
+    hits, lookups = totals['hits'], totals['lookups']
+    hit_rate = f"{hits / lookups:.0%}" if lookups else "n/a"
+    skipped = f", {totals['skipped_calls']} skipped by early exit" if totals['skipped_calls'] else ''
+    log(f"Batch {batch.id}: {totals['calls']} provider calls, {totals['errors']} errors{skipped}, "
+        f"cache hits {hits}/{lookups} ({hit_rate})")
+    log(f"Persisted results for {totals['done']}/{len(products)} products")
+
+    with timer.span('finish'):
+        batch.status = 'completed'
+        batch.progress = 100
+        batch.save()
+        publish_batch(batch)
+
+    totals['products'] = len(products)
+    totals['elapsed'] = time.monotonic() - started
+    totals['stages'] = timer.as_dict()
+    AIBatchStats.record(batch, totals)
+    return totals
+
+
+def provider_query_order(ai_providers):
+    """Providers in the order early exit asks them: ``query_order`` in their config, then id."""
+    def key(provider):
+        config = provider.config if isinstance(provider.config, dict) else {}
+        try:
+            order = float(config.get('query_order', float('inf')))
+        except (TypeError, ValueError):
+            order = float('inf')
+        return order, provider.id
+    return sorted(ai_providers, key=key)
+
+
+def early_exit_decision(answers, threshold):
+    """
+    Consensus entry for a pair whose first answers agree, or None.
+
+    ``answers`` are the results of the first providers in query order; they
+    must all carry the same value with every confidence at or above
+    ``threshold``.
+    """
+    if not answers or any(result is None or result.error or result.suggested_value is None for result in answers):
+        return None
+    if len({str(result.suggested_value) for result in answers}) > 1:
+        return None
+    confidences = [float(result.confidence) if result.confidence is not None else 0.0 for result in answers]
+    if min(confidences) < float(threshold):
+        return None
+    call = answers[0].call
+    return {
+        'product_id': call.product.id,
+        'attribute_id': call.attribute.id,
+        'consensus_value': str(answers[0].suggested_value),
+        'method': 'early_exit',
+        'confidence': round(sum(confidences) / len(confidences), 4),
+        'missing_providers': [],
+    }
+
+
+def run_ai_chunk(products, ai_providers, adapters, log=print, timer=None, lease=None):
+    """
+    Request and persist the missing suggestions of a few products.
+
+    With AI_IMAGE_PREFETCH, the products' images are first brought into the
+    local image store and calls carry their local paths.
+
+    With AI_EARLY_EXIT, pairs whose attribute has an ``early_exit_threshold``
+    are first sent to the first AI_EARLY_EXIT_AGREEING providers in query
+    order only; when those agree at or above the threshold, the pair is
+    decided (method ``early_exit``) and the other providers are not asked.
+    """
+    timer = timer or StageTimer()
+    attributes_by_product = {}
+    with timer.span('attributes'):
+        for product in products:
+            attributes_by_product[product.id] = list(product.get_applicable_attributes())
+
+    images = {}
+    if getattr(settings, 'AI_IMAGE_PREFETCH', False):
+        with timer.span('image_prefetch'):
+            images = prefetch_images(products, log=log)
+
+    providers_by_id = {provider.id: provider for provider in ai_providers}
+    with timer.span('existing_suggestions'):
+        existing = {
+            (suggestion.product_id, suggestion.attribute_id, suggestion.provider_id): suggestion
+            for suggestion in AISuggestion.objects.filter(
+                product_id__in=list(attributes_by_product),
+                provider_id__in=list(providers_by_id)
+            )
+        }
+
+    early_exit = getattr(settings, 'AI_EARLY_EXIT', False)
+    agreeing = max(1, getattr(settings, 'AI_EARLY_EXIT_AGREEING', 2))
+    ordered = provider_query_order(ai_providers)
+    if not early_exit or len(ordered) <= agreeing:
+        agreeing = len(ordered)
+
+    # Early-exit pairs: (product, attribute) -> answers of the first providers, by provider id.
+    first_answers = {}
+    rounds = ([], [])
+    existing_results = []
+    for product in products:
+        for attribute in attributes_by_product[product.id]:
+            staged = attribute.early_exit_threshold is not None and agreeing < len(ordered)
+            if staged:
+                first_answers[(product.id, attribute.id)] = {}
+            for position, provider in enumerate(ordered):
+                call = ProviderCall(product, attribute, provider, tuple(images.get(product.id, ())))
+                suggestion = existing.get((product.id, attribute.id, provider.id))
+                if suggestion is None:
+                    rounds[1 if staged and position >= agreeing else 0].append(call)
+                    continue
+                result = ProviderResult(
+                    call,
+                    suggestion.suggested_value,
+                    suggestion.confidence_score,
+                    suggestion.raw_response,
+                    None
+                )
+                existing_results.append(result)
+                if staged and position < agreeing:
+                    first_answers[(product.id, attribute.id)][provider.id] = result
+    if existing_results:
+        log(f"Reusing {len(existing_results)} stored suggestions")
+
+    provider_started = time.monotonic()
+    results, hits, lookups = run_cached_provider_calls(rounds[0], adapters, timer=timer)
+    calls = len(rounds[0])
+
+    decided = []
+    skipped = 0
+    if first_answers:
+        for result in results:
+            call = result.call
+            pair = (call.product.id, call.attribute.id)
+            if pair in first_answers:
+                first_answers[pair][call.provider.id] = result
+        first_ids = [provider.id for provider in ordered[:agreeing]]
+        attributes_by_id = {
+            attribute.id: attribute for attributes in attributes_by_product.values() for attribute in attributes
+        }
+        for pair, answers in first_answers.items():
+            entry = early_exit_decision(
+                [answers.get(provider_id) for provider_id in first_ids],
+                attributes_by_id[pair[1]].early_exit_threshold
+            )
+            if entry is not None:
+                decided.append(entry)
+        decided_pairs = {(entry['product_id'], entry['attribute_id']) for entry in decided}
+        second = [call for call in rounds[1] if (call.product.id, call.attribute.id) not in decided_pairs]
+        skipped = len(rounds[1]) - len(second)
+        if decided:
+            log(f"Early exit decided {len(decided)} attribute values, skipping {skipped} calls")
+        more_results, more_hits, more_lookups = run_cached_provider_calls(second, adapters, timer=timer)
+        results += more_results
+        hits += more_hits
+        lookups += more_lookups
+        calls += len(second)
+
+    db_started = time.monotonic()
+    if lease is not None:
+        lease.ensure_held()
+    done_product_ids = persist_batch_results(
+        products, attributes_by_product, results, log=log, existing_results=existing_results,
+        decided=decided, timer=timer
+    )
+    return {
+        'done': len(done_product_ids),
+        'calls': calls,
+        'errors': sum(1 for result in results if result.error),
+        'skipped_calls': skipped,
+        'hits': hits,
+        'lookups': lookups,
+        'provider_seconds': db_started - provider_started,
+        'db_seconds': time.monotonic() - db_started,
+    }
+
+
+def release_ai_batch(batch, products, reason=None):
+    """Hand the unfinished products of a failed batch back to pending_ai and cancel it."""
+    released = Product.objects.filter(
+        id__in=[product.id for product in products],
+        status='ai_running'
+    ).update(status='pending_ai', updated_at=timezone.now())
+    batch.status = 'cancelled'
+    if reason:
+        batch.description = reason
+    batch.save()
+    publish_status_delta('ai_running', 'pending_ai', released)
+    publish_batch(batch)
+    return released
+
+
+def persist_batch_results(products, attributes_by_product, results, log=print, existing_results=(), decided=(),
+                          timer=None):
+    """
+    Write a whole batch of provider results with a handful of set-based statements.
+
+    Consensus is computed in one pass (see consensus) from the in-memory
+    results plus ``existing_results`` (suggestions stored by an earlier,
+    interrupted run), so suggestions are never read back. Providers that were
+    asked but gave no answer are listed in the consensus' ``missing_providers``.
+    ``decided`` holds consensus entries settled already (early exit); they are
+    recorded as they are.
+
+    A product is marked ``ai_done`` once every requested triple has an answer
+    (or it has no applicable attributes). Products with failed calls go back
+    to ``pending_ai``, so the next pass requests only the missing triples,
+    until AI_PRODUCT_MAX_ATTEMPTS passes have failed; then they are marked
+    ``ai_done`` with the answers they have. Returns the ids marked ``ai_done``.
+    """
+    timer = timer or StageTimer()
+    suggestions = []
+    votes = []
+    expected = {}
+    # A backup's answer carries the call of the provider it stands in for.
+    for result in list(results) + list(existing_results):
+        call = result.call
+        expected.setdefault((call.product.id, call.attribute.id), set()).add(call.provider.id)
+    for result in results:
+        call = result.call
+        if result.error or result.suggested_value is None:
+            log(f"Provider {call.provider.name} failed for {call.product.name} / {call.attribute.name}: "
+                f"{result.error or 'no value returned'}")
+            continue
+        suggestions.append(AISuggestion(
+            product=call.product,
+            attribute=call.attribute,
+            provider=call.provider,
+            suggested_value=result.suggested_value,
+            confidence_score=result.confidence,
+            raw_response=result.raw_response
+        ))
+        votes.append(Vote(call.product.id, call.attribute.id, call.provider.id, result.suggested_value, result.confidence))
+    for result in existing_results:
+        call = result.call
+        votes.append(Vote(call.product.id, call.attribute.id, call.provider.id, result.suggested_value, result.confidence))
+
+    label_counts = {
+        attribute.id: len(attribute.allowed_values)
+        for attributes in attributes_by_product.values()
+        for attribute in attributes
+        if isinstance(attribute.allowed_values, list)
+    }
+    decided_pairs = {(entry['product_id'], entry['attribute_id']) for entry in decided}
+    if decided_pairs:
+        votes = [vote for vote in votes if (vote.product_id, vote.attribute_id) not in decided_pairs]
+    with timer.span('consensus'):
+        consensus_entries = mark_missing_providers(
+            compute_consensus(votes, label_counts=label_counts), votes, expected
+        ) + list(decided)
+    answered = {
+        (result.call.product.id, result.call.attribute.id, result.call.provider.id)
+        for result in list(results) + list(existing_results)
+        if not result.error and result.suggested_value is not None
+    }
+    failed_product_ids = {
+        result.call.product.id for result in results
+        if (result.call.product.id, result.call.attribute.id, result.call.provider.id) not in answered
+    }
+    max_attempts = max(1, getattr(settings, 'AI_PRODUCT_MAX_ATTEMPTS', 3))
+
+    with transaction.atomic():
+        # A concurrent run may have stored the same triple; keep the first.
+        with timer.span('suggestion_writes'):
+            AISuggestion.objects.bulk_create(suggestions, ignore_conflicts=True)
+        with timer.span('consensus_writes'):
+            AIConsensus.record_many(consensus_entries)
+        with timer.span('status_update'):
+            now = timezone.now()
+            running = Product.objects.filter(id__in=[product.id for product in products], status='ai_running')
+            retry_ids = list(
+                running.filter(id__in=failed_product_ids, ai_failures__lt=max_attempts - 1)
+                .values_list('id', flat=True)
+            )
+            retried = Product.objects.filter(id__in=retry_ids).update(
+                status='pending_ai',
+                ai_failures=F('ai_failures') + 1,
+                updated_at=now
+            )
+            done_product_ids = list(running.values_list('id', flat=True))
+            done = Product.objects.filter(id__in=done_product_ids).update(
+                status='ai_done',
+                # Out of attempts: done with whatever answers the product has.
+                ai_failures=Case(When(id__in=failed_product_ids, then=F('ai_failures') + 1), default=0),
+                updated_at=now
+            )
+            publish_status_delta('ai_running', 'pending_ai', retried)
+            publish_status_delta('ai_running', 'ai_done', done)
+
+    if retry_ids:
+        log(f"Provider calls failed for {len(retry_ids)} products; returned to pending_ai for another pass")
+    return done_product_ids
@@ -0,0 +1,231 @@
+"""
+Provider adapters used by the AI pipeline, keyed by AIProvider.service_name.
+
+Register an adapter class with ``@register_adapter('service name')``; service
+names without a registered adapter fall back to ``AI_DEFAULT_ADAPTER``.
+"""
+import asyncio
+import base64
+import json
+import random
+import socket
+import threading
+import urllib.error
+import urllib.request
+from collections import namedtuple
+
+from django.conf import settings
+
+
+# ``images`` are local paths of the product's prefetched images (see image_store).
+ProviderCall = namedtuple('ProviderCall', ['product', 'attribute', 'provider', 'images'], defaults=[()])
+ProviderResult = namedtuple(
+    'ProviderResult',
+    ['call', 'suggested_value', 'confidence', 'raw_response', 'error']
+)
+
+
+class ProviderError(Exception):
+    """A provider call failed."""
+
+
+class ProviderRateLimited(ProviderError):
+    """The provider throttled the request (HTTP 429 or equivalent)."""
+
+
+class ProviderTimeout(ProviderError):
+    """The provider did not answer in time."""
+
+
+# Canned values for the simulated provider and the local stand-in server
+SIMULATED_VALUES = {
+    'Color': ['Red', 'Blue', 'Green', 'Black', 'White', 'Yellow', 'Pink', 'Purple', 'Orange', 'Gray'],
+    'Size': ['XS', 'S', 'M', 'L', 'XL', 'XXL'],
+    'Material': ['Cotton', 'Polyester', 'Silk', 'Wool', 'Linen', 'Denim', 'Leather', 'Nylon'],
+    'Sleeve Length': ['Short', 'Long', 'Sleeveless', 'Three-Quarter'],
+    'Gender': ['Men', 'Women', 'Unisex'],
+    'Season': ['Spring', 'Summer', 'Fall', 'Winter', 'All Season'],
+    'Pattern': ['Solid', 'Striped', 'Printed', 'Floral', 'Checkered', 'Plaid', 'Graphic'],
+    'Fit': ['Slim', 'Regular', 'Loose', 'Oversized', 'Skinny'],
+    'Neckline': ['Round', 'V-Neck', 'Collar', 'Boat Neck', 'Square'],
+}
+
+
+def simulated_value(attribute_name, rng=random):
+    values = SIMULATED_VALUES.get(attribute_name)
+    if values:
+        return rng.choice(values)
+    return f"AI suggested {attribute_name}"
+
+
+_registry = {}
+
+
+def register_adapter(service_name):
+    """Class decorator registering an adapter for an AIProvider.service_name."""
+    def decorator(adapter_class):
+        _registry[service_name.lower()] = adapter_class
+        return adapter_class
+    return decorator
+
+
+def get_adapter_class(service_name):
+    adapter_class = _registry.get((service_name or '').lower())
+    if adapter_class is None:
+        adapter_class = _registry[getattr(settings, 'AI_DEFAULT_ADAPTER', 'simulated').lower()]
+    return adapter_class
+
+
+def get_adapter(provider):
+    """Instantiate the adapter registered for ``provider.service_name``."""
+    return get_adapter_class(provider.service_name)(provider)
+
+
+class ProviderAdapter:
+    """
+    Base adapter. Subclasses implement ``call``; adapters whose backend accepts
+    several items per request override ``call_many`` as well.
+    """
+
+    # Adapter that answers hedged requests for this provider (see
+    # ai_pipeline.attach_backup_adapters).
+    backup = None
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.config = provider.config if isinstance(provider.config, dict) else {}
+
+    @property
+    def batch_size(self):
+        """How many calls the pipeline should hand to ``call_many`` at once."""
+        try:
+            return max(1, int(self.config.get('batch_size', 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def build_request(self, call):
+        """Provider-neutral description of a single suggestion request."""
+        product, attribute = call.product, call.attribute
+        return {
+            'product_id': product.id,
+            'sku': product.external_sku,
+            'name': product.name,
+            'description': product.description or '',
+            'image_urls': list(product.image_urls or []),
+            'image_paths': list(call.images),
+            'attribute': attribute.name,
+            'data_type': attribute.data_type,
+            'allowed_values': attribute.allowed_values,
+        }
+
+    def estimate_tokens(self, calls):
+        """Rough token count of a request (~4 characters per token) for tokens_per_min budgets."""
+        return sum(len(json.dumps(self.build_request(call))) for call in calls) // 4 + 1
+
+    def call(self, call):
+        raise NotImplementedError
+
+    def call_many(self, calls):
+        return [self.call(call) for call in calls]
+
+    async def acall(self, call):
+        return await asyncio.to_thread(self.call, call)
+
+    async def acall_many(self, calls):
+        return await asyncio.to_thread(self.call_many, calls)
+
+
+@register_adapter('simulated')
+class SimulatedAdapter(ProviderAdapter):
+    """In-process stand-in returning canned values; used until real providers are wired in."""
+
+    def __init__(self, provider):
+        super().__init__(provider)
+        seed = self.config.get('seed')
+        self._rng = random.Random(seed) if seed is not None else random.Random()
+        self._lock = threading.Lock()
+
+    def call(self, call):
+        with self._lock:
+            suggested_value = simulated_value(call.attribute.name, self._rng)
+            confidence = round(self._rng.uniform(0.7, 0.95), 4)
+        raw_response = {
+            'model': self.provider.model,
+            'suggestion': suggested_value,
+            'confidence': float(confidence)
+        }
+        return ProviderResult(call, suggested_value, confidence, raw_response, None)
+
+
+@register_adapter('http')
+class HTTPAdapter(ProviderAdapter):
+    """
+    JSON-over-HTTP adapter, e.g. for the local stand-in provider.
+
+    POSTs ``{"model": ..., "items": [request, ...]}`` to ``config['endpoint']``
+    and expects ``{"results": [{"value": ..., "confidence": ...} | {"error": ...}]}``
+    in the same order. With ``"inline_images": true`` in the config, every item
+    also carries its prefetched images base64-encoded in ``images``, since a
+    remote service cannot read our local paths.
+    """
+
+    def build_request(self, call):
+        request = super().build_request(call)
+        if self.config.get('inline_images'):
+            images = []
+            for path in call.images:
+                try:
+                    with open(path, 'rb') as image_file:
+                        images.append(base64.b64encode(image_file.read()).decode('ascii'))
+                except OSError:
+                    # Evicted meanwhile; the provider still has the URL.
+                    continue
+            request['images'] = images
+        return request
+
+    def call(self, call):
+        return self.call_many([call])[0]
+
+    def call_many(self, calls):
+        endpoint = self.config.get('endpoint')
+        if not endpoint:
+            raise ProviderError(f"Provider {self.provider.name} has no endpoint configured")
+
+        body = json.dumps({
+            'model': self.provider.model,
+            'items': [self.build_request(call) for call in calls],
+        }).encode()
+        headers = {'Content-Type': 'application/json'}
+        if self.config.get('api_key'):
+            headers['Authorization'] = f"Bearer {self.config['api_key']}"
+        request = urllib.request.Request(endpoint, data=body, headers=headers, method='POST')
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.config.get('timeout_seconds', 30)) as response:
+                payload = json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise ProviderRateLimited(f"{self.provider.name} rate limited the request")
+            raise ProviderError(f"{self.provider.name} returned HTTP {e.code}")
+        except (socket.timeout, TimeoutError):
+            raise ProviderTimeout(f"{self.provider.name} timed out")
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, (socket.timeout, TimeoutError)):
+                raise ProviderTimeout(f"{self.provider.name} timed out")
+            raise ProviderError(f"{self.provider.name} is unreachable: {e.reason}")
+
+        items = payload.get('results', [])
+        if len(items) != len(calls):
+            raise ProviderError(f"{self.provider.name} returned {len(items)} results for {len(calls)} items")
+
+        results = []
+        for call, item in zip(calls, items):
+            if item.get('error'):
+                results.append(ProviderResult(call, None, None, item, item['error']))
+                continue
+            confidence = item.get('confidence')
+            if confidence is not None:
+                confidence = round(float(confidence), 4)
+            raw_response = dict(item, model=self.provider.model)
+            results.append(ProviderResult(call, item.get('value'), confidence, raw_response, None))
+        return results
@@ -0,0 +1,73 @@
+"""
+Recovery for AI work abandoned by a crashed process.
+
+A batch is live while its progress heartbeat (``updated_at``) is recent or
+while the job queue still owns it through an open AIJob; the queue reclaims
+expired leases on its own. Everything else that is still ``in_progress`` or
+``ai_running`` past the cutoff was abandoned: its products go back to
+``pending_ai`` and are enqueued again. Because the pipeline only requests
+triples without a stored suggestion, the rerun skips work already done.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Product, AnnotationBatch, AIJob, AIProcessingControl
+from .progress import publish_event, publish_status_delta
+
+
+def reap_stale_ai_work(stale_seconds=None, dry_run=False, log=print):
+    """Requeue products of abandoned AI batches. Returns ``(batches, products)`` counts."""
+    if stale_seconds is None:
+        stale_seconds = getattr(settings, 'AI_STALE_BATCH_SECONDS', 900)
+    if AIProcessingControl.get_control().is_paused:
+        # Paused batches stop checkpointing on purpose.
+        return 0, 0
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=stale_seconds)
+
+    queued_batch_ids = AIJob.objects.filter(
+        status__in=AIJob.OPEN_STATUSES,
+        batch__isnull=False
+    ).values('batch_id')
+    ai_batches = AnnotationBatch.objects.filter(batch_type='ai', status='in_progress')
+    live_batch_ids = ai_batches.filter(
+        Q(updated_at__gte=cutoff) | Q(id__in=queued_batch_ids)
+    ).values('id')
+
+    with transaction.atomic():
+        stale_batches = list(
+            ai_batches.select_for_update(skip_locked=True)
+            .filter(updated_at__lt=cutoff)
+            .exclude(id__in=queued_batch_ids)
+            .values_list('id', flat=True)
+        )
+        stale_products = list(
+            Product.objects.select_for_update(skip_locked=True)
+            .filter(status='ai_running', updated_at__lt=cutoff)
+            .exclude(batchitem__batch_id__in=live_batch_ids)
+            .exclude(ai_jobs__status__in=AIJob.OPEN_STATUSES)
+            .values_list('id', flat=True)
+        )
+
+        if dry_run:
+            log(f"Would cancel {len(stale_batches)} stale batches and requeue {len(stale_products)} products")
+            return len(stale_batches), len(stale_products)
+
+        AnnotationBatch.objects.filter(id__in=stale_batches).update(
+            status='cancelled',
+            description='Abandoned; products requeued by the AI reaper',
+            updated_at=now
+        )
+        requeued = Product.objects.filter(id__in=stale_products).update(status='pending_ai', updated_at=now)
+        AIJob.enqueue(stale_products)
+        publish_status_delta('ai_running', 'pending_ai', requeued)
+        for batch_id in stale_batches:
+            publish_event({'type': 'batch', 'batch_id': batch_id, 'batch_type': 'ai', 'status': 'cancelled'})
+
+    if stale_batches or stale_products:
+        log(f"Cancelled {len(stale_batches)} stale batches and requeued {len(stale_products)} products")
+    return len(stale_batches), len(stale_products)
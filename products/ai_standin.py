@@ -0,0 +1,186 @@
+"""
+Local HTTP stand-in for an AI provider.
+
+Speaks the protocol of ``ai_providers.HTTPAdapter`` and answers with canned
+values after a latency drawn from a configurable, seedable distribution. It
+can also inject errors, rate limiting and timeouts. This lets the real
+pipeline be measured without network access.
+
+``GET /images/<name>`` serves a small deterministic image per name (the
+query string is ignored, so several URLs can share one image), for
+exercising the image prefetch against product URLs pointing here (the
+stand-in listens on loopback, so this needs AI_IMAGE_ALLOW_PRIVATE_HOSTS).
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .ai_providers import simulated_value
+
+
+class LatencyModel:
+    """Seeded latency distribution, sampled in seconds."""
+    DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+    def __init__(self, distribution='fixed', mean_ms=0.0, spread_ms=0.0, sigma=0.5, seed=None):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {self.DISTRIBUTIONS}")
+        self.distribution = distribution
+        self.mean_ms = mean_ms
+        self.spread_ms = spread_ms
+        self.sigma = sigma
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        with self._lock:
+            if self.distribution == 'uniform':
+                ms = self._rng.uniform(self.mean_ms - self.spread_ms, self.mean_ms + self.spread_ms)
+            elif self.distribution == 'normal':
+                ms = self._rng.gauss(self.mean_ms, self.spread_ms)
+            elif self.distribution == 'lognormal':
+                # mean_ms is the median of the distribution
+                ms = self.mean_ms * self._rng.lognormvariate(0, self.sigma)
+            elif self.distribution == 'exponential':
+                ms = self._rng.expovariate(1 / self.mean_ms) if self.mean_ms > 0 else 0
+            else:
+                ms = self.mean_ms
+        return max(0.0, ms) / 1000
+
+
+class FaultModel:
+    """Seeded per-request fault injection."""
+
+    def __init__(self, error_rate=0.0, rate_limit_rate=0.0, timeout_rate=0.0,
+                 timeout_seconds=60.0, seed=None):
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self):
+        """Return None, 'error', 'rate_limited' or 'timeout'."""
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.rate_limit_rate:
+            return 'rate_limited'
+        roll -= self.rate_limit_rate
+        if roll < self.timeout_rate:
+            return 'timeout'
+        roll -= self.timeout_rate
+        if roll < self.error_rate:
+            return 'error'
+        return None
+
+
+class StandInProviderServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering ``POST /v1/suggest``."""
+    daemon_threads = True
+
+    def __init__(self, address=('127.0.0.1', 0), latency=None, faults=None,
+                 per_item_ms=0.0, seed=None):
+        super().__init__(address, StandInRequestHandler)
+        self.latency = latency or LatencyModel()
+        self.faults = faults or FaultModel()
+        self.per_item_ms = per_item_ms
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.requests_served = 0
+        self.images_served = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def endpoint(self):
+        return f"{self.url}/v1/suggest"
+
+    @staticmethod
+    def image_bytes(name):
+        """Deterministic PNG-signed bytes for an image name."""
+        digest = hashlib.sha256(name.encode()).digest()
+        return b'\x89PNG\r\n\x1a\n' + digest * 64
+
+    def answer(self, item):
+        with self._rng_lock:
+            value = simulated_value(item.get('attribute', ''), self._rng)
+            confidence = round(self._rng.uniform(0.7, 0.95), 4)
+        return {'value': value, 'confidence': confidence}
+
+    def start(self):
+        """Serve from a background thread; returns self for chaining."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if not path.startswith('/images/') or len(path) <= len('/images/'):
+            self._send_json(404, {'error': 'not found'})
+            return
+        server = self.server
+        with server._rng_lock:
+            server.images_served += 1
+        body = server.image_bytes(path[len('/images/'):])
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/suggest':
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'invalid JSON'})
+            return
+        items = payload.get('items', [])
+
+        server = self.server
+        with server._rng_lock:
+            server.requests_served += 1
+        fault = server.faults.sample()
+        if fault == 'timeout':
+            time.sleep(server.faults.timeout_seconds)
+        time.sleep(server.latency.sample() + server.per_item_ms * max(0, len(items) - 1) / 1000)
+
+        if fault == 'rate_limited':
+            self._send_json(429, {'error': 'rate limited'})
+        elif fault == 'error':
+            self._send_json(500, {'error': 'internal error'})
+        else:
+            self._send_json(200, {'results': [server.answer(item) for item in items]})
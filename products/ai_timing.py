@@ -0,0 +1,44 @@
+"""
+Per-stage timing of AI batches.
+
+The pipeline wraps each stage of a batch (claim, attribute resolution,
+cache lookups, provider calls, suggestion and consensus writes, ...) in a
+``StageTimer.span``. Spans of the same stage add up, so a batch ends with one
+total per stage, which ``AIBatchStats`` persists next to the batch.
+"""
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """Accumulates wall-clock seconds and span counts per stage name."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def span(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage, seconds, count=1):
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += count
+
+    def seconds(self, stage):
+        return self.stages.get(stage, (0.0, 0))[0]
+
+    @property
+    def total(self):
+        return sum(seconds for seconds, _ in self.stages.values())
+
+    def as_dict(self):
+        """``{stage: {'seconds': ..., 'count': ...}}``, slowest stage first."""
+        return {
+            stage: {'seconds': round(seconds, 4), 'count': count}
+            for stage, (seconds, count) in sorted(self.stages.items(), key=lambda item: -item[1][0])
+        }
@@ -0,0 +1,185 @@
+"""
+Queue worker that drains AIJob rows. Run it with the run_ai_worker
+management command; any number of workers may run on any number of nodes.
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import AIJob, Product
+from .ai_control import processing_gate
+from .ai_pipeline import claim_ai_batch, run_ai_batch, release_ai_batch
+from .ai_recovery import reap_stale_ai_work
+from .ai_batching import AdaptiveBatchSizer
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class LeaseLost(Exception):
+    """The worker no longer owns the jobs it is processing."""
+
+
+class LeaseHeartbeat:
+    """Background thread that keeps extending the lease on a set of jobs."""
+
+    def __init__(self, worker_id, job_ids, lease_seconds):
+        self.worker_id = worker_id
+        self.job_ids = list(job_ids)
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def ensure_held(self):
+        """
+        Extend the lease now and raise LeaseLost unless every job is still
+        owned, so results are never persisted for jobs another worker took.
+        """
+        if not self.lost:
+            extended = AIJob.heartbeat(self.worker_id, self.job_ids, self.lease_seconds)
+            self.lost = extended < len(self.job_ids)
+        if self.lost:
+            raise LeaseLost(f"lease lost on some of jobs {self.job_ids}")
+
+    def _run(self):
+        interval = max(1, self.lease_seconds / 3)
+        try:
+            while not self._stop.wait(interval):
+                extended = AIJob.heartbeat(self.worker_id, self.job_ids, self.lease_seconds)
+                if extended < len(self.job_ids):
+                    self.lost = True
+        finally:
+            close_old_connections()
+
+
+class AIWorker:
+    """Claims leased AI jobs, groups them into batches and runs the pipeline."""
+
+    def __init__(self, worker_id=None, batch_size=None, lease_seconds=None,
+                 poll_interval=5, max_attempts=None, log=print):
+        self.worker_id = worker_id or default_worker_id()
+        # A fixed batch_size pins the sizer; otherwise it adapts to load.
+        if batch_size is None:
+            self.sizer = AdaptiveBatchSizer()
+        else:
+            self.sizer = AdaptiveBatchSizer(min_size=batch_size, max_size=batch_size)
+        self.lease_seconds = lease_seconds or getattr(settings, 'AI_JOB_LEASE_SECONDS', 300)
+        self.max_attempts = max_attempts or getattr(settings, 'AI_JOB_MAX_ATTEMPTS', 3)
+        self.poll_interval = poll_interval
+        self.log = log
+        self.processed_products = 0
+        self.stale_seconds = getattr(settings, 'AI_STALE_BATCH_SECONDS', 900)
+        self._last_reap = None
+
+    def run(self, drain=False):
+        """Process jobs until the queue is empty (``drain``) or forever."""
+        self.log(f"AI worker {self.worker_id} started")
+        while True:
+            if processing_gate.is_paused:
+                self.log("AI processing is paused. Waiting...")
+                processing_gate.wait_until_running()
+                self.log("AI processing resumed")
+                continue
+
+            if not self.run_once():
+                if self.reap():
+                    continue
+                if drain:
+                    break
+                time.sleep(self.poll_interval)
+            elif self.sizer.delay:
+                time.sleep(self.sizer.delay)
+        self.log(f"AI worker {self.worker_id} finished - {self.processed_products} products processed")
+
+    def run_once(self):
+        """Claim and process one group of jobs. Returns False when nothing was claimed."""
+        jobs = AIJob.claim(self.worker_id, self.sizer.size, self.lease_seconds)
+        if not jobs:
+            return False
+
+        batch = jobs[0].batch
+        if batch is None:
+            batch, products = self._form_batch(jobs)
+            if batch is None:
+                return True
+            jobs = [job for job in jobs if job.product_id in {product.id for product in products}]
+        else:
+            products = [job.product for job in jobs]
+
+        self._process(batch, products, jobs)
+        return True
+
+    def reap(self):
+        """Requeue abandoned AI work at most every third of the stale timeout. True if any was found."""
+        now = time.monotonic()
+        if self._last_reap is not None and now - self._last_reap < self.stale_seconds / 3:
+            return False
+        self._last_reap = now
+        batches, products = reap_stale_ai_work(self.stale_seconds, log=self.log)
+        return products > 0
+
+    def _form_batch(self, jobs):
+        batch, products = claim_ai_batch(
+            len(jobs),
+            name=f"Auto AI Batch - {timezone.now().strftime('%Y-%m-%d %H:%M')}",
+            product_ids=[job.product_id for job in jobs]
+        )
+        claimed_ids = {product.id for product in products}
+        stale_ids = [job.id for job in jobs if job.product_id not in claimed_ids]
+        if stale_ids:
+            # Products already picked up elsewhere; nothing left for these jobs.
+            AIJob.finish(self.worker_id, stale_ids, status='cancelled', error='Product is no longer pending AI')
+        if batch is not None:
+            AIJob.objects.filter(id__in=[job.id for job in jobs if job.product_id in claimed_ids]).update(batch=batch)
+        return batch, products
+
+    def _process(self, batch, products, jobs):
+        job_ids = [job.id for job in jobs]
+        self.log(f"Processing batch {batch.id} with {len(products)} products")
+        with LeaseHeartbeat(self.worker_id, job_ids, self.lease_seconds) as heartbeat:
+            try:
+                stats = run_ai_batch(batch, products, log=self.log, lease=heartbeat)
+            except LeaseLost:
+                # Another worker has re-claimed the jobs and redoes the
+                # batch; this worker must not persist or close anything.
+                self.log(f"Lease lost on batch {batch.id}; leaving it to the new owner")
+                return
+            except Exception as e:
+                self.log(f"AI batch {batch.id} failed: {e}")
+                AIJob.release(self.worker_id, job_ids, str(e), self.max_attempts)
+                failed_ids = set(
+                    AIJob.objects.filter(id__in=job_ids, status='failed').values_list('product_id', flat=True)
+                )
+                if failed_ids:
+                    # Out of attempts: hand the products back instead of
+                    # leaving them in ai_running.
+                    release_ai_batch(
+                        batch,
+                        [product for product in products if product.id in failed_ids],
+                        reason=f'Failed: {e}'
+                    )
+                return
+        AIJob.finish(self.worker_id, job_ids)
+        # Products whose provider calls failed are pending_ai again; queue another pass.
+        AIJob.enqueue(
+            Product.objects.filter(id__in=[product.id for product in products], status='pending_ai')
+            .values_list('id', flat=True)
+        )
+        self.processed_products += len(products)
+        self.sizer.record(stats)
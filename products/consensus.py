@@ -0,0 +1,239 @@
+"""
+Consensus over AI provider suggestions.
+
+Votes of a whole batch are encoded once into integer arrays (pair, provider,
+candidate value) and every strategy works on those arrays in a single NumPy
+pass, without looping over suggestions in Python. Strategies are registered
+with ``@register_strategy('name')``; AI_CONSENSUS_METHOD picks the default.
+
+    weighted_majority  value with the largest sum of provider confidences
+    calibrated         log-odds voting after rescaling each provider's
+                       confidences to its observed agreement rate
+    dawid_skene        one-coin Dawid-Skene EM: estimates each provider's
+                       accuracy and the posterior of every candidate value;
+                       weighted_majority below AI_DAWID_SKENE_MIN_ITEMS
+                       votes per provider, too few to estimate accuracies
+
+``mark_missing_providers`` then scales every confidence by the share of the
+expected providers that voted, so a lone answer is never certain.
+"""
+from collections import namedtuple
+
+import numpy as np
+from django.conf import settings
+
+
+Vote = namedtuple('Vote', ['product_id', 'attribute_id', 'provider_id', 'value', 'confidence'])
+
+
+class EncodedVotes:
+    """
+    Integer encoding of a batch of votes.
+
+    ``group`` numbers the distinct (pair, value) candidates. Groups are sorted
+    by pair, so the candidates of pair ``i`` are
+    ``group_pair[group_start[i]:group_start[i + 1]]``.
+    """
+
+    def __init__(self, votes, default_confidence=0.5, label_counts=None):
+        votes = list(votes)
+        self.pairs, pair = np.unique(
+            np.array([(vote.product_id, vote.attribute_id) for vote in votes], dtype=np.int64).reshape(-1, 2),
+            axis=0,
+            return_inverse=True
+        )
+        self.providers, provider = np.unique(
+            np.array([vote.provider_id for vote in votes], dtype=np.int64),
+            return_inverse=True
+        )
+        self.values, value = np.unique(np.array([str(vote.value) for vote in votes], dtype=object), return_inverse=True)
+        self.pair = pair.reshape(-1).astype(np.int64)
+        self.provider = provider.astype(np.int64)
+        self.value = value.astype(np.int64)
+        self.confidence = np.array(
+            [default_confidence if vote.confidence is None else float(vote.confidence) for vote in votes],
+            dtype=np.float64
+        )
+
+        keys = self.pair * len(self.values) + self.value
+        group_keys, self.group = np.unique(keys, return_inverse=True)
+        self.group = self.group.reshape(-1)
+        self.group_pair = group_keys // max(1, len(self.values))
+        self.group_value = group_keys % max(1, len(self.values))
+        self.group_start = np.searchsorted(self.group_pair, np.arange(len(self.pairs) + 1))
+
+        # Size of each pair's label space: the distinct values seen for its
+        # attribute across the batch, or the attribute's allowed values if more.
+        attributes, pair_attribute = np.unique(self.pairs[:, 1], return_inverse=True)
+        pair_attribute = pair_attribute.reshape(-1)
+        seen = np.unique(pair_attribute[self.group_pair] * max(1, len(self.values)) + self.group_value)
+        labels = np.bincount(seen // max(1, len(self.values)), minlength=len(attributes)).astype(np.float64)
+        if label_counts:
+            allowed = np.array([label_counts.get(int(attribute), 0) for attribute in attributes], dtype=np.float64)
+            labels = np.maximum(labels, allowed)
+        self.pair_labels = np.maximum(labels, 2)[pair_attribute]
+
+    @property
+    def n_pairs(self):
+        return len(self.pairs)
+
+    @property
+    def n_groups(self):
+        return len(self.group_pair)
+
+    def group_sum(self, weights):
+        return np.bincount(self.group, weights=weights, minlength=self.n_groups)
+
+    def pair_sum(self, weights):
+        return np.bincount(self.pair, weights=weights, minlength=self.n_pairs)
+
+    def pick(self, scores):
+        """Index of the best-scoring group of every pair (ties go to the first value)."""
+        order = np.lexsort((-scores, self.group_pair))
+        return order[self.group_start[:-1]]
+
+    def softmax(self, log_scores):
+        """Normalise group log-scores into per-pair probabilities."""
+        pair_max = np.maximum.reduceat(log_scores, self.group_start[:-1])
+        weights = np.exp(log_scores - pair_max[self.group_pair])
+        return weights / np.bincount(self.group_pair, weights=weights, minlength=self.n_pairs)[self.group_pair]
+
+
+_strategies = {}
+
+
+def register_strategy(name):
+    """Decorator registering ``func(encoded) -> (winning groups, confidences)``."""
+    def decorator(func):
+        _strategies[name] = func
+        return func
+    return decorator
+
+
+def available_strategies():
+    return sorted(_strategies)
+
+
+@register_strategy('weighted_majority')
+def weighted_majority(encoded):
+    scores = encoded.group_sum(encoded.confidence)
+    winners = encoded.pick(scores)
+    totals = np.bincount(encoded.group_pair, weights=scores, minlength=encoded.n_pairs)
+    confidence = np.divide(scores[winners], totals, out=np.ones(encoded.n_pairs), where=totals > 0)
+    return winners, confidence
+
+
+def _agreement(encoded, winners):
+    """Per-provider share of votes that agree with the given winning groups."""
+    winning_group = np.zeros(encoded.n_groups, dtype=bool)
+    winning_group[winners] = True
+    agrees = winning_group[encoded.group].astype(np.float64)
+    votes = np.bincount(encoded.provider, minlength=len(encoded.providers))
+    # Laplace smoothing keeps providers with few votes away from 0 and 1.
+    return (np.bincount(encoded.provider, weights=agrees, minlength=len(encoded.providers)) + 1) / (votes + 2)
+
+
+@register_strategy('calibrated')
+def calibrated(encoded):
+    winners, _ = weighted_majority(encoded)
+    agreement = _agreement(encoded, winners)
+    votes = np.bincount(encoded.provider, minlength=len(encoded.providers))
+    mean_confidence = np.bincount(encoded.provider, weights=encoded.confidence, minlength=len(encoded.providers))
+    mean_confidence = np.divide(mean_confidence, votes, out=np.full(len(votes), 0.5), where=votes > 0)
+
+    # Scale every provider's confidences so that they average to its agreement rate.
+    scale = agreement / np.maximum(mean_confidence, 1e-6)
+    calibrated_confidence = np.clip(encoded.confidence * scale[encoded.provider], 0.01, 0.99)
+    log_odds = np.log(calibrated_confidence / (1 - calibrated_confidence))
+
+    scores = encoded.group_sum(log_odds)
+    probabilities = encoded.softmax(scores)
+    winners = encoded.pick(scores)
+    return winners, probabilities[winners]
+
+
+@register_strategy('dawid_skene')
+def dawid_skene(encoded, max_iterations=50, tolerance=1e-6):
+    labels = encoded.pair_labels[encoded.pair]
+
+    winners, _ = weighted_majority(encoded)
+    accuracy = np.clip(_agreement(encoded, winners), 0.05, 0.95)
+    votes = np.bincount(encoded.provider, minlength=len(encoded.providers))
+
+    for _ in range(max_iterations):
+        # E-step: posterior of every candidate given the provider accuracies.
+        vote_accuracy = accuracy[encoded.provider]
+        log_wrong = np.log((1 - vote_accuracy) / (labels - 1))
+        log_right = np.log(vote_accuracy)
+        log_scores = encoded.pair_sum(log_wrong)[encoded.group_pair] + encoded.group_sum(log_right - log_wrong)
+        posterior = encoded.softmax(log_scores)
+
+        # M-step: a provider's accuracy is the expected share of its votes that are right.
+        expected_right = np.bincount(encoded.provider, weights=posterior[encoded.group], minlength=len(votes))
+        updated = np.clip((expected_right + 1) / (votes + 2), 0.05, 0.95)
+        converged = np.max(np.abs(updated - accuracy)) < tolerance
+        accuracy = updated
+        if converged:
+            break
+
+    winners = encoded.pick(posterior)
+    return winners, posterior[winners]
+
+
+def compute_consensus(votes, method=None, label_counts=None):
+    """
+    Consensus for every (product, attribute) pair found in ``votes``.
+
+    ``label_counts`` optionally maps attribute id to its number of allowed
+    values. Returns entries ready for ``AIConsensus.record_many``, with the
+    method actually used: dawid_skene gives way to weighted_majority on
+    batches with fewer than AI_DAWID_SKENE_MIN_ITEMS votes per provider.
+    """
+    method = method or getattr(settings, 'AI_CONSENSUS_METHOD', 'weighted_majority')
+    if method not in _strategies:
+        raise ValueError(f"Unknown consensus method {method!r}; choose from {available_strategies()}")
+    votes = list(votes)
+    if not votes:
+        return []
+
+    encoded = EncodedVotes(votes, label_counts=label_counts)
+    min_items = getattr(settings, 'AI_DAWID_SKENE_MIN_ITEMS', 20)
+    if method == 'dawid_skene' and len(encoded.pair) < min_items * len(encoded.providers):
+        # Too few items to estimate accuracies: EM would fit them to this batch.
+        method = 'weighted_majority'
+    winners, confidence = _strategies[method](encoded)
+    pairs = encoded.pairs[encoded.group_pair[winners]]
+    values = encoded.values[encoded.group_value[winners]]
+    return [
+        {
+            'product_id': int(product_id),
+            'attribute_id': int(attribute_id),
+            'consensus_value': value,
+            'method': method,
+            'confidence': round(float(score), 4),
+        }
+        for (product_id, attribute_id), value, score in zip(pairs, values, confidence)
+    ]
+
+
+def mark_missing_providers(entries, votes, expected):
+    """
+    Set ``missing_providers`` on consensus entries: the ids of ``expected``
+    providers (a set for every pair, or a dict of sets per pair) without a
+    vote for the entry's pair. The confidence of an entry is scaled by the
+    share of the providers that voted, so one vote out of three expected
+    gives at most 1/3.
+    """
+    voted = {}
+    for vote in votes:
+        voted.setdefault((vote.product_id, vote.attribute_id), set()).add(vote.provider_id)
+    for entry in entries:
+        pair = (entry['product_id'], entry['attribute_id'])
+        pair_expected = expected.get(pair, ()) if isinstance(expected, dict) else expected
+        pair_voted = voted.get(pair, set())
+        missing = set(pair_expected) - pair_voted
+        entry['missing_providers'] = sorted(missing)
+        if missing:
+            share = len(pair_voted) / (len(pair_voted) + len(missing))
+            entry['confidence'] = round(entry['confidence'] * share, 4)
+    return entries
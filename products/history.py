@@ -0,0 +1,162 @@
+"""
+Archival of superseded consensus and final attribute versions.
+
+Every AI re-run and re-finalization deactivates the previous version of a
+(product, attribute) pair but keeps it, so inactive rows pile up in
+ai_consensus and final_attributes and in the indexes every active lookup
+walks. ``archive_history`` moves inactive versions older than the retention
+window into the range-partitioned ``*_archive`` tables (see migration 0022),
+one chunk per transaction: each chunk is deleted and inserted in a single
+statement, so an interrupted run loses nothing and simply continues when
+started again.
+
+``version_history`` reads the versions of a product, from the live table
+only or, for full history, together with the archive.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AIConsensus, FinalAttribute
+
+# kind -> (model, archive table)
+ARCHIVES = {
+    'consensus': (AIConsensus, 'ai_consensus_archive'),
+    'final': (FinalAttribute, 'final_attributes_archive'),
+}
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def _month_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _next_month(month):
+    return month.replace(year=month.year + 1, month=1) if month.month == 12 else month.replace(month=month.month + 1)
+
+
+def ensure_partitions(cursor, archive_table, moments, known=None):
+    """
+    Create the monthly partitions of ``archive_table`` covering ``moments``.
+
+    Concurrent CREATE TABLE IF NOT EXISTS ... PARTITION OF of the same
+    partition can still fail, so creation is serialised per partition with a
+    transaction-level advisory lock. Call inside a transaction.
+    """
+    known = known if known is not None else set()
+    for month in sorted({_month_start(moment) for moment in moments}):
+        partition = f'{archive_table}_{month:%Y%m}'
+        if partition in known:
+            continue
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [partition])
+        if cursor.fetchone()[0]:
+            known.add(partition)
+            continue
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [partition])
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {partition}
+            PARTITION OF {archive_table}
+            FOR VALUES FROM ('{month.isoformat()}') TO ('{_next_month(month).isoformat()}')
+            """
+        )
+        known.add(partition)
+
+
+def archive_chunk(kind, cutoff, chunk_size, partitions=None):
+    """Move up to ``chunk_size`` inactive ``kind`` versions created before ``cutoff``; returns how many."""
+    model, archive_table = ARCHIVES[kind]
+    table = model._meta.db_table
+    columns = ', '.join(_columns(model))
+    with transaction.atomic(), connection.cursor() as cursor:
+        # SKIP LOCKED lets two archivers split the work instead of queueing.
+        cursor.execute(
+            f"""
+            SELECT id, created_at
+            FROM {table}
+            WHERE NOT is_active AND created_at < %s
+            ORDER BY created_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            """,
+            [cutoff, chunk_size]
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+        ensure_partitions(cursor, archive_table, [created_at for _, created_at in rows], known=partitions)
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {table}
+                WHERE id = ANY(%s::bigint[])
+                RETURNING {columns}
+            )
+            INSERT INTO {archive_table} ({columns})
+            SELECT {columns} FROM moved
+            """,
+            [[row_id for row_id, _ in rows]]
+        )
+        return cursor.rowcount
+
+
+def archive_history(retention_days=None, chunk_size=None, kinds=tuple(ARCHIVES), dry_run=False, log=print):
+    """
+    Archive inactive versions older than ``retention_days`` (HISTORY_RETENTION_DAYS).
+
+    Returns ``{kind: rows}``, the rows moved or, with ``dry_run``, the rows
+    that would be.
+    """
+    if retention_days is None:
+        retention_days = getattr(settings, 'HISTORY_RETENTION_DAYS', 90)
+    chunk_size = chunk_size or getattr(settings, 'HISTORY_ARCHIVE_CHUNK_SIZE', 5000)
+    cutoff = timezone.now() - timedelta(days=retention_days)
+
+    moved = {}
+    for kind in kinds:
+        model, _ = ARCHIVES[kind]
+        if dry_run:
+            moved[kind] = model.objects.filter(is_active=False, created_at__lt=cutoff).count()
+            continue
+        moved[kind] = 0
+        partitions = set()
+        while True:
+            count = archive_chunk(kind, cutoff, chunk_size, partitions=partitions)
+            moved[kind] += count
+            if count:
+                log(f"  {model._meta.db_table}: {moved[kind]} rows archived")
+            if count < chunk_size:
+                break
+    return moved
+
+
+def version_history(kind, product_id, attribute_id=None, include_archived=True):
+    """
+    Every version of ``kind`` for a product (optionally one attribute), newest
+    first per attribute, as dicts; archived versions carry ``archived_at``.
+    """
+    model, archive_table = ARCHIVES[kind]
+    columns = _columns(model)
+    select = ', '.join(columns)
+    condition = 'product_id = %s'
+    params = [product_id]
+    if attribute_id is not None:
+        condition += ' AND attribute_id = %s'
+        params.append(attribute_id)
+
+    query = f"SELECT {select}, NULL::timestamptz AS archived_at FROM {model._meta.db_table} WHERE {condition}"
+    if include_archived:
+        query += f" UNION ALL SELECT {select}, archived_at FROM {archive_table} WHERE {condition}"
+        params = params * 2
+    query += ' ORDER BY attribute_id, version DESC'
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
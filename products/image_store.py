@@ -0,0 +1,329 @@
+"""
+Local, content-addressed store for product images.
+
+``prefetch_images`` downloads the images of a set of products once: every
+file is stored under the SHA-256 of its bytes, so identical images shared by
+several products (or URLs) take one file and one StoredImage row, and a URL
+already fetched for any product is never downloaded again. ProductImage
+rows map each (product, URL) to its stored copy.
+
+The store is bounded to AI_IMAGE_STORE_MAX_BYTES; every use refreshes an
+image's ``last_used_at`` and the least recently used images are evicted
+beyond the bound, at most every AI_IMAGE_STORE_EVICT_INTERVAL_SECONDS per
+process, so the store may overshoot the bound in between. Failed downloads are retried after AI_IMAGE_RETRY_SECONDS.
+"""
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import tempfile
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import StoredImage, ProductImage
+
+
+class ImageFetchError(Exception):
+    """An image could not be downloaded."""
+
+
+class ImageStore:
+    """Files named by the SHA-256 of their content under ``root``."""
+
+    def __init__(self, root=None):
+        self.root = Path(root or getattr(settings, 'AI_IMAGE_STORE_DIR', Path(settings.BASE_DIR) / 'image_store'))
+
+    def path(self, sha256):
+        return self.root / sha256[:2] / sha256
+
+    def exists(self, sha256):
+        return self.path(sha256).exists()
+
+    def put(self, data):
+        """Store ``data`` unless an identical file exists; returns its SHA-256."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write aside and rename, so readers never see a partial file.
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.incoming-')
+            try:
+                with os.fdopen(fd, 'wb') as temp_file:
+                    temp_file.write(data)
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                raise
+        return sha256
+
+    def read(self, sha256):
+        return self.path(sha256).read_bytes()
+
+    def delete(self, sha256):
+        try:
+            self.path(sha256).unlink()
+        except FileNotFoundError:
+            pass
+
+
+ALLOWED_SCHEMES = ('http', 'https')
+
+
+def _public_address(address):
+    address = ipaddress.ip_address(address)
+    if getattr(address, 'ipv4_mapped', None):
+        address = address.ipv4_mapped
+    return address.is_global and not address.is_multicast
+
+
+def image_url_error(url):
+    """Why ``url`` may not be stored as a product image, or None; checks the URL alone, no DNS."""
+    try:
+        parts = urlsplit(url)
+        parts.port
+    except ValueError as e:
+        return f"malformed URL ({e})"
+    if parts.scheme.lower() not in ALLOWED_SCHEMES:
+        return f"scheme {parts.scheme or '(none)'!r} is not allowed, only http and https"
+    if not parts.hostname:
+        return "no host"
+    if parts.username or parts.password:
+        return "credentials in URL"
+    try:
+        if not _public_address(parts.hostname) and not getattr(settings, 'AI_IMAGE_ALLOW_PRIVATE_HOSTS', False):
+            return f"host {parts.hostname} is not a public address"
+    except ValueError:
+        pass  # A name; resolved when fetched.
+    return None
+
+
+def check_image_url(url):
+    """
+    Raise ImageFetchError unless ``url`` is an http(s) URL without
+    credentials whose host, if an address literal, is public. Host names are
+    checked when connecting (see _resolve_public).
+    """
+    error = image_url_error(url)
+    if error:
+        raise ImageFetchError(error)
+
+
+def _resolve_public(host, port):
+    """
+    Addresses of ``host`` to connect to, all of them public, so product data
+    cannot reach loopback, private or link-local (metadata) services.
+    """
+    try:
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ImageFetchError(f"cannot resolve {host} ({e})")
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not addresses:
+        raise ImageFetchError(f"cannot resolve {host}")
+    if not getattr(settings, 'AI_IMAGE_ALLOW_PRIVATE_HOSTS', False):
+        for address in addresses:
+            if not _public_address(address.split('%', 1)[0]):
+                raise ImageFetchError(f"host {host} resolves to non-public address {address}")
+    return addresses
+
+
+class _CheckedHTTPConnection(http.client.HTTPConnection):
+    """
+    Connects to the very addresses _resolve_public checked, so the host
+    cannot resolve to something else between the check and the connection.
+    """
+
+    def connect(self):
+        error = None
+        for address in _resolve_public(self.host, self.port):
+            try:
+                self.sock = socket.create_connection((address, self.port), self.timeout, self.source_address)
+                break
+            except OSError as e:
+                error = e
+        else:
+            raise error
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class _CheckedHTTPSConnection(http.client.HTTPSConnection, _CheckedHTTPConnection):
+    """HTTPS over _CheckedHTTPConnection; TLS still verifies the host name."""
+
+
+class _CheckedHTTPHandler(urllib.request.HTTPHandler):
+
+    def http_open(self, req):
+        return self.do_open(_CheckedHTTPConnection, req)
+
+
+class _CheckedHTTPSHandler(urllib.request.HTTPSHandler):
+
+    def https_open(self, req):
+        return self.do_open(_CheckedHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Applies check_image_url to every redirect target as well."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_image_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+# Only the handlers an image fetch needs: no file://, ftp:// or data: URLs,
+# and connections only to checked addresses.
+_opener = urllib.request.OpenerDirector()
+for _handler in (
+    _CheckedHTTPHandler,
+    _CheckedHTTPSHandler,
+    urllib.request.HTTPDefaultErrorHandler,
+    urllib.request.HTTPErrorProcessor,
+    _CheckedRedirectHandler,
+):
+    _opener.add_handler(_handler())
+
+
+def download(url, timeout=None, max_bytes=None):
+    """Fetch ``url``; returns ``(data, content_type)`` or raises ImageFetchError."""
+    timeout = timeout or getattr(settings, 'AI_IMAGE_FETCH_TIMEOUT', 10.0)
+    max_bytes = max_bytes or getattr(settings, 'AI_IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+    check_image_url(url)
+    try:
+        with _opener.open(url, timeout=timeout) as response:
+            data = response.read(max_bytes + 1)
+            content_type = response.headers.get_content_type()
+    except urllib.error.HTTPError as e:
+        raise ImageFetchError(f"HTTP {e.code}")
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise ImageFetchError(str(getattr(e, 'reason', e)))
+    if len(data) > max_bytes:
+        raise ImageFetchError(f"larger than {max_bytes} bytes")
+    if not data:
+        raise ImageFetchError("empty response")
+    return data, content_type
+
+
+def prefetch_images(products, log=print, store=None):
+    """
+    Make sure the images of ``products`` are in the local store.
+
+    Returns ``{product_id: [local path, ...]}`` in the order of each
+    product's ``image_urls``; images that could not be fetched are left out.
+    """
+    store = store or ImageStore()
+    urls_by_product = {product.id: [url for url in (product.image_urls or []) if url] for product in products}
+    wanted = {(product_id, url) for product_id, urls in urls_by_product.items() for url in urls}
+    if not wanted:
+        return {product_id: [] for product_id in urls_by_product}
+
+    known = {
+        (row.product_id, row.url): row
+        for row in ProductImage.objects.filter(product_id__in=list(urls_by_product)).select_related('image')
+    }
+    retry_before = timezone.now() - timedelta(seconds=getattr(settings, 'AI_IMAGE_RETRY_SECONDS', 3600))
+
+    def usable(row):
+        return row is not None and row.image is not None and store.exists(row.image.sha256)
+
+    missing = set()
+    for key in wanted:
+        row = known.get(key)
+        if usable(row):
+            continue
+        # Only failed fetches wait; an evicted image is fetched again at once.
+        if row is not None and row.error and row.fetched_at and row.fetched_at > retry_before:
+            continue
+        missing.add(key)
+
+    images_by_url = {}
+    if missing:
+        # Reuse copies already fetched for other products.
+        for row in ProductImage.objects.filter(
+            url__in={url for _, url in missing},
+            image__isnull=False
+        ).select_related('image'):
+            if usable(row):
+                images_by_url[row.url] = row.image
+
+        errors_by_url = {}
+        to_fetch = sorted({url for _, url in missing} - set(images_by_url))
+        if to_fetch:
+            workers = max(1, getattr(settings, 'AI_IMAGE_PREFETCH_CONCURRENCY', 8))
+
+            def fetch(url):
+                try:
+                    data, content_type = download(url)
+                    return url, store.put(data), len(data), content_type, None
+                except ImageFetchError as e:
+                    return url, None, 0, '', str(e)
+
+            with ThreadPoolExecutor(max_workers=min(workers, len(to_fetch)), thread_name_prefix='image-prefetch') as pool:
+                fetched = list(pool.map(fetch, to_fetch))
+
+            stored = {}
+            for url, sha256, size, content_type, error in fetched:
+                if error:
+                    errors_by_url[url] = error
+                    log(f"Image {url} could not be fetched: {error}")
+                else:
+                    stored.setdefault(sha256, StoredImage(sha256=sha256, size=size, content_type=content_type))
+            if stored:
+                StoredImage.objects.bulk_create(
+                    list(stored.values()),
+                    update_conflicts=True,
+                    unique_fields=['sha256'],
+                    update_fields=['last_used_at']
+                )
+                rows_by_sha = {
+                    image.sha256: image for image in StoredImage.objects.filter(sha256__in=list(stored))
+                }
+                for url, sha256, _, _, error in fetched:
+                    if not error:
+                        images_by_url[url] = rows_by_sha[sha256]
+
+        now = timezone.now()
+        ProductImage.objects.bulk_create(
+            [
+                ProductImage(
+                    product_id=product_id,
+                    url=url,
+                    image=images_by_url.get(url),
+                    error=errors_by_url.get(url),
+                    fetched_at=now
+                )
+                for product_id, url in missing
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'url'],
+            update_fields=['image', 'error', 'fetched_at']
+        )
+        for product_id, url in missing:
+            known[(product_id, url)] = ProductImage(product_id=product_id, url=url, image=images_by_url.get(url))
+
+    paths = {}
+    used = []
+    for product_id, urls in urls_by_product.items():
+        paths[product_id] = []
+        for url in urls:
+            row = known.get((product_id, url))
+            if row is not None and row.image is not None:
+                paths[product_id].append(str(store.path(row.image.sha256)))
+                used.append(row.image.id)
+    StoredImage.touch(used)
+
+    evicted = StoredImage.evict_if_due(
+        getattr(settings, 'AI_IMAGE_STORE_MAX_BYTES', 1024 ** 3),
+        getattr(settings, 'AI_IMAGE_STORE_EVICT_INTERVAL_SECONDS', 300)
+    )
+    for sha256 in evicted:
+        store.delete(sha256)
+    return paths
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.history import ARCHIVES, archive_history
+
+
+class Command(BaseCommand):
+    help = 'Move superseded consensus and final attribute versions past the retention window into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-days',
+            type=int,
+            default=None,
+            help='Keep inactive versions younger than this many days (default: HISTORY_RETENTION_DAYS)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows moved per transaction (default: HISTORY_ARCHIVE_CHUNK_SIZE)'
+        )
+        parser.add_argument(
+            '--kind',
+            action='append',
+            choices=list(ARCHIVES),
+            help='Only archive this history (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the versions due for archival'
+        )
+
+    def handle(self, *args, **options):
+        if options['retention_days'] is not None and options['retention_days'] < 0:
+            raise CommandError('Retention must not be negative')
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be at least 1')
+
+        moved = archive_history(
+            retention_days=options['retention_days'],
+            chunk_size=options['chunk_size'],
+            kinds=options['kind'] or tuple(ARCHIVES),
+            dry_run=options['dry_run'],
+            log=self.stdout.write
+        )
+
+        summary = ', '.join(f'{count} {kind}' for kind, count in moved.items())
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Versions due for archival: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Archived versions: {summary}'))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.ai_backfill import backfill_provider
+from products.models import AIProvider
+
+
+class Command(BaseCommand):
+    help = 'Request only the suggestions a newly added AI provider is missing for already processed products'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--provider',
+            required=True,
+            help='Provider id or name'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Products per set-difference query and commit'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the missing suggestions'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be at least 1')
+
+        lookup = options['provider']
+        provider = AIProvider.objects.filter(
+            **({'id': int(lookup)} if lookup.isdigit() else {'name': lookup})
+        ).first()
+        if provider is None:
+            raise CommandError(f'AI provider {lookup!r} not found')
+        if not provider.is_active:
+            self.stdout.write(self.style.WARNING(
+                f'{provider.name} is inactive; regular AI runs will not use it until it is activated'
+            ))
+
+        totals = backfill_provider(
+            provider,
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(
+                f"{totals['missing']} suggestions missing from {provider.name} across {totals['products']} products"
+            ))
+            return
+        lookups = totals['lookups']
+        hit_rate = f"{totals['hits'] / lookups:.0%}" if lookups else 'n/a'
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {provider.name} in {totals['elapsed']:.1f}s: {totals['calls']} calls "
+            f"({totals['errors']} errors, cache hits {totals['hits']}/{lookups} ({hit_rate})), "
+            f"{totals['stored']} suggestions stored, {totals['consensus']} consensus values recomputed"
+        ))
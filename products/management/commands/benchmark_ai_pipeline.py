@@ -0,0 +1,297 @@
+"""
+Benchmark of the AI pipeline against local stand-in providers.
+
+Seeds a throw-away category with products, attributes and HTTP stand-in
+providers (see ai_standin) whose latency and faults are drawn from seeded
+distributions, then runs the real claim / run_ai_batch loop over those
+products only. Reports products/sec, per-product latency percentiles (from
+the batch claim to the product reaching ai_done) and database statements per
+product, and writes the figures as JSON so runs can be compared.
+
+The seeded providers stay inactive, so workers never pick them up, but
+pending products are claimable by any running ``run_ai_processing`` loop:
+benchmark on a database without live workers. Seeded rows are deleted
+afterwards unless ``--keep`` is given.
+"""
+import json
+import platform
+import random
+import time
+import uuid
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from products.ai_batching import AdaptiveBatchSizer, batch_size_bounds
+from products.ai_control import processing_gate
+from products.ai_pipeline import claim_ai_batch, run_ai_batch, release_ai_batch
+from products.ai_standin import LatencyModel, FaultModel, StandInProviderServer
+from products.taxonomy import taxonomy
+from products.models import (
+    Product, Category, Attribute, CategoryAttributeMapping, AIProvider, AnnotationBatch, BatchItem
+)
+
+WORDS = (
+    'cotton', 'linen', 'slim', 'classic', 'summer', 'winter', 'casual', 'formal',
+    'leather', 'denim', 'striped', 'printed', 'stretch', 'relaxed', 'vintage', 'soft'
+)
+
+
+class StatementCounter:
+    """``connection.execute_wrapper`` hook counting executed statements."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the AI pipeline against seeded stand-in providers and write the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200, help='Products to seed')
+        parser.add_argument('--attributes', type=int, default=8, help='Attributes per product')
+        parser.add_argument('--providers', type=int, default=3, help='Stand-in providers')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Products per batch (default: adaptive)'
+        )
+        parser.add_argument(
+            '--latency',
+            choices=LatencyModel.DISTRIBUTIONS,
+            default='lognormal',
+            help='Latency distribution per provider request'
+        )
+        parser.add_argument('--latency-ms', type=float, default=50, help='Mean (median for lognormal) latency')
+        parser.add_argument('--spread-ms', type=float, default=20, help='Half-width (uniform) or stddev (normal)')
+        parser.add_argument('--sigma', type=float, default=0.5, help='Shape of the lognormal distribution')
+        parser.add_argument('--per-item-ms', type=float, default=2, help='Extra latency per additional batched item')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with HTTP 500')
+        parser.add_argument('--provider-batch-size', type=int, default=10, help='Items per provider request')
+        parser.add_argument('--provider-concurrency', type=int, default=8, help='Concurrent requests per provider')
+        parser.add_argument('--seed', type=int, default=42, help='Seed of the data, latency and faults')
+        parser.add_argument(
+            '--output',
+            default='ai_benchmark.json',
+            help="Results file, or '-' to only print them"
+        )
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded rows')
+
+    def handle(self, *args, **options):
+        for option in ('products', 'attributes', 'providers', 'provider_batch_size', 'provider_concurrency'):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be at least 1")
+        if options['batch_size'] is not None:
+            min_size, max_size = batch_size_bounds()
+            if not min_size <= options['batch_size'] <= max_size:
+                raise CommandError(f'Batch size must be between {min_size} and {max_size}')
+        if processing_gate.is_paused:
+            raise CommandError('AI processing is paused; resume it before benchmarking')
+
+        tag = uuid.uuid4().hex[:8]
+        servers = self.start_servers(options)
+        seeded = None
+        try:
+            seeded = self.seed(tag, options, servers)
+            self.stdout.write(
+                f"Seeded {len(seeded['product_ids'])} products x {options['attributes']} attributes "
+                f"x {options['providers']} providers (run {tag})"
+            )
+            results = self.run(seeded, options)
+        finally:
+            for server in servers:
+                server.stop()
+            if seeded is not None and not options['keep']:
+                self.cleanup(seeded)
+
+        results['config'] = {
+            key: options[key] for key in (
+                'products', 'attributes', 'providers', 'batch_size', 'latency', 'latency_ms', 'spread_ms',
+                'sigma', 'per_item_ms', 'error_rate', 'provider_batch_size', 'provider_concurrency', 'seed'
+            )
+        }
+        results['run'] = {
+            'tag': tag,
+            'finished_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+        }
+        self.report(results)
+        if options['output'] != '-':
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def start_servers(self, options):
+        seed = options['seed']
+        servers = []
+        for index in range(options['providers']):
+            base_seed = seed + 10 * index
+            servers.append(StandInProviderServer(
+                latency=LatencyModel(
+                    distribution=options['latency'],
+                    mean_ms=options['latency_ms'],
+                    spread_ms=options['spread_ms'],
+                    sigma=options['sigma'],
+                    seed=base_seed
+                ),
+                faults=FaultModel(error_rate=options['error_rate'], seed=base_seed + 1),
+                per_item_ms=options['per_item_ms'],
+                seed=base_seed + 2
+            ).start())
+        return servers
+
+    def seed(self, tag, options, servers):
+        rng = random.Random(options['seed'])
+        category = Category.objects.create(name=f'Benchmark {tag}')
+        attributes = Attribute.objects.bulk_create([
+            Attribute(
+                name=f'benchmark_{tag}_{index}',
+                data_type='enum',
+                allowed_values=[f'value {value}' for value in range(5)]
+            )
+            for index in range(options['attributes'])
+        ])
+        CategoryAttributeMapping.objects.bulk_create([
+            CategoryAttributeMapping(category=category, attribute=attribute) for attribute in attributes
+        ])
+        # Bulk inserts send no signals.
+        taxonomy.invalidate()
+        providers = AIProvider.objects.bulk_create([
+            AIProvider(
+                name=f'Benchmark {tag} #{index + 1}',
+                service_name='http',
+                model=f'benchmark-{tag}-{index + 1}',
+                # Inactive so that regular workers never call them.
+                is_active=False,
+                config={
+                    'endpoint': server.endpoint,
+                    'timeout_seconds': 10,
+                    'batch_size': options['provider_batch_size'],
+                    'max_concurrency': options['provider_concurrency'],
+                    # Every run must reach the providers.
+                    'cache': False,
+                }
+            )
+            for index, server in enumerate(servers)
+        ])
+        products = Product.objects.bulk_create([
+            Product(
+                external_sku=f'benchmark-{tag}-{index}',
+                name=' '.join(rng.choice(WORDS) for _ in range(3)).title(),
+                description=' '.join(rng.choice(WORDS) for _ in range(20)),
+                category=category,
+                image_urls=[f'https://example.com/benchmark/{tag}/{index}.jpg'],
+                price=round(rng.uniform(5, 200), 2),
+                status='pending_ai'
+            )
+            for index in range(options['products'])
+        ])
+        return {
+            'category': category,
+            'attribute_ids': [attribute.id for attribute in attributes],
+            'providers': providers,
+            'product_ids': [product.id for product in products],
+            'batch_ids': [],
+        }
+
+    def run(self, seeded, options):
+        sizer = AdaptiveBatchSizer(
+            min_size=options['batch_size'],
+            max_size=options['batch_size'],
+            initial_size=options['batch_size']
+        ) if options['batch_size'] else AdaptiveBatchSizer()
+        counter = StatementCounter()
+        batches = []
+
+        started = time.monotonic()
+        with connection.execute_wrapper(counter):
+            while True:
+                batch, products = claim_ai_batch(
+                    sizer.size, f'Benchmark batch {len(batches) + 1}', product_ids=seeded['product_ids']
+                )
+                if batch is None:
+                    break
+                seeded['batch_ids'].append(batch.id)
+                try:
+                    stats = run_ai_batch(batch, products, log=lambda message: None, ai_providers=seeded['providers'])
+                except Exception:
+                    release_ai_batch(batch, products, reason='benchmark failed')
+                    raise
+                sizer.record(stats)
+                batches.append({
+                    key: round(value, 4) if isinstance(value, float) else value
+                    for key, value in stats.items()
+                })
+                self.stdout.write(
+                    f"  batch {len(batches)}: {stats['products']} products in {stats['elapsed']:.2f}s, "
+                    f"{stats['errors']} errors"
+                )
+                if sizer.delay:
+                    time.sleep(sizer.delay)
+        elapsed = time.monotonic() - started
+
+        # Latency of a product: from its batch being claimed to it reaching ai_done.
+        latencies = np.array([
+            (done_at - claimed_at).total_seconds() * 1000
+            for done_at, claimed_at in BatchItem.objects.filter(
+                batch_id__in=seeded['batch_ids'],
+                product__status='ai_done'
+            ).values_list('product__updated_at', 'batch__created_at')
+        ])
+        products = len(seeded['product_ids'])
+        done = len(latencies)
+
+        def percentile(q):
+            return round(float(np.percentile(latencies, q)), 1) if done else None
+
+        return {
+            'results': {
+                'products': products,
+                'products_done': done,
+                'batches': len(batches),
+                'elapsed_seconds': round(elapsed, 3),
+                'products_per_second': round(done / elapsed, 2) if elapsed > 0 else None,
+                'latency_ms': {
+                    'p50': percentile(50),
+                    'p95': percentile(95),
+                    'p99': percentile(99),
+                    'max': round(float(latencies.max()), 1) if done else None,
+                },
+                'provider_calls': sum(batch['calls'] for batch in batches),
+                'provider_errors': sum(batch['errors'] for batch in batches),
+                'db_statements': counter.count,
+                'db_statements_per_product': round(counter.count / products, 2),
+            },
+            'batches': batches,
+        }
+
+    def cleanup(self, seeded):
+        # Suggestions, consensus and batch items cascade from products and batches.
+        Product.objects.filter(id__in=seeded['product_ids']).delete()
+        AnnotationBatch.objects.filter(id__in=seeded['batch_ids']).delete()
+        AIProvider.objects.filter(id__in=[provider.id for provider in seeded['providers']]).delete()
+        Attribute.objects.filter(id__in=seeded['attribute_ids']).delete()
+        seeded['category'].delete()
+
+    def report(self, results):
+        summary = results['results']
+        latency = summary['latency_ms']
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['products_done']}/{summary['products']} products in {summary['elapsed_seconds']:.2f}s "
+            f"({summary['products_per_second']} products/sec) over {summary['batches']} batches"
+        ))
+        self.stdout.write(
+            f"Latency per product: p50 {latency['p50']}ms, p95 {latency['p95']}ms, p99 {latency['p99']}ms"
+        )
+        self.stdout.write(
+            f"{summary['provider_calls']} provider calls, {summary['provider_errors']} errors, "
+            f"{summary['db_statements']} DB statements ({summary['db_statements_per_product']}/product)"
+        )
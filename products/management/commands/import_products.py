@@ -0,0 +1,318 @@
+"""
+Bulk product import: streams CSV or JSONL and loads it with PostgreSQL COPY.
+
+Rows are read one at a time, so memory stays constant whatever the file size.
+Every ``--chunk-size`` rows are COPY'd into a temporary staging table and
+upserted into products on ``external_sku`` in one statement; rows whose
+content did not change are left alone.
+
+Columns / keys: external_sku (or sku), name, description, category,
+subcategory, image_urls, price. In CSV, image_urls is a JSON array or a list
+separated by ``--image-separator``.
+
+Every row is checked against the column limits (SKU and category lengths,
+numeric(10,2) price) before it is buffered, so a bad row is skipped and
+reported instead of failing the COPY after earlier chunks were committed.
+"""
+import csv
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from products.image_store import image_url_error
+from products.models import Product, Category, SubCategory, AIJob
+
+STAGING_TABLE = 'product_import_staging'
+STAGING_COLUMNS = (
+    'line', 'external_sku', 'name', 'description',
+    'category_id', 'subcategory_id', 'image_urls', 'price'
+)
+
+PRICE_FIELD = Product._meta.get_field('price')
+# numeric(10, 2) holds up to 99999999.99
+PRICE_LIMIT = Decimal(10) ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places)
+TEXT_LIMITS = (
+    ('external_sku', Product._meta.get_field('external_sku').max_length),
+    ('category', Category._meta.get_field('name').max_length),
+    ('subcategory', SubCategory._meta.get_field('name').max_length),
+)
+
+
+def copy_field(value):
+    """Format one value for COPY ... (FORMAT csv): NULL is an unquoted empty field."""
+    if value is None:
+        return ''
+    if isinstance(value, (int, Decimal)):
+        return str(value)
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def array_literal(values):
+    """PostgreSQL text[] literal."""
+    items = ('"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"' for value in values)
+    return '{' + ','.join(items) + '}'
+
+
+class TaxonomyCache:
+    """Category/subcategory ids by name, loaded once and extended on demand."""
+
+    def __init__(self):
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.subcategories = {
+            (category_id, name): subcategory_id
+            for subcategory_id, category_id, name in SubCategory.objects.values_list('id', 'category_id', 'name')
+        }
+        self.created = 0
+
+    def category_id(self, name):
+        if not name:
+            return None
+        if name not in self.categories:
+            category, created = Category.objects.get_or_create(name=name)
+            self.categories[name] = category.id
+            self.created += created
+        return self.categories[name]
+
+    def subcategory_id(self, category_id, name):
+        if not category_id or not name:
+            return None
+        key = (category_id, name)
+        if key not in self.subcategories:
+            subcategory, created = SubCategory.objects.get_or_create(category_id=category_id, name=name)
+            self.subcategories[key] = subcategory.id
+            self.created += created
+        return self.subcategories[key]
+
+
+class Command(BaseCommand):
+    help = 'Stream products from a CSV or JSONL file into the database using COPY'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file, or '-' for stdin")
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default=None,
+            help='Input format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Rows per COPY and upsert'
+        )
+        parser.add_argument(
+            '--image-separator',
+            default='|',
+            help='Separator of image_urls in CSV input when not a JSON array'
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help='Queue AI jobs for every pending_ai product after the import'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('import_products requires PostgreSQL')
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be at least 1')
+
+        path = options['path']
+        input_format = options['format']
+        if input_format is None:
+            if path.endswith('.csv'):
+                input_format = 'csv'
+            elif path.endswith(('.jsonl', '.ndjson')):
+                input_format = 'jsonl'
+            else:
+                raise CommandError('Cannot tell the input format; pass --format')
+
+        self.image_separator = options['image_separator']
+        self.taxonomy = TaxonomyCache()
+        self.totals = {'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0}
+        self.started = time.monotonic()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            records = self.read_csv(stream) if input_format == 'csv' else self.read_jsonl(stream)
+            self.load(records, options['chunk_size'])
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.monotonic() - self.started
+        rate = self.totals['rows'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.totals['rows']} rows in {elapsed:.1f}s ({rate:.0f} rows/sec): "
+            f"{self.totals['inserted']} inserted, {self.totals['updated']} updated, "
+            f"{self.totals['skipped']} skipped, {self.taxonomy.created} categories/subcategories created"
+        ))
+
+        # Before enqueueing, so the jobs pick up the new priorities.
+        changed = Product.refresh_priorities()
+        self.stdout.write(f'Refreshed AI priority of {changed} pending products')
+
+        if options['enqueue']:
+            queued = AIJob.enqueue_pending()
+            self.stdout.write(self.style.SUCCESS(f'Queued {queued} pending products'))
+
+    def read_csv(self, stream):
+        for line, row in enumerate(csv.DictReader(stream), start=2):
+            yield line, row
+
+    def read_jsonl(self, stream):
+        for line, text in enumerate(stream, start=1):
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                record = json.loads(text)
+            except ValueError as e:
+                self.skip(line, f'invalid JSON ({e})')
+                continue
+            if not isinstance(record, dict):
+                self.skip(line, 'not a JSON object')
+                continue
+            yield line, record
+
+    def skip(self, line, reason):
+        self.totals['skipped'] += 1
+        if self.totals['skipped'] <= 20:
+            self.stdout.write(self.style.WARNING(f'Line {line}: skipped, {reason}'))
+
+    def parse_image_urls(self, value):
+        if value is None or value == '':
+            return []
+        if isinstance(value, list):
+            return [str(url) for url in value if url]
+        value = str(value).strip()
+        if value.startswith('['):
+            return [str(url) for url in json.loads(value) if url]
+        return [url.strip() for url in value.split(self.image_separator) if url.strip()]
+
+    def to_copy_row(self, line, record):
+        """Return the COPY line for a record, or None when it has to be skipped."""
+        def text(key):
+            value = record.get(key)
+            if value is None:
+                return None
+            value = str(value).strip()
+            return value or None
+
+        sku = text('external_sku') or text('sku')
+        name = text('name')
+        if not sku or not name:
+            self.skip(line, 'external_sku and name are required')
+            return None
+        values = {'external_sku': sku, 'category': text('category'), 'subcategory': text('subcategory')}
+        for key, limit in TEXT_LIMITS:
+            if values[key] and len(values[key]) > limit:
+                self.skip(line, f'{key} longer than {limit} characters')
+                return None
+
+        price = text('price')
+        try:
+            price = Decimal(price).quantize(Decimal('0.01')) if price is not None else None
+        except InvalidOperation:
+            self.skip(line, f'invalid price {price!r}')
+            return None
+        if price is not None and not (price.is_finite() and abs(price) < PRICE_LIMIT):
+            self.skip(line, f'price {text("price")!r} out of range')
+            return None
+        try:
+            image_urls = self.parse_image_urls(record.get('image_urls'))
+        except ValueError as e:
+            self.skip(line, f'invalid image_urls ({e})')
+            return None
+        for url in image_urls:
+            error = image_url_error(url)
+            if error:
+                self.skip(line, f'invalid image URL {url!r}: {error}')
+                return None
+
+        category_id = self.taxonomy.category_id(values['category'])
+        subcategory_id = self.taxonomy.subcategory_id(category_id, values['subcategory'])
+        fields = (
+            line, sku, name, text('description'),
+            category_id, subcategory_id, array_literal(image_urls), price
+        )
+        return ','.join(copy_field(value) for value in fields) + '\n'
+
+    def load(self, records, chunk_size):
+        buffer = io.StringIO()
+        buffered = 0
+        for line, record in records:
+            copy_row = self.to_copy_row(line, record)
+            if copy_row is None:
+                continue
+            buffer.write(copy_row)
+            buffered += 1
+            if buffered >= chunk_size:
+                self.flush(buffer, buffered)
+                buffer = io.StringIO()
+                buffered = 0
+        if buffered:
+            self.flush(buffer, buffered)
+
+    def flush(self, buffer, rows):
+        buffer.seek(0)
+        table = Product._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                    line bigint,
+                    external_sku text,
+                    name text,
+                    description text,
+                    category_id bigint,
+                    subcategory_id bigint,
+                    image_urls text[],
+                    price numeric(10, 2)
+                ) ON COMMIT DELETE ROWS
+                """
+            )
+            cursor.copy_expert(
+                f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            # The last row wins when a SKU repeats within the chunk.
+            cursor.execute(
+                f"""
+                INSERT INTO {table} AS p
+                    (external_sku, name, description, category_id, subcategory_id,
+                     image_urls, price, status, priority_boost, priority, ai_failures, created_at, updated_at)
+                SELECT DISTINCT ON (external_sku)
+                    external_sku, name, description, category_id, subcategory_id,
+                    image_urls, price, 'pending_ai', 0, 0, 0, NOW(), NOW()
+                FROM {STAGING_TABLE}
+                ORDER BY external_sku, line DESC
+                ON CONFLICT (external_sku) DO UPDATE SET
+                    name = EXCLUDED.name,
+                    description = EXCLUDED.description,
+                    category_id = EXCLUDED.category_id,
+                    subcategory_id = EXCLUDED.subcategory_id,
+                    image_urls = EXCLUDED.image_urls,
+                    price = EXCLUDED.price,
+                    updated_at = NOW()
+                WHERE (p.name, p.description, p.category_id, p.subcategory_id, p.image_urls, p.price)
+                    IS DISTINCT FROM
+                    (EXCLUDED.name, EXCLUDED.description, EXCLUDED.category_id,
+                     EXCLUDED.subcategory_id, EXCLUDED.image_urls, EXCLUDED.price)
+                RETURNING (xmax = 0)
+                """
+            )
+            outcomes = [inserted for inserted, in cursor.fetchall()]
+
+        inserted = sum(outcomes)
+        self.totals['rows'] += rows
+        self.totals['inserted'] += inserted
+        self.totals['updated'] += len(outcomes) - inserted
+        elapsed = time.monotonic() - self.started
+        rate = self.totals['rows'] / elapsed if elapsed > 0 else 0
+        self.stdout.write(f"  {self.totals['rows']} rows loaded ({rate:.0f} rows/sec)")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.image_store import ImageStore, prefetch_images
+from products.models import Product, StoredImage
+
+
+class Command(BaseCommand):
+    help = 'Download product images into the local content-addressed image store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--status',
+            action='append',
+            choices=[value for value, _ in Product.STATUS_CHOICES],
+            help='Only products in this status (repeatable; default: all)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=200,
+            help='Products per prefetch round'
+        )
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('Chunk size must be at least 1')
+
+        products = Product.objects.order_by('id').only('id', 'name', 'image_urls')
+        if options['status']:
+            products = products.filter(status__in=options['status'])
+
+        store = ImageStore()
+        total = with_images = 0
+        last_id = 0
+        while True:
+            chunk = list(products.filter(id__gt=last_id)[:options['chunk_size']])
+            if not chunk:
+                break
+            last_id = chunk[-1].id
+            paths = prefetch_images(chunk, log=self.stdout.write, store=store)
+            total += len(chunk)
+            with_images += sum(1 for product_paths in paths.values() if product_paths)
+            self.stdout.write(f'  {total} products checked')
+
+        images = StoredImage.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'{with_images}/{total} products have local images; {images} distinct images in {store.root}'
+        ))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from products.ai_recovery import reap_stale_ai_work
+
+
+class Command(BaseCommand):
+    help = 'Requeue products left in ai_running by crashed or abandoned AI batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-seconds',
+            type=int,
+            default=None,
+            help='Age of the last batch checkpoint after which it counts as abandoned (default: AI_STALE_BATCH_SECONDS)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be requeued'
+        )
+
+    def handle(self, *args, **options):
+        batches, products = reap_stale_ai_work(
+            stale_seconds=options['stale_seconds'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write
+        )
+        if not options['dry_run'] and not batches and not products:
+            self.stdout.write(self.style.SUCCESS('No abandoned AI work found'))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute the AI priority of pending products (run periodically, e.g. daily, so the new-product bonus expires)'
+
+    def handle(self, *args, **options):
+        changed = Product.refresh_priorities()
+        self.stdout.write(self.style.SUCCESS(f'Updated the AI priority of {changed} pending products'))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from products.models import AIJob
+from products.ai_worker import AIWorker
+
+
+class Command(BaseCommand):
+    help = 'Run a queue worker that claims leased AI jobs and processes them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Fixed number of jobs claimed per batch (default: adaptive, see AI_BATCH_* settings)'
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=None,
+            help='Lease duration for claimed jobs (default: AI_JOB_LEASE_SECONDS)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=5,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--worker-id',
+            default=None,
+            help='Identifier recorded on leased jobs (default: host:pid:random)'
+        )
+        parser.add_argument(
+            '--enqueue-pending',
+            action='store_true',
+            help='Queue every pending_ai product before starting'
+        )
+        parser.add_argument(
+            '--drain',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for new jobs'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            self.stdout.write(self.style.ERROR('Batch size must be at least 1'))
+            return
+
+        if options['enqueue_pending']:
+            queued = AIJob.enqueue_pending()
+            self.stdout.write(self.style.SUCCESS(f'Queued {queued} pending products'))
+
+        worker = AIWorker(
+            worker_id=options['worker_id'],
+            batch_size=options['batch_size'],
+            lease_seconds=options['lease_seconds'],
+            poll_interval=options['poll_interval'],
+            log=self.stdout.write
+        )
+        worker.run(drain=options['drain'])
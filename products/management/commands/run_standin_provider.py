@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from products.ai_standin import LatencyModel, FaultModel, StandInProviderServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local HTTP stand-in AI provider with configurable latency and errors'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument(
+            '--latency',
+            choices=LatencyModel.DISTRIBUTIONS,
+            default='lognormal',
+            help='Latency distribution per request'
+        )
+        parser.add_argument('--latency-ms', type=float, default=300, help='Mean (median for lognormal) latency')
+        parser.add_argument('--spread-ms', type=float, default=100, help='Half-width (uniform) or stddev (normal)')
+        parser.add_argument('--sigma', type=float, default=0.5, help='Shape of the lognormal distribution')
+        parser.add_argument('--per-item-ms', type=float, default=0, help='Extra latency per additional batched item')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests answered with HTTP 500')
+        parser.add_argument('--rate-limit-rate', type=float, default=0, help='Fraction of requests answered with HTTP 429')
+        parser.add_argument('--timeout-rate', type=float, default=0, help='Fraction of requests that hang')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for reproducible latency, faults and values')
+
+    def handle(self, *args, **options):
+        seed = options['seed']
+        server = StandInProviderServer(
+            (options['host'], options['port']),
+            latency=LatencyModel(
+                distribution=options['latency'],
+                mean_ms=options['latency_ms'],
+                spread_ms=options['spread_ms'],
+                sigma=options['sigma'],
+                seed=seed
+            ),
+            faults=FaultModel(
+                error_rate=options['error_rate'],
+                rate_limit_rate=options['rate_limit_rate'],
+                timeout_rate=options['timeout_rate'],
+                seed=None if seed is None else seed + 1
+            ),
+            per_item_ms=options['per_item_ms'],
+            seed=None if seed is None else seed + 2
+        )
+        self.stdout.write(self.style.SUCCESS(f'Stand-in provider listening on {server.endpoint}'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f'Served {server.requests_served} requests')
@@ -13,7 +13,8 @@ class Command(BaseCommand):
                 'config': {
                     'api_key_env': 'OPENAI_API_KEY',
                     'max_tokens': 1000,
-                    'temperature': 0.1
+                    'temperature': 0.1,
+                    'max_concurrency': 4
                 }
             },
             {
@@ -23,7 +24,24 @@ class Command(BaseCommand):
                 'config': {
                     'api_key_env': 'ANTHROPIC_API_KEY',
                     'max_tokens': 1000,
-                    'temperature': 0.1
+                    'temperature': 0.1,
+                    'max_concurrency': 4
+                }
+            },
+            {
+                # Local stand-in (see run_standin_provider); activate it to
+                # exercise the pipeline without network access.
+                'name': 'Local Stand-in',
+                'service_name': 'http',
+                'model': 'standin-1',
+                'is_active': False,
+                'config': {
+                    'endpoint': 'http://127.0.0.1:8765/v1/suggest',
+                    'timeout_seconds': 10,
+                    'batch_size': 10,
+                    'max_concurrency': 8,
+                    'requests_per_min': 600,
+                    'tokens_per_min': 200000
                 }
             }
         ]
@@ -1094,4 +1094,5 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(self.style.SUCCESS(f'Created product: {product.name}'))
         
+        Product.refresh_priorities()
         self.stdout.write(self.style.SUCCESS('Sample data setup completed successfully with 100 products!'))
\ No newline at end of file
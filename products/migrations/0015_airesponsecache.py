@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_aijob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIResponseCache',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('model', models.CharField(max_length=100)),
+                ('suggested_value', models.TextField()),
+                ('confidence_score', models.DecimalField(blank=True, decimal_places=4, max_digits=5, null=True)),
+                ('raw_response', models.JSONField(blank=True, null=True)),
+                ('hit_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'ai_response_cache',
+                'indexes': [models.Index(fields=['last_used_at'], name='ai_response_last_us_0bacfa_idx'), models.Index(fields=['expires_at'], name='ai_response_expires_cabb5c_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0015_airesponsecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aijob',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='ai_priority_weight',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='priority_boost',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='aijob',
+            index=models.Index(fields=['status', '-priority', 'id'], name='ai_jobs_status_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', '-priority', 'id'], name='products_status_priority_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['status', 'id'], name='products_status_id_idx'),
+        ),
+    ]
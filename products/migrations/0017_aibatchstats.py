@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0016_ai_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIBatchStats',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('products', models.IntegerField(default=0)),
+                ('products_done', models.IntegerField(default=0)),
+                ('provider_calls', models.IntegerField(default=0)),
+                ('provider_errors', models.IntegerField(default=0)),
+                ('cache_hits', models.IntegerField(default=0)),
+                ('cache_lookups', models.IntegerField(default=0)),
+                ('elapsed_seconds', models.FloatField(default=0.0)),
+                ('provider_seconds', models.FloatField(default=0.0)),
+                ('db_seconds', models.FloatField(default=0.0)),
+                ('stages', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('batch', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ai_stats', to='products.annotationbatch')),
+            ],
+            options={
+                'db_table': 'ai_batch_stats',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
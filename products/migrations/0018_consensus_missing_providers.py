@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0017_aibatchstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aiconsensus',
+            name='missing_providers',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_consensus_missing_providers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attribute',
+            name='early_exit_threshold',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=5, null=True),
+        ),
+    ]
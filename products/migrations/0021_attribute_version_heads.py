@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# One head per pair with any consensus or final history, at the highest
+# version of each.
+BACKFILL_HEADS_SQL = """
+INSERT INTO attribute_version_heads (product_id, attribute_id, consensus_version, final_version)
+SELECT product_id, attribute_id, MAX(consensus_version), MAX(final_version)
+FROM (
+    SELECT product_id, attribute_id, version AS consensus_version, 0 AS final_version
+    FROM ai_consensus
+    UNION ALL
+    SELECT product_id, attribute_id, 0, version
+    FROM final_attributes
+) AS history
+GROUP BY product_id, attribute_id
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0020_image_store'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttributeVersionHead',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('consensus_version', models.PositiveIntegerField(default=0)),
+                ('final_version', models.PositiveIntegerField(default=0)),
+                ('attribute', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.attribute')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='version_heads', to='products.product')),
+            ],
+            options={
+                'db_table': 'attribute_version_heads',
+                'constraints': [models.UniqueConstraint(fields=('product', 'attribute'), name='unique_attribute_version_head')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_HEADS_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Superseded versions moved out of ai_consensus and final_attributes by
+# archive_history. Range-partitioned by created_at; the command creates the
+# monthly partitions as it needs them, so old months can be detached or
+# dropped wholesale.
+CREATE_ARCHIVES_SQL = """
+CREATE TABLE ai_consensus_archive (
+    id bigint NOT NULL,
+    product_id bigint NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+    attribute_id bigint NOT NULL REFERENCES attributes (id) ON DELETE CASCADE,
+    consensus_value text NOT NULL,
+    method varchar(50) NOT NULL,
+    confidence numeric(5, 4),
+    missing_providers jsonb NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    is_active boolean NOT NULL,
+    version integer NOT NULL,
+    archived_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE INDEX ai_consensus_archive_pair_idx ON ai_consensus_archive (product_id, attribute_id, version);
+
+CREATE TABLE final_attributes_archive (
+    id bigint NOT NULL,
+    product_id bigint NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+    attribute_id bigint NOT NULL REFERENCES attributes (id) ON DELETE CASCADE,
+    final_value text NOT NULL,
+    source varchar(20) NOT NULL,
+    decided_by_id integer REFERENCES auth_user (id) ON DELETE SET NULL,
+    confidence_score numeric(5, 4),
+    created_at timestamp with time zone NOT NULL,
+    is_active boolean NOT NULL,
+    version integer NOT NULL,
+    archived_at timestamp with time zone NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+CREATE INDEX final_attributes_archive_pair_idx ON final_attributes_archive (product_id, attribute_id, version);
+"""
+
+DROP_ARCHIVES_SQL = """
+DROP TABLE IF EXISTS final_attributes_archive;
+DROP TABLE IF EXISTS ai_consensus_archive;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_attribute_version_heads'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aiconsensus',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['created_at'], name='ai_consensus_inactive_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='finalattribute',
+            index=models.Index(condition=models.Q(('is_active', False)), fields=['created_at'], name='final_attributes_inactive_idx'),
+        ),
+        migrations.RunSQL(CREATE_ARCHIVES_SQL, DROP_ARCHIVES_SQL),
+    ]
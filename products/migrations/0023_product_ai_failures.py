@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0022_history_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='ai_failures',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -1,15 +1,62 @@
-from django.db import models
-from django.db.models import Q, Max
+from django.db import models, connection, transaction
+from django.db.models import Q, F
+from django.utils import timezone
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+import hashlib
 import json
+import threading
+import time
+from datetime import timedelta
+
+_maintenance_lock = threading.Lock()
+_maintenance_runs = {}
+
+
+def aging_slots(batch_size):
+    """
+    How many of ``batch_size`` claim slots go to the oldest pending work
+    regardless of priority (AI_PRIORITY_AGING_SHARE), so nothing starves.
+    """
+    from django.conf import settings
+    share = getattr(settings, 'AI_PRIORITY_AGING_SHARE', 0.2)
+    if share <= 0 or batch_size <= 1:
+        return 0
+    return min(batch_size, max(1, round(batch_size * share)))
+
+
+def maintenance_due(name, interval_seconds):
+    """
+    True when the maintenance task ``name`` last ran in this process more than
+    ``interval_seconds`` ago (or never), and records that it runs now.
+    """
+    now = time.monotonic()
+    with _maintenance_lock:
+        last = _maintenance_runs.get(name)
+        if last is not None and now - last < interval_seconds:
+            return False
+        _maintenance_runs[name] = now
+    return True
+
+
+def estimated_rows(model):
+    """Live row count of ``model``'s table from the statistics collector, without scanning it."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT n_live_tup FROM pg_stat_user_tables WHERE relid = %s::regclass",
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else 0
 
 
 class Category(models.Model):
     """Top-level taxonomy for products."""
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=80, unique=True)
+    # Added to the AI priority of every product in the category.
+    ai_priority_weight = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -73,12 +120,22 @@ class Product(models.Model):
     image_urls = ArrayField(models.TextField(), blank=True, default=list)
     price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending_ai')
+    # Explicit manual boost; ``priority`` is derived by refresh_priorities().
+    priority_boost = models.IntegerField(default=0)
+    priority = models.IntegerField(default=0)
+    # AI passes in a row that left provider calls unanswered (see
+    # persist_batch_results); reset once a pass completes.
+    ai_failures = models.PositiveSmallIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'products'
         ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'id'], name='products_status_priority_idx'),
+            models.Index(fields=['status', 'id'], name='products_status_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.external_sku})"
@@ -89,6 +146,62 @@ class Product(models.Model):
         if self.subcategory and self.category and self.subcategory.category_id != self.category_id:
             raise ValidationError("Subcategory must belong to the selected category.")
 
+    @classmethod
+    def refresh_priorities(cls, product_ids=None):
+        """
+        Recompute ``priority`` of pending_ai products (all, or ``product_ids``)
+        and copy it onto their queued AI jobs. Returns the number of products changed.
+
+        priority = category weight + boost
+                   + AI_PRIORITY_NEW_BONUS if created in the last AI_PRIORITY_NEW_DAYS days
+                   + one point per AI_PRIORITY_PRICE_STEP of price, up to AI_PRIORITY_PRICE_CAP
+        """
+        from django.conf import settings
+        new_days = getattr(settings, 'AI_PRIORITY_NEW_DAYS', 30)
+        new_bonus = getattr(settings, 'AI_PRIORITY_NEW_BONUS', 50)
+        price_step = getattr(settings, 'AI_PRIORITY_PRICE_STEP', 10)
+        price_cap = getattr(settings, 'AI_PRIORITY_PRICE_CAP', 50)
+
+        params = [new_days, new_bonus]
+        price_term = '0'
+        if price_step > 0:
+            price_term = 'LEAST(%s, FLOOR(COALESCE(p.price, 0) / %s))::integer'
+            params += [price_cap, price_step]
+        id_filter = ''
+        if product_ids is not None:
+            id_filter = 'AND p.id = ANY(%s::bigint[])'
+            params.append(list(product_ids))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH scored AS (
+                    SELECT p.id,
+                           COALESCE(c.ai_priority_weight, 0) + p.priority_boost
+                           + CASE WHEN p.created_at >= NOW() - make_interval(days => %s) THEN %s ELSE 0 END
+                           + {price_term} AS score
+                    FROM {cls._meta.db_table} AS p
+                    LEFT JOIN {Category._meta.db_table} AS c ON c.id = p.category_id
+                    WHERE p.status = 'pending_ai' {id_filter}
+                )
+                UPDATE {cls._meta.db_table} AS p
+                SET priority = scored.score
+                FROM scored
+                WHERE p.id = scored.id AND p.priority <> scored.score
+                """,
+                params
+            )
+            changed = cursor.rowcount
+            cursor.execute(
+                f"""
+                UPDATE {AIJob._meta.db_table} AS j
+                SET priority = p.priority
+                FROM {cls._meta.db_table} AS p
+                WHERE j.product_id = p.id AND j.status = 'queued' AND j.priority <> p.priority
+                """
+            )
+        return changed
+
     def get_applicable_attributes(self, required_only: bool = False):
         """Return queryset of attributes relevant to this product."""
         return CategoryAttributeMapping.get_attributes_for_product(
@@ -109,6 +222,9 @@ class Attribute(models.Model):
     name = models.CharField(max_length=120, unique=True)
     data_type = models.CharField(max_length=20, choices=DATA_TYPE_CHOICES)
     allowed_values = models.JSONField(blank=True, null=True)
+    # With AI_EARLY_EXIT, the remaining providers are skipped once the first
+    # ones agree with at least this confidence; empty asks every provider.
+    early_exit_threshold = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -171,42 +287,52 @@ class CategoryAttributeMapping(models.Model):
         if self.subcategory and self.subcategory.category_id != self.category_id:
             raise ValidationError("Subcategory must belong to the selected category.")
 
-    @classmethod
-    def _base_queryset(cls, category, required_only=False):
-        if not category:
-            return cls.objects.none()
-        qs = cls.objects.filter(category=category)
-        if required_only:
-            qs = qs.filter(is_required=True)
-        return qs
-
     @classmethod
     def _attribute_ids(cls, category, subcategory=None, required_only=False):
-        qs = cls._base_queryset(category, required_only=required_only)
-        if not qs.exists():
-            return []
-
-        attr_ids = set(
-            qs.filter(subcategory__isnull=True)
-            .values_list('attribute_id', flat=True)
-        )
-
-        if subcategory:
-            sub_qs = qs.filter(subcategory=subcategory)
-            attr_ids.update(sub_qs.values_list('attribute_id', flat=True))
-
-        return list(attr_ids)
+        from .taxonomy import taxonomy
+        return list(taxonomy.current().attribute_ids_for(
+            getattr(category, 'id', category),
+            getattr(subcategory, 'id', subcategory),
+            required_only=required_only
+        ))
 
     @classmethod
     def get_attribute_ids_for_product(cls, product, required_only=False):
-        if not product or not product.category:
+        if not product or not product.category_id:
             return []
         return cls._attribute_ids(
-            category=product.category,
-            subcategory=product.subcategory,
+            category=product.category_id,
+            subcategory=product.subcategory_id,
             required_only=required_only
         )
 
+    @classmethod
+    def attribute_ids_for_products(cls, products, required_only=False):
+        """
+        ``{product_id: frozenset of mapped attribute ids}`` for many products.
+
+        ``products`` are Product instances, resolved without queries, or ids,
+        resolved with one query. As with get_attribute_ids_for_product the set
+        is empty when nothing is mapped for a product, and every id passed in
+        gets an entry, unknown or deleted ones included.
+        """
+        from .taxonomy import taxonomy, EMPTY
+        products = list(products)
+        ids = [product for product in products if not isinstance(product, Product)]
+        scopes = [
+            (product.id, product.category_id, product.subcategory_id)
+            for product in products if isinstance(product, Product)
+        ]
+        if ids:
+            scopes += Product.objects.filter(id__in=ids).values_list('id', 'category_id', 'subcategory_id')
+        current = taxonomy.current()
+        resolved = dict.fromkeys(ids, EMPTY)
+        resolved.update(
+            (product_id, current.attribute_ids_for(category_id, subcategory_id, required_only=required_only))
+            for product_id, category_id, subcategory_id in scopes
+        )
+        return resolved
+
     @classmethod
     def get_attributes_for_product(cls, product, required_only=False):
         attr_ids = cls.get_attribute_ids_for_product(product, required_only=required_only)
@@ -304,6 +430,73 @@ class AISuggestion(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name} - {self.provider.name}"
 
+class AttributeVersionHead(models.Model):
+    """
+    Current consensus and final version of one (product, attribute) pair.
+
+    Writers claim the next version by upserting the head, which also locks it
+    until commit, so concurrent writers of a pair take turns instead of racing
+    on MAX(version). History stays in ai_consensus and final_attributes; the
+    active row of a pair is found through their partial unique index on
+    (product, attribute) WHERE is_active.
+    """
+    # kind -> version column
+    KINDS = {
+        'consensus': 'consensus_version',
+        'final': 'final_version',
+    }
+
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='version_heads')
+    attribute = models.ForeignKey(Attribute, on_delete=models.CASCADE, related_name='+')
+    consensus_version = models.PositiveIntegerField(default=0)
+    final_version = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'attribute_version_heads'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'attribute'], name='unique_attribute_version_head')
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}/{self.attribute_id}: consensus v{self.consensus_version}, final v{self.final_version}"
+
+    @classmethod
+    def advance(cls, kind, pairs):
+        """
+        Claim the next ``kind`` version of each (product_id, attribute_id) pair.
+
+        Returns ``{pair: version}``. The head rows stay locked until the
+        surrounding transaction ends.
+        """
+        pairs = sorted(set(pairs))
+        if not pairs:
+            return {}
+        version_column = cls.KINDS[kind]
+        initial = {column: 0 for column in cls.KINDS.values()}
+        initial[version_column] = 1
+        table = cls._meta.db_table
+        with connection.cursor() as cursor:
+            # Sorted, so concurrent writers lock shared heads in the same order.
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (product_id, attribute_id, consensus_version, final_version)
+                SELECT p.product_id, p.attribute_id, %s, %s
+                FROM unnest(%s::bigint[], %s::bigint[]) AS p(product_id, attribute_id)
+                ORDER BY p.product_id, p.attribute_id
+                ON CONFLICT (product_id, attribute_id)
+                DO UPDATE SET {version_column} = {table}.{version_column} + 1
+                RETURNING product_id, attribute_id, {version_column}
+                """,
+                [
+                    initial['consensus_version'],
+                    initial['final_version'],
+                    [pair[0] for pair in pairs],
+                    [pair[1] for pair in pairs]
+                ]
+            )
+            return {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+
 class AIConsensus(models.Model):
     id = models.BigAutoField(primary_key=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -311,6 +504,9 @@ class AIConsensus(models.Model):
     consensus_value = models.TextField()
     method = models.CharField(max_length=50)
     confidence = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True)
+    # Ids of the providers expected to vote that gave no answer (failed,
+    # timed out, skipped by their circuit breaker or replaced by a backup).
+    missing_providers = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
     version = models.PositiveIntegerField(default=1)
@@ -325,6 +521,10 @@ class AIConsensus(models.Model):
                 name='unique_active_ai_consensus'
             )
         ]
+        indexes = [
+            # Superseded versions, oldest first, for archive_history.
+            models.Index(fields=['created_at'], condition=Q(is_active=False), name='ai_consensus_inactive_idx')
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name}"
@@ -340,19 +540,63 @@ class AIConsensus(models.Model):
         confidence=None
     ):
         """Persist a new consensus version while keeping history."""
-        cls.objects.filter(product=product, attribute=attribute, is_active=True).update(is_active=False)
-        latest_version = cls.objects.filter(product=product, attribute=attribute).aggregate(
-            max_version=Max('version')
-        )['max_version'] or 0
-        return cls.objects.create(
-            product=product,
-            attribute=attribute,
-            consensus_value=consensus_value,
-            method=method,
-            confidence=confidence,
-            version=latest_version + 1,
-            is_active=True
-        )
+        with transaction.atomic():
+            consensus, = cls.record_many([{
+                'product_id': product.id,
+                'attribute_id': attribute.id,
+                'consensus_value': consensus_value,
+                'method': method,
+                'confidence': confidence
+            }])
+        consensus.product = product
+        consensus.attribute = attribute
+        return consensus
+
+    @classmethod
+    def record_many(cls, entries):
+        """
+        Persist new consensus versions for many (product, attribute) pairs at once.
+
+        ``entries`` is an iterable of dicts with ``product_id``, ``attribute_id``,
+        ``consensus_value``, ``method`` and optional ``confidence`` and
+        ``missing_providers``. Later entries for the same pair win. Versions
+        come from AttributeVersionHead; claiming them, deactivation and
+        insertion each run as a single statement. Call inside a transaction.
+        """
+        entries_by_pair = {}
+        for entry in entries:
+            entries_by_pair[(entry['product_id'], entry['attribute_id'])] = entry
+        if not entries_by_pair:
+            return []
+
+        versions = AttributeVersionHead.advance('consensus', entries_by_pair)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {cls._meta.db_table} AS c
+                SET is_active = FALSE
+                FROM unnest(%s::bigint[], %s::bigint[]) AS p(product_id, attribute_id)
+                WHERE c.product_id = p.product_id
+                  AND c.attribute_id = p.attribute_id
+                  AND c.is_active
+                """,
+                [[pair[0] for pair in entries_by_pair], [pair[1] for pair in entries_by_pair]]
+            )
+
+        created = cls.objects.bulk_create([
+            cls(
+                product_id=product_id,
+                attribute_id=attribute_id,
+                consensus_value=entry['consensus_value'],
+                method=entry['method'],
+                confidence=entry.get('confidence'),
+                missing_providers=entry.get('missing_providers', []),
+                version=versions[(product_id, attribute_id)],
+                is_active=True
+            )
+            for (product_id, attribute_id), entry in entries_by_pair.items()
+        ])
+        return created
 
 class HumanAnnotation(models.Model):
     STATUS_CHOICES = [
@@ -415,6 +659,10 @@ class FinalAttribute(models.Model):
                 name='unique_active_final_attribute'
             )
         ]
+        indexes = [
+            # Superseded versions, oldest first, for archive_history.
+            models.Index(fields=['created_at'], condition=Q(is_active=False), name='final_attributes_inactive_idx')
+        ]
 
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name}"
@@ -431,20 +679,65 @@ class FinalAttribute(models.Model):
         confidence_score=None
     ):
         """Persist a new final attribute version while deactivating previous ones."""
-        cls.objects.filter(product=product, attribute=attribute, is_active=True).update(is_active=False)
-        latest_version = cls.objects.filter(product=product, attribute=attribute).aggregate(
-            max_version=Max('version')
-        )['max_version'] or 0
-        return cls.objects.create(
-            product=product,
-            attribute=attribute,
-            final_value=final_value,
-            source=source,
-            decided_by=decided_by,
-            confidence_score=confidence_score,
-            version=latest_version + 1,
-            is_active=True
-        )
+        with transaction.atomic():
+            final_attribute, = cls.record_many([{
+                'product_id': product.id,
+                'attribute_id': attribute.id,
+                'final_value': final_value,
+                'source': source,
+                'decided_by': decided_by,
+                'confidence_score': confidence_score
+            }])
+        final_attribute.product = product
+        final_attribute.attribute = attribute
+        return final_attribute
+
+    @classmethod
+    def record_many(cls, decisions):
+        """
+        Persist new final attribute versions for many (product, attribute) pairs at once.
+
+        ``decisions`` is an iterable of dicts with ``product_id``,
+        ``attribute_id``, ``final_value``, ``source`` and optional
+        ``decided_by`` and ``confidence_score``. Later decisions for the same
+        pair win. Versions come from AttributeVersionHead; claiming them,
+        deactivation and insertion each run as a single statement. Call inside
+        a transaction.
+        """
+        decisions_by_pair = {}
+        for decision in decisions:
+            decisions_by_pair[(decision['product_id'], decision['attribute_id'])] = decision
+        if not decisions_by_pair:
+            return []
+
+        versions = AttributeVersionHead.advance('final', decisions_by_pair)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE {cls._meta.db_table} AS f
+                SET is_active = FALSE
+                FROM unnest(%s::bigint[], %s::bigint[]) AS p(product_id, attribute_id)
+                WHERE f.product_id = p.product_id
+                  AND f.attribute_id = p.attribute_id
+                  AND f.is_active
+                """,
+                [[pair[0] for pair in decisions_by_pair], [pair[1] for pair in decisions_by_pair]]
+            )
+
+        created = cls.objects.bulk_create([
+            cls(
+                product_id=product_id,
+                attribute_id=attribute_id,
+                final_value=decision['final_value'],
+                source=decision['source'],
+                decided_by=decision.get('decided_by'),
+                confidence_score=decision.get('confidence_score'),
+                version=versions[(product_id, attribute_id)],
+                is_active=True
+            )
+            for (product_id, attribute_id), decision in decisions_by_pair.items()
+        ])
+        return created
 
 class OverlapComparison(models.Model):
     """Tracks overlapping annotations for the same product-attribute by different annotators"""
@@ -502,6 +795,18 @@ class MissingValueFlag(models.Model):
     def __str__(self):
         return f"{self.product.name} - {self.attribute.name} - {self.requested_value}"
 
+class TaxonomyVersion(models.Model):
+    """Version stamp of the attribute mappings shared by every process (see taxonomy); a single row."""
+    id = models.BigAutoField(primary_key=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'taxonomy_version'
+
+    def __str__(self):
+        return f"Taxonomy version {self.version}"
+
 class AIProcessingControl(models.Model):
     """Controls AI processing state (pause/resume)"""
     id = models.BigAutoField(primary_key=True)
@@ -527,4 +832,398 @@ class AIProcessingControl(models.Model):
     def save(self, *args, **kwargs):
         if not self.pk:
             self.pk = 1
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+        from .ai_control import publish_control_state
+        is_paused = self.is_paused
+        using = kwargs.get('using') or 'default'
+        if not is_paused:
+            # Paused batches stop checkpointing; renew their heartbeat so the
+            # reaper does not take them for abandoned right after a resume.
+            AnnotationBatch.objects.using(using).filter(batch_type='ai', status='in_progress').update(
+                updated_at=timezone.now()
+            )
+        transaction.on_commit(lambda: publish_control_state(is_paused, using=using), using=using)
+
+class AIJob(models.Model):
+    """Durable unit of AI work for one product, claimed by workers under a lease."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('leased', 'Leased'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    OPEN_STATUSES = ['queued', 'leased']
+
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='ai_jobs')
+    batch = models.ForeignKey(AnnotationBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='ai_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    # Copy of Product.priority, so claims can sort on an index of this table.
+    priority = models.IntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    lease_owner = models.CharField(max_length=200, blank=True, null=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'ai_jobs'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product'],
+                condition=Q(status__in=['queued', 'leased']),
+                name='unique_open_ai_job'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['status', 'lease_expires_at']),
+            models.Index(fields=['status', '-priority', 'id'], name='ai_jobs_status_priority_idx'),
+        ]
+
+    def __str__(self):
+        return f"AI job {self.id} - {self.product_id} ({self.status})"
+
+    @classmethod
+    def enqueue(cls, product_ids, batch=None):
+        """Queue products that do not already have an open job."""
+        product_ids = list(product_ids)
+        if batch is not None:
+            # Queued jobs for these products now belong to the batch
+            cls.objects.filter(
+                product_id__in=product_ids,
+                status='queued',
+                batch__isnull=True
+            ).update(batch=batch, updated_at=timezone.now())
+        priorities = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'priority'))
+        jobs = [
+            cls(product_id=product_id, batch=batch, priority=priorities.get(product_id, 0))
+            for product_id in product_ids
+        ]
+        return cls.objects.bulk_create(jobs, ignore_conflicts=True)
+
+    @classmethod
+    def enqueue_pending(cls):
+        """Queue every pending_ai product without an open job in one statement."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {cls._meta.db_table}
+                    (product_id, status, priority, attempts, created_at, updated_at)
+                SELECT p.id, 'queued', p.priority, 0, NOW(), NOW()
+                FROM {Product._meta.db_table} AS p
+                WHERE p.status = 'pending_ai'
+                ORDER BY p.id
+                ON CONFLICT DO NOTHING
+                """
+            )
+            return cursor.rowcount
+
+    @classmethod
+    def claim(cls, worker_id, limit, lease_seconds):
+        """
+        Lease up to ``limit`` queued (or expired) jobs for ``worker_id``.
+
+        Rows locked by other workers are skipped, so concurrent workers always
+        receive disjoint jobs. The highest-priority jobs go first, except for
+        the aging slots, which take the oldest jobs so that low-priority work
+        still progresses (see ``aging_slots``). Jobs that already belong to a
+        batch are claimed together with the rest of that batch.
+        """
+        now = timezone.now()
+        claimable = Q(status='queued') | Q(status='leased', lease_expires_at__lt=now)
+        with transaction.atomic():
+            locked = cls.objects.select_for_update(skip_locked=True).filter(claimable)
+            first = locked.order_by('-priority', 'id').first()
+            if first is None:
+                return []
+            if first.batch_id:
+                jobs = list(locked.filter(batch_id=first.batch_id))
+            else:
+                unbatched = locked.filter(batch__isnull=True)
+                jobs = list(unbatched.order_by('id')[:aging_slots(limit)])
+                jobs += list(
+                    unbatched.exclude(id__in=[job.id for job in jobs])
+                    .order_by('-priority', 'id')[:limit - len(jobs)]
+                )
+            job_ids = [job.id for job in jobs]
+            cls.objects.filter(id__in=job_ids).update(
+                status='leased',
+                lease_owner=worker_id,
+                lease_expires_at=now + timedelta(seconds=lease_seconds),
+                heartbeat_at=now,
+                attempts=F('attempts') + 1,
+                updated_at=now
+            )
+        return list(cls.objects.filter(id__in=job_ids).select_related('product', 'batch').order_by('id'))
+
+    @classmethod
+    def heartbeat(cls, worker_id, job_ids, lease_seconds):
+        """Extend the lease on jobs still owned by ``worker_id``; returns how many were extended."""
+        now = timezone.now()
+        return cls.objects.filter(
+            id__in=job_ids,
+            status='leased',
+            lease_owner=worker_id
+        ).update(
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            heartbeat_at=now,
+            updated_at=now
+        )
+
+    @classmethod
+    def finish(cls, worker_id, job_ids, status='done', error=None):
+        """Close jobs still owned by ``worker_id``."""
+        return cls.objects.filter(
+            id__in=job_ids,
+            status='leased',
+            lease_owner=worker_id
+        ).update(
+            status=status,
+            last_error=error,
+            lease_owner=None,
+            lease_expires_at=None,
+            updated_at=timezone.now()
+        )
+
+    @classmethod
+    def release(cls, worker_id, job_ids, error, max_attempts):
+        """Return failed jobs to the queue, or mark them failed once out of attempts."""
+        now = timezone.now()
+        owned = cls.objects.filter(id__in=job_ids, status='leased', lease_owner=worker_id)
+        owned.filter(attempts__gte=max_attempts).update(
+            status='failed',
+            last_error=error,
+            lease_owner=None,
+            lease_expires_at=None,
+            updated_at=now
+        )
+        return owned.update(
+            status='queued',
+            last_error=error,
+            lease_owner=None,
+            lease_expires_at=None,
+            updated_at=now
+        )
+
+
+class AIResponseCache(models.Model):
+    """Provider answers keyed by a hash of the model, product content and attribute."""
+    id = models.BigAutoField(primary_key=True)
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    suggested_value = models.TextField()
+    confidence_score = models.DecimalField(max_digits=5, decimal_places=4, null=True, blank=True)
+    raw_response = models.JSONField(blank=True, null=True)
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'ai_response_cache'
+        indexes = [
+            models.Index(fields=['last_used_at']),
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.model} - {self.key[:12]}"
+
+    @staticmethod
+    def make_key(model, product, attribute):
+        """Content hash of everything that determines a provider's answer."""
+        content = json.dumps([
+            model,
+            product.name,
+            product.description or '',
+            list(product.image_urls or []),
+            attribute.id,
+            attribute.name,
+            attribute.data_type,
+            attribute.allowed_values,
+        ], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def lookup(cls, keys):
+        """Return unexpired entries for ``keys`` as a dict and record the hits."""
+        now = timezone.now()
+        entries = {
+            entry.key: entry
+            for entry in cls.objects.filter(key__in=set(keys), expires_at__gt=now)
+        }
+        if entries:
+            cls.objects.filter(key__in=list(entries)).update(
+                hit_count=F('hit_count') + 1,
+                last_used_at=now
+            )
+        return entries
+
+    @classmethod
+    def store(cls, entries, ttl_seconds):
+        """Insert or refresh entries (unsaved instances) in one statement."""
+        if not entries:
+            return []
+        now = timezone.now()
+        for entry in entries:
+            entry.last_used_at = now
+            entry.expires_at = now + timedelta(seconds=ttl_seconds)
+        return cls.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['suggested_value', 'confidence_score', 'raw_response', 'last_used_at', 'expires_at']
+        )
+
+    @classmethod
+    def evict(cls, max_entries):
+        """Drop expired entries, then the least recently used beyond ``max_entries``."""
+        expired, _ = cls.objects.filter(expires_at__lte=timezone.now()).delete()
+        overflow_ids = cls.objects.order_by('-last_used_at').values('id')[max_entries:]
+        overflow, _ = cls.objects.filter(id__in=overflow_ids).delete()
+        return expired + overflow
+
+    @classmethod
+    def evict_if_due(cls, max_entries, interval_seconds):
+        """
+        ``evict`` at most once per ``interval_seconds`` in this process, and
+        then only when entries have expired or the estimated row count exceeds
+        ``max_entries``; both checks use an index or the table statistics.
+        Returns the number of entries dropped.
+        """
+        if not maintenance_due('ai_response_cache', interval_seconds):
+            return 0
+        if not cls.objects.filter(expires_at__lte=timezone.now()).exists() and estimated_rows(cls) <= max_entries:
+            return 0
+        return cls.evict(max_entries)
+
+class AIBatchStats(models.Model):
+    """Totals and per-stage timings of one AI batch run (see ai_timing)."""
+    id = models.BigAutoField(primary_key=True)
+    batch = models.OneToOneField(AnnotationBatch, on_delete=models.CASCADE, related_name='ai_stats')
+    products = models.IntegerField(default=0)
+    products_done = models.IntegerField(default=0)
+    provider_calls = models.IntegerField(default=0)
+    provider_errors = models.IntegerField(default=0)
+    cache_hits = models.IntegerField(default=0)
+    cache_lookups = models.IntegerField(default=0)
+    elapsed_seconds = models.FloatField(default=0.0)
+    provider_seconds = models.FloatField(default=0.0)
+    db_seconds = models.FloatField(default=0.0)
+    # {stage: {"seconds": float, "count": int}}
+    stages = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'ai_batch_stats'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Stats of {self.batch}"
+
+    @property
+    def slowest_stage(self):
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda stage: self.stages[stage]['seconds'])
+
+    @classmethod
+    def record(cls, batch, stats):
+        """Save the stats returned by ``run_ai_batch`` for ``batch``."""
+        stats_row, _ = cls.objects.update_or_create(
+            batch=batch,
+            defaults={
+                'products': stats.get('products', 0),
+                'products_done': stats.get('done', 0),
+                'provider_calls': stats.get('calls', 0),
+                'provider_errors': stats.get('errors', 0),
+                'cache_hits': stats.get('hits', 0),
+                'cache_lookups': stats.get('lookups', 0),
+                'elapsed_seconds': round(stats.get('elapsed', 0.0), 4),
+                'provider_seconds': round(stats.get('provider_seconds', 0.0), 4),
+                'db_seconds': round(stats.get('db_seconds', 0.0), 4),
+                'stages': stats.get('stages', {}),
+            }
+        )
+        return stats_row
+
+class StoredImage(models.Model):
+    """An image in the local content-addressed store (see image_store), named by its SHA-256."""
+    id = models.BigAutoField(primary_key=True)
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'stored_images'
+        indexes = [
+            models.Index(fields=['last_used_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+    @classmethod
+    def touch(cls, image_ids):
+        if image_ids:
+            cls.objects.filter(id__in=set(image_ids)).update(last_used_at=timezone.now())
+
+    @classmethod
+    def evict(cls, max_bytes):
+        """
+        Delete the least recently used images beyond ``max_bytes`` in total.
+        Returns the SHA-256 of the deleted rows, whose files the caller removes.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id, sha256 FROM (
+                    SELECT id, sha256, SUM(size) OVER (ORDER BY last_used_at DESC, id DESC) AS kept
+                    FROM {cls._meta.db_table}
+                ) AS ranked
+                WHERE kept > %s
+                """,
+                [max_bytes]
+            )
+            victims = dict(cursor.fetchall())
+        if victims:
+            # Through the ORM, so that ProductImage.image is set to NULL.
+            cls.objects.filter(id__in=list(victims)).delete()
+        return list(victims.values())
+
+    @classmethod
+    def evict_if_due(cls, max_bytes, interval_seconds):
+        """``evict`` at most once per ``interval_seconds`` in this process; [] otherwise."""
+        if not maintenance_due('stored_images', interval_seconds):
+            return []
+        return cls.evict(max_bytes)
+
+class ProductImage(models.Model):
+    """A product's image URL and the stored copy it was downloaded to."""
+    id = models.BigAutoField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stored_images')
+    url = models.TextField()
+    # Empty until fetched, after a failed fetch and once evicted from the store.
+    image = models.ForeignKey(StoredImage, on_delete=models.SET_NULL, null=True, blank=True, related_name='product_images')
+    error = models.TextField(blank=True, null=True)
+    fetched_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'product_images'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'url'], name='unique_product_image_url')
+        ]
+        indexes = [
+            models.Index(fields=['url']),
+        ]
+
+    def __str__(self):
+        return f"{self.product.name} - {self.url}"
+
@@ -0,0 +1,117 @@
+"""
+Cross-process notifications over PostgreSQL LISTEN/NOTIFY.
+
+One listener thread per process holds a dedicated connection in ``LISTEN``
+mode on every channel in ``CHANNELS`` and hands payloads to the callbacks
+registered with ``listener.subscribe``. ``notify`` sends inside the current
+transaction, so listeners only hear about committed changes. On other
+database backends it dispatches to the local callbacks directly.
+"""
+import os
+import select
+import threading
+import time
+
+from django.db import connections
+
+CONTROL_CHANNEL = 'ai_processing_control'
+PROGRESS_CHANNEL = 'batch_progress'
+CHANNELS = (CONTROL_CHANNEL, PROGRESS_CHANNEL)
+
+
+class NotificationListener:
+    # Upper bound for one select() on the listening socket; waking up only
+    # checks the socket, it does not query the database.
+    KEEPALIVE_SECONDS = 60
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self.listening = False
+        self._callbacks = {channel: [] for channel in CHANNELS}
+        self._on_connect = []
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def subscribe(self, channel, callback, on_connect=None):
+        """
+        Call ``callback(payload)`` for every notification on ``channel``.
+
+        ``on_connect(cursor)`` runs each time the listener (re)connects, so
+        subscribers can resync state they may have missed while disconnected.
+        """
+        with self._lock:
+            self._callbacks[channel].append(callback)
+            if on_connect is not None:
+                self._on_connect.append(on_connect)
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            if callback in self._callbacks[channel]:
+                self._callbacks[channel].remove(callback)
+
+    def dispatch(self, channel, payload):
+        with self._lock:
+            callbacks = list(self._callbacks.get(channel, ()))
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception:
+                pass
+
+    def start(self):
+        """Start the listener thread; once per process (again after a fork)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if connections[self.alias].vendor == 'postgresql':
+                threading.Thread(target=self._listen, name='notification-listener', daemon=True).start()
+            self._pid = os.getpid()
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            conn = None
+            try:
+                wrapper = connections[self.alias]
+                conn = wrapper.get_new_connection(wrapper.get_connection_params())
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    for channel in CHANNELS:
+                        cursor.execute(f'LISTEN {channel}')
+                    with self._lock:
+                        hooks = list(self._on_connect)
+                    for hook in hooks:
+                        hook(cursor)
+                self.listening = True
+                backoff = 1
+                while True:
+                    select.select([conn], [], [], self.KEEPALIVE_SECONDS)
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        self.dispatch(notification.channel, notification.payload)
+            except Exception:
+                self.listening = False
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+
+listener = NotificationListener()
+
+
+def notify(channel, payload, using='default'):
+    """Publish ``payload`` (a string) on ``channel`` to every process."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [channel, payload])
+    else:
+        listener.dispatch(channel, payload)
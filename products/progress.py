@@ -0,0 +1,188 @@
+"""
+Live batch progress and product-status deltas.
+
+Writers publish small JSON events on the progress channel (see
+notifications); the ``/ai-processing/stream/`` endpoint relays them to
+dashboards as Server-Sent Events. Events are:
+
+    {"type": "batch", "batch_id": 1, "batch_type": "ai", "status": "in_progress", "progress": 40.0}
+    {"type": "products", "from": "pending_ai", "to": "ai_running", "count": 10}
+
+A process keeps one broadcaster fed by its notification listener, however
+many streams are open, so dashboards never query the database after their
+initial snapshot.
+
+A browser EventSource cannot send the JWT Authorization header, so the
+stream also accepts ``?token=``, a signed token from ``stream-token`` that
+is valid for AI_STREAM_TOKEN_SECONDS. Under a synchronous (WSGI) server each
+open stream holds a worker thread, so a stream ends after
+AI_STREAM_MAX_SECONDS; the EventSource then reconnects, with a new token
+once the old one has expired. Serve it from an async or gevent server to
+keep many dashboards open.
+"""
+import json
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Count
+from django.utils import timezone
+
+from .notifications import PROGRESS_CHANNEL, listener, notify
+
+STREAM_TOKEN_SALT = 'products.progress.stream'
+
+
+def publish_event(event, using='default'):
+    notify(PROGRESS_CHANNEL, json.dumps(event), using=using)
+
+
+def publish_status_delta(from_status, to_status, count, using='default'):
+    """Announce that ``count`` products moved from one status to another."""
+    if count:
+        publish_event({'type': 'products', 'from': from_status, 'to': to_status, 'count': count}, using=using)
+
+
+def publish_batch(batch, using='default'):
+    publish_event({
+        'type': 'batch',
+        'batch_id': batch.id,
+        'batch_type': batch.batch_type,
+        'status': batch.status,
+        'progress': round(batch.progress, 1),
+    }, using=using)
+
+
+class ProgressReporter:
+    """
+    Coalesces progress updates for one batch.
+
+    ``update`` only remembers the latest value; it is written (a single
+    ``UPDATE``, which also serves as the batch heartbeat) and published at
+    most every ``AI_PROGRESS_INTERVAL`` seconds. ``flush`` forces the write.
+    """
+
+    def __init__(self, batch, interval=None):
+        self.batch = batch
+        self.interval = getattr(settings, 'AI_PROGRESS_INTERVAL', 1.0) if interval is None else interval
+        self._pending = None
+        self._last_write = None
+
+    def update(self, progress):
+        self._pending = progress
+        now = time.monotonic()
+        if self._last_write is None or now - self._last_write >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending is None:
+            return
+        from .models import AnnotationBatch
+        self.batch.progress = self._pending
+        AnnotationBatch.objects.filter(id=self.batch.id).update(
+            progress=self._pending,
+            updated_at=timezone.now()
+        )
+        publish_batch(self.batch)
+        self._pending = None
+        self._last_write = time.monotonic()
+
+
+class ProgressBroadcaster:
+    """Fans progress notifications out to the open streams of this process."""
+
+    # Events kept per stream; a stalled client loses the oldest ones.
+    QUEUE_SIZE = 1000
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        listener.subscribe(PROGRESS_CHANNEL, self._on_notification)
+
+    def subscribe(self):
+        listener.start()
+        subscriber = queue.Queue(maxsize=self.QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _on_notification(self, payload):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(payload)
+                    break
+                except queue.Full:
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+
+broadcaster = ProgressBroadcaster()
+
+
+def product_status_counts():
+    """Product counts per status in a single query."""
+    from .models import Product
+    counts = dict.fromkeys((value for value, _ in Product.STATUS_CHOICES), 0)
+    for row in Product.objects.order_by().values('status').annotate(total=Count('id')):
+        counts[row['status']] = row['total']
+    return counts
+
+
+def make_stream_token(user):
+    """Signed token that authenticates ``user`` on the progress stream."""
+    return signing.dumps({'user': user.pk}, salt=STREAM_TOKEN_SALT)
+
+
+def stream_token_user_id(token):
+    """User id of a stream token, or None when it is invalid or expired."""
+    max_age = getattr(settings, 'AI_STREAM_TOKEN_SECONDS', 60)
+    try:
+        return signing.loads(token, salt=STREAM_TOKEN_SALT, max_age=max_age)['user']
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def format_sse(data, event=None):
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {data}\n\n"
+
+
+def event_stream(get_snapshot, batch_id=None, keepalive_seconds=15, max_seconds=None):
+    """
+    Generator of SSE messages: a snapshot first, then live events, for at
+    most ``max_seconds`` (AI_STREAM_MAX_SECONDS).
+
+    The snapshot is taken after subscribing, so no event falls in between.
+    """
+    if max_seconds is None:
+        max_seconds = getattr(settings, 'AI_STREAM_MAX_SECONDS', 300)
+    deadline = time.monotonic() + max_seconds
+    subscriber = broadcaster.subscribe()
+    try:
+        yield 'retry: 3000\n' + format_sse(json.dumps(get_snapshot(), default=str), event='snapshot')
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                payload = subscriber.get(timeout=min(keepalive_seconds, remaining))
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            event = json.loads(payload)
+            if batch_id is not None and event.get('type') == 'batch' and event.get('batch_id') != batch_id:
+                continue
+            yield format_sse(payload, event=event['type'])
+    finally:
+        broadcaster.unsubscribe(subscriber)
@@ -1,6 +1,10 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User, Group
+from django.db.models import Manager
+from django.urls import reverse
 from .models import *
+from .ai_batching import batch_size_bounds
+from .image_store import image_url_error
 
 
 def _applicable_attribute_ids(product):
@@ -23,8 +27,16 @@ class UserSerializer(serializers.ModelSerializer):
             return 'annotator'
         return 'user'
 
+def _validate_image_url(url):
+    error = image_url_error(url)
+    if error:
+        raise serializers.ValidationError(f"Image URL not allowed: {error}")
+
 class ProductSerializer(serializers.ModelSerializer):
-    image_urls = serializers.ListField(child=serializers.URLField(), required=False)
+    image_urls = serializers.ListField(
+        child=serializers.URLField(validators=[_validate_image_url]),
+        required=False
+    )
     primary_image = serializers.SerializerMethodField()
     category_name = serializers.CharField(source='category.name', read_only=True)
     subcategory_name = serializers.CharField(source='subcategory.name', read_only=True)
@@ -32,6 +44,7 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = '__all__'
+        read_only_fields = ['priority']
     
     def get_primary_image(self, obj):
         if obj.image_urls and len(obj.image_urls) > 0:
@@ -158,6 +171,36 @@ class AIConsensusSerializer(serializers.ModelSerializer):
     def get_allowed_values(self, obj):
         return obj.attribute.allowed_values
 
+class AIBatchStatsSerializer(serializers.ModelSerializer):
+    batch_name = serializers.CharField(source='batch.name', read_only=True)
+    batch_status = serializers.CharField(source='batch.status', read_only=True)
+    slowest_stage = serializers.CharField(read_only=True)
+    
+    class Meta:
+        model = AIBatchStats
+        fields = '__all__'
+
+def _group_by(rows, key):
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(getattr(row, key), []).append(row)
+    return grouped
+
+class BatchItemListSerializer(serializers.ListSerializer):
+    """
+    Loads the applicability, suggestions, consensus, annotations and
+    attributes of all items at once, so each item is filtered in memory
+    instead of costing several queries.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, Manager) else data)
+        self.child.preload(items)
+        try:
+            return super().to_representation(items)
+        finally:
+            self.child.preloaded = None
+
 class BatchItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     product_id = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), source='product', write_only=True)
@@ -166,11 +209,44 @@ class BatchItemSerializer(serializers.ModelSerializer):
     human_annotations = serializers.SerializerMethodField()
     applicable_attributes = serializers.SerializerMethodField()
     
+    preloaded = None
+    
     class Meta:
         model = BatchItem
         fields = '__all__'
+        list_serializer_class = BatchItemListSerializer
+    
+    def preload(self, items):
+        products = [item.product for item in items]
+        product_ids = {product.id for product in products}
+        consensus = AIConsensus.objects.filter(product_id__in=product_ids, is_active=True).select_related('attribute')
+        self.preloaded = {
+            'applicable': CategoryAttributeMapping.attribute_ids_for_products(products),
+            'suggestions': _group_by(
+                AISuggestion.objects.filter(product_id__in=product_ids).select_related('attribute', 'provider'),
+                'product_id'
+            ),
+            'consensus': _group_by(consensus, 'product_id'),
+            'active_consensus': {
+                (row.product_id, row.attribute_id): row.consensus_value for row in consensus
+            },
+            'annotations': _group_by(
+                HumanAnnotation.objects.filter(batch_item__in=items).select_related('attribute', 'annotator', 'product'),
+                'batch_item_id'
+            ),
+            'attributes': list(Attribute.objects.order_by('name')),
+        }
+    
+    def _preloaded_rows(self, obj, key, group_id):
+        attr_ids = self.preloaded['applicable'].get(obj.product_id)
+        return [
+            row for row in self.preloaded[key].get(group_id, [])
+            if not attr_ids or row.attribute_id in attr_ids
+        ]
     
     def get_ai_suggestions(self, obj):
+        if self.preloaded is not None:
+            return AISuggestionSerializer(self._preloaded_rows(obj, 'suggestions', obj.product_id), many=True).data
         suggestions = AISuggestion.objects.filter(product=obj.product)
         attr_ids = _applicable_attribute_ids(obj.product)
         if attr_ids:
@@ -178,6 +254,8 @@ class BatchItemSerializer(serializers.ModelSerializer):
         return AISuggestionSerializer(suggestions, many=True).data
     
     def get_ai_consensus(self, obj):
+        if self.preloaded is not None:
+            return AIConsensusSerializer(self._preloaded_rows(obj, 'consensus', obj.product_id), many=True).data
         consensus = AIConsensus.objects.filter(product=obj.product, is_active=True)
         attr_ids = _applicable_attribute_ids(obj.product)
         if attr_ids:
@@ -185,6 +263,12 @@ class BatchItemSerializer(serializers.ModelSerializer):
         return AIConsensusSerializer(consensus, many=True).data
     
     def get_human_annotations(self, obj):
+        if self.preloaded is not None:
+            return HumanAnnotationSerializer(
+                self._preloaded_rows(obj, 'annotations', obj.id),
+                many=True,
+                context={**self.context, 'active_consensus': self.preloaded['active_consensus']}
+            ).data
         annotations = HumanAnnotation.objects.filter(batch_item=obj)
         attr_ids = _applicable_attribute_ids(obj.product)
         if attr_ids:
@@ -192,6 +276,13 @@ class BatchItemSerializer(serializers.ModelSerializer):
         return HumanAnnotationSerializer(annotations, many=True).data
     
     def get_applicable_attributes(self, obj):
+        if self.preloaded is not None:
+            attr_ids = self.preloaded['applicable'].get(obj.product_id)
+            attributes = [
+                attribute for attribute in self.preloaded['attributes']
+                if not attr_ids or attribute.id in attr_ids
+            ]
+            return AttributeSerializer(attributes, many=True).data
         attributes = obj.product.get_applicable_attributes()
         return AttributeSerializer(attributes, many=True).data
 
@@ -250,6 +341,10 @@ class HumanAnnotationSerializer(serializers.ModelSerializer):
         return obj.attribute.allowed_values
     
     def get_ai_suggested_value(self, obj):
+        # Set by BatchItemSerializer when it has loaded the consensus already.
+        active_consensus = self.context.get('active_consensus')
+        if active_consensus is not None:
+            return active_consensus.get((obj.product_id, obj.attribute_id))
         try:
             consensus = AIConsensus.objects.get(
                 product=obj.product,
@@ -278,6 +373,7 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     human_annotations = serializers.SerializerMethodField()
     final_attributes = serializers.SerializerMethodField()
     primary_image = serializers.SerializerMethodField()
+    local_images = serializers.SerializerMethodField()
     batch_info = serializers.SerializerMethodField()
     overlap_data = serializers.SerializerMethodField()
     applicable_attributes = serializers.SerializerMethodField()
@@ -321,6 +417,23 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             return obj.image_urls[0]
         return None
     
+    def get_local_images(self, obj):
+        """Prefetched copies of ``image_urls`` served from the local image store."""
+        request = self.context.get('request')
+        stored = {
+            row.url: row.image.sha256
+            for row in ProductImage.objects.filter(product=obj, image__isnull=False).select_related('image')
+        }
+        images = []
+        for url in obj.image_urls or []:
+            if url in stored:
+                local_url = reverse('storedimage-detail', args=[stored[url]])
+                images.append({
+                    'url': url,
+                    'local_url': request.build_absolute_uri(local_url) if request else local_url,
+                })
+        return images
+    
     def get_batch_info(self, obj):
         batch_items = BatchItem.objects.filter(product=obj, batch__batch_type='human')
         if batch_items.exists():
@@ -366,7 +479,13 @@ class AutoAssignSerializer(serializers.Serializer):
     overlap_count = serializers.IntegerField(default=2, min_value=1, max_value=5)
 
 class StartAutoAISerializer(serializers.Serializer):
-    batch_size = serializers.IntegerField(default=10)
+    batch_size = serializers.IntegerField(required=False, min_value=1)
+
+    def validate_batch_size(self, value):
+        min_size, max_size = batch_size_bounds()
+        if not min_size <= value <= max_size:
+            raise serializers.ValidationError(f"batch_size must be between {min_size} and {max_size}")
+        return value
 
 class OverlapResolutionSerializer(serializers.Serializer):
     overlap_id = serializers.IntegerField()
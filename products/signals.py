@@ -0,0 +1,13 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Attribute, CategoryAttributeMapping
+from .taxonomy import taxonomy
+
+
+@receiver([post_save, post_delete], sender=CategoryAttributeMapping)
+@receiver([post_save, post_delete], sender=Attribute)
+def invalidate_taxonomy(sender, **kwargs):
+    # After commit, so no process reloads the old mappings under the new stamp.
+    transaction.on_commit(taxonomy.invalidate)
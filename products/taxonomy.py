@@ -0,0 +1,115 @@
+"""
+In-process cache of attribute applicability.
+
+Which attributes apply to a product follows CategoryAttributeMapping: the
+category-wide mappings plus those of the product's subcategory. Rather than
+querying the mapping table on every check, the whole table is loaded once
+into an immutable ``Taxonomy`` keyed by (category_id, subcategory_id), with
+the applicable and the required attribute ids of each scope, so lookups cost
+no queries.
+
+A snapshot is tagged with a version stamp kept in the single TaxonomyVersion
+row, so every process sees the same stamp. Saving or deleting a mapping or
+an attribute bumps it once the transaction commits (see signals.py). A
+process re-reads the stamp at most every TAXONOMY_CHECK_SECONDS and reloads
+when it changed, and reloads every TAXONOMY_MAX_AGE_SECONDS regardless. Bulk
+writes send no signals: call ``taxonomy.invalidate()`` after them.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db import connection
+
+EMPTY = frozenset()
+
+
+class Taxonomy:
+    """Immutable snapshot of the attribute mappings and the attribute ids."""
+
+    def __init__(self, scopes, attribute_ids, version=None):
+        # (category_id, subcategory_id or None) -> (all ids, required ids)
+        self.scopes = MappingProxyType(scopes)
+        self.attribute_ids = frozenset(attribute_ids)
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def load(cls, version=None):
+        from .models import Attribute, CategoryAttributeMapping
+
+        collected = {}
+        for category_id, subcategory_id, attribute_id, is_required in CategoryAttributeMapping.objects.values_list(
+            'category_id', 'subcategory_id', 'attribute_id', 'is_required'
+        ):
+            all_ids, required_ids = collected.setdefault((category_id, subcategory_id), (set(), set()))
+            all_ids.add(attribute_id)
+            if is_required:
+                required_ids.add(attribute_id)
+        scopes = {
+            scope: (frozenset(all_ids), frozenset(required_ids))
+            for scope, (all_ids, required_ids) in collected.items()
+        }
+        return cls(scopes, Attribute.objects.values_list('id', flat=True), version=version)
+
+    def attribute_ids_for(self, category_id, subcategory_id=None, required_only=False):
+        """Mapped attribute ids of a category (and subcategory); empty when nothing is mapped."""
+        if not category_id:
+            return EMPTY
+        index = 1 if required_only else 0
+        ids = self.scopes.get((category_id, None), (EMPTY, EMPTY))[index]
+        if subcategory_id:
+            ids = ids | self.scopes.get((category_id, subcategory_id), (EMPTY, EMPTY))[index]
+        return ids
+
+
+class TaxonomyResolver:
+    """Process-wide holder of the current Taxonomy snapshot."""
+
+    def __init__(self):
+        self._taxonomy = None
+        self._lock = threading.Lock()
+        self._version_seen = None
+        self._checked_at = None
+
+    def _version(self):
+        """The shared stamp, re-read at most every TAXONOMY_CHECK_SECONDS."""
+        check_seconds = getattr(settings, 'TAXONOMY_CHECK_SECONDS', 2)
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= check_seconds:
+            from .models import TaxonomyVersion
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT version FROM {TaxonomyVersion._meta.db_table} WHERE id = 1")
+                row = cursor.fetchone()
+            self._version_seen = row[0] if row else 0
+            self._checked_at = now
+        return self._version_seen
+
+    def current(self):
+        version = self._version()
+        max_age = getattr(settings, 'TAXONOMY_MAX_AGE_SECONDS', 300)
+        taxonomy = self._taxonomy
+        if taxonomy is None or taxonomy.version != version or time.monotonic() - taxonomy.loaded_at > max_age:
+            with self._lock:
+                taxonomy = self._taxonomy
+                if taxonomy is None or taxonomy.version != version or time.monotonic() - taxonomy.loaded_at > max_age:
+                    taxonomy = self._taxonomy = Taxonomy.load(version)
+        return taxonomy
+
+    def invalidate(self):
+        """Bump the shared stamp, so every process reloads within TAXONOMY_CHECK_SECONDS."""
+        from .models import TaxonomyVersion
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {TaxonomyVersion._meta.db_table} AS v (id, version, updated_at)
+                VALUES (1, 1, NOW())
+                ON CONFLICT (id) DO UPDATE SET version = v.version + 1, updated_at = NOW()
+                """
+            )
+        self._taxonomy = None
+        self._checked_at = None
+
+
+taxonomy = TaxonomyResolver()
@@ -0,0 +1,67 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from products import ai_backfill
+from products.ai_backfill import backfill_provider
+from products.ai_control import processing_gate
+from products.models import (
+    Product, Category, Attribute, CategoryAttributeMapping, AIProvider, AISuggestion, AIConsensus
+)
+from products.tests.test_ai_pipeline import CountingAdapter
+
+
+@override_settings(AI_CACHE_ENABLED=False)
+@mock.patch.object(processing_gate, 'wait_until_running', return_value=True)
+class BackfillProviderTests(TestCase):
+    """A new provider is asked only for what it is missing on processed products."""
+
+    def setUp(self):
+        shoes = Category.objects.create(name='Shoes')
+        self.color = Attribute.objects.create(name='Color', data_type='text')
+        self.size = Attribute.objects.create(name='Size', data_type='text')
+        CategoryAttributeMapping.objects.create(category=shoes, attribute=self.color)
+        self.old = AIProvider.objects.create(name='old', service_name='fake', model='fake', config={})
+        self.silent = AIProvider.objects.create(name='silent', service_name='fake', model='fake', config={})
+        self.new = AIProvider.objects.create(name='new', service_name='fake', model='fake', config={}, is_active=False)
+
+        self.done = Product.objects.create(name='Boot', category=shoes, status='ai_done')
+        self.pending = Product.objects.create(name='Sandal', category=shoes, status='pending_ai')
+        self.running = Product.objects.create(name='Clog', category=shoes, status='ai_running')
+        AISuggestion.objects.create(
+            product=self.done, attribute=self.color, provider=self.old, suggested_value='red', confidence_score=0.9
+        )
+        AIConsensus.record(product=self.done, attribute=self.color, consensus_value='red', method='weighted_majority')
+
+        self.adapter = CountingAdapter(self.new, value='red')
+        patcher = mock.patch.object(ai_backfill, 'get_adapter', return_value=self.adapter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def backfill(self):
+        return backfill_provider(self.new, log=lambda message: None)
+
+    def test_only_applicable_pairs_of_processed_products_are_requested(self, wait):
+        totals = self.backfill()
+
+        self.assertEqual([(call.product.id, call.attribute.id) for call in self.adapter.calls],
+                         [(self.done.id, self.color.id)])
+        self.assertEqual((totals['products'], totals['missing'], totals['stored']), (1, 1, 1))
+        self.assertFalse(AISuggestion.objects.filter(product__in=[self.pending, self.running]).exists())
+
+    def test_consensus_counts_the_new_provider_as_expected(self, wait):
+        self.backfill()
+
+        consensus = AIConsensus.objects.get(product=self.done, attribute=self.color, is_active=True)
+        self.assertEqual((consensus.version, consensus.consensus_value), (2, 'red'))
+        # Expected: old and new, which answered, and silent, which did not.
+        self.assertEqual(consensus.missing_providers, [self.silent.id])
+        self.assertAlmostEqual(float(consensus.confidence), 2 / 3, places=4)
+
+    def test_second_run_requests_nothing(self, wait):
+        self.backfill()
+
+        totals = self.backfill()
+
+        self.assertEqual((totals['missing'], totals['calls']), (0, 0))
+        self.assertEqual(len(self.adapter.calls), 1)
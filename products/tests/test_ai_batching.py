@@ -0,0 +1,72 @@
+from django.test import SimpleTestCase, override_settings
+
+from products.ai_batching import AdaptiveBatchSizer, batch_size_bounds
+
+
+def batch(products, elapsed, calls=0, errors=0, db_seconds=0.0):
+    return {'products': products, 'elapsed': elapsed, 'calls': calls, 'errors': errors, 'db_seconds': db_seconds}
+
+
+class AdaptiveBatchSizerTests(SimpleTestCase):
+
+    def sizer(self, **kwargs):
+        options = dict(min_size=5, max_size=100, initial_size=10, target_seconds=10.0,
+                       max_delay=30.0, error_threshold=0.1, db_share=0.5)
+        options.update(kwargs)
+        return AdaptiveBatchSizer(**options)
+
+    @override_settings(AI_BATCH_MIN_SIZE=0, AI_BATCH_MAX_SIZE=50)
+    def test_bounds_come_from_settings(self):
+        self.assertEqual(batch_size_bounds(), (1, 50))
+
+    def test_initial_size_is_clamped(self):
+        self.assertEqual(self.sizer(initial_size=500).size, 100)
+        self.assertEqual(self.sizer(initial_size=2).size, 5)
+
+    def test_fast_batches_grow_at_most_twofold_up_to_the_maximum(self):
+        sizer = self.sizer()
+        sizes = []
+        for _ in range(6):
+            sizer.record(batch(sizer.size, 0.01 * sizer.size))
+            sizes.append(sizer.size)
+
+        self.assertEqual(sizes, [20, 40, 80, 100, 100, 100])
+        self.assertEqual(sizer.delay, 0.0)
+
+    def test_slow_batches_shrink_to_the_target_but_not_below_the_minimum(self):
+        sizer = self.sizer(initial_size=50)
+
+        sizer.record(batch(50, 50 * 0.5))
+        self.assertEqual(sizer.size, 20)
+        for _ in range(10):
+            sizer.record(batch(sizer.size, sizer.size * 30.0))
+        self.assertEqual(sizer.size, 5)
+
+    def test_errors_halve_the_size_and_back_off(self):
+        sizer = self.sizer(initial_size=40)
+
+        sizer.record(batch(40, 4.0, calls=40, errors=20))
+        self.assertEqual((sizer.size, sizer.delay), (20, 1.0))
+        sizer.record(batch(20, 2.0, calls=20, errors=20))
+        self.assertEqual((sizer.size, sizer.delay), (10, 2.0))
+        for _ in range(10):
+            sizer.record(batch(sizer.size, 1.0, calls=10, errors=10))
+        self.assertEqual((sizer.size, sizer.delay), (5, 30.0))
+
+    def test_database_share_above_target_adds_a_delay(self):
+        sizer = self.sizer()
+
+        sizer.record(batch(10, 4.0, db_seconds=3.0))
+        self.assertEqual(sizer.delay, 0.0)
+        for _ in range(5):
+            sizer.record(batch(10, 4.0, db_seconds=3.0))
+
+        self.assertGreater(sizer.db_ratio, 0.5)
+        self.assertAlmostEqual(sizer.delay, 4.0 * (sizer.db_ratio / 0.5 - 1))
+
+    def test_empty_batches_change_nothing(self):
+        sizer = self.sizer()
+
+        sizer.record(batch(0, 0.0))
+
+        self.assertEqual((sizer.size, sizer.delay, sizer.seconds_per_product), (10, 0.0, None))
@@ -0,0 +1,117 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from products.ai_control import processing_gate
+from products.ai_pipeline import run_cached_provider_calls
+from products.ai_providers import ProviderCall
+from products.models import Product, Attribute, AIProvider, AIResponseCache
+from products.tests.test_ai_pipeline import CountingAdapter
+
+
+class CacheKeyTests(TestCase):
+
+    def setUp(self):
+        self.product = Product(id=1, name='Shirt', description='Cotton', image_urls=['https://a.example.com/1.png'])
+        self.attribute = Attribute(id=1, name='Color', data_type='text', allowed_values=['red', 'blue'])
+        self.key = AIResponseCache.make_key('model-a', self.product, self.attribute)
+
+    def test_identical_content_shares_a_key(self):
+        variant = Product(id=2, name='Shirt', description='Cotton', image_urls=['https://a.example.com/1.png'])
+
+        self.assertEqual(AIResponseCache.make_key('model-a', variant, self.attribute), self.key)
+
+    def test_model_change_invalidates(self):
+        self.assertNotEqual(AIResponseCache.make_key('model-b', self.product, self.attribute), self.key)
+
+    def test_prompt_change_invalidates(self):
+        changes = [
+            (Product(id=1, name='Shirt', description='Linen', image_urls=self.product.image_urls), self.attribute),
+            (self.product, Attribute(id=1, name='Colour', data_type='text', allowed_values=['red', 'blue'])),
+            (self.product, Attribute(id=1, name='Color', data_type='text', allowed_values=['red', 'blue', 'green'])),
+            (self.product, Attribute(id=1, name='Color', data_type='select', allowed_values=['red', 'blue'])),
+        ]
+        for product, attribute in changes:
+            with self.subTest(product=product.description, attribute=attribute.name):
+                self.assertNotEqual(AIResponseCache.make_key('model-a', product, attribute), self.key)
+
+
+@override_settings(AI_CACHE_ENABLED=True)
+@mock.patch.object(processing_gate, 'wait_until_running', return_value=True)
+class CachedProviderCallsTests(TestCase):
+    """Cached answers stand in for provider calls; misses are requested and stored."""
+
+    def setUp(self):
+        self.attribute = Attribute.objects.create(name='Color', data_type='text')
+        self.provider = AIProvider.objects.create(name='fake', service_name='fake', model='fake-1', config={})
+        self.adapter = CountingAdapter(self.provider, value='red')
+
+    def run_calls(self, *products):
+        calls = [ProviderCall(product, self.attribute, self.provider) for product in products]
+        return run_cached_provider_calls(calls, {self.provider.id: self.adapter})
+
+    def test_miss_is_requested_and_stored(self, wait):
+        product = Product.objects.create(name='Shirt')
+
+        results, hits, lookups = self.run_calls(product)
+
+        self.assertEqual((hits, lookups, len(self.adapter.calls)), (0, 1, 1))
+        self.assertEqual(results[0].suggested_value, 'red')
+        entry = AIResponseCache.objects.get()
+        self.assertEqual((entry.model, entry.suggested_value), ('fake-1', 'red'))
+
+    def test_hit_skips_the_provider(self, wait):
+        product = Product.objects.create(name='Shirt')
+        self.run_calls(product)
+
+        results, hits, lookups = self.run_calls(Product.objects.create(name='Shirt'))
+
+        self.assertEqual((hits, lookups, len(self.adapter.calls)), (1, 1, 1))
+        self.assertEqual(results[0].suggested_value, 'red')
+        self.assertTrue(results[0].raw_response['cached'])
+        self.assertEqual(AIResponseCache.objects.get().hit_count, 1)
+
+    def test_duplicates_in_one_batch_are_requested_once(self, wait):
+        first, second = Product.objects.create(name='Shirt'), Product.objects.create(name='Shirt')
+
+        results, hits, lookups = self.run_calls(first, second)
+
+        self.assertEqual((hits, lookups, len(self.adapter.calls)), (1, 2, 1))
+        self.assertEqual([result.call.product.id for result in results], [first.id, second.id])
+
+    def test_model_change_misses(self, wait):
+        self.run_calls(Product.objects.create(name='Shirt'))
+        AIProvider.objects.filter(id=self.provider.id).update(model='fake-2')
+        self.provider.refresh_from_db()
+
+        results, hits, lookups = self.run_calls(Product.objects.create(name='Shirt'))
+
+        self.assertEqual((hits, len(self.adapter.calls)), (0, 2))
+        self.assertEqual(AIResponseCache.objects.count(), 2)
+
+    def test_errors_are_not_cached(self, wait):
+        self.adapter.error = 'provider down'
+
+        self.run_calls(Product.objects.create(name='Shirt'))
+
+        self.assertFalse(AIResponseCache.objects.exists())
+
+    def test_provider_can_opt_out(self, wait):
+        self.provider.config = {'cache': False}
+        product = Product.objects.create(name='Shirt')
+
+        self.run_calls(product)
+        results, hits, lookups = self.run_calls(product)
+
+        self.assertEqual((hits, lookups, len(self.adapter.calls)), (0, 0, 2))
+        self.assertFalse(AIResponseCache.objects.exists())
+
+    @override_settings(AI_CACHE_ENABLED=False)
+    def test_cache_can_be_disabled(self, wait):
+        product = Product.objects.create(name='Shirt')
+
+        self.run_calls(product)
+        self.run_calls(product)
+
+        self.assertEqual(len(self.adapter.calls), 2)
+        self.assertFalse(AIResponseCache.objects.exists())
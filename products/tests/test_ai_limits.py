@@ -0,0 +1,105 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from products import ai_limits
+from products.ai_limits import AdaptiveConcurrency, CircuitBreaker
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(ai_limits.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failures=3, reset_seconds=30)
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_success_resets_the_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_half_open_lets_one_trial_through(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 31
+
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_trial_closes(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 31
+        self.breaker.allow()
+
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_trial_opens_again(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.clock.now += 31
+        self.breaker.allow()
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, 'open')
+        self.clock.now += 29
+        self.assertFalse(self.breaker.allow())
+
+
+class AdaptiveConcurrencyTests(SimpleTestCase):
+
+    def test_backoff_halves_down_to_the_floor(self):
+        concurrency = AdaptiveConcurrency(maximum=8, minimum=3)
+
+        concurrency.on_backoff()
+        self.assertEqual(concurrency.limit, 4)
+        concurrency.on_backoff()
+        self.assertEqual(concurrency.limit, 3)
+
+    def test_grows_by_one_after_a_healthy_window(self):
+        concurrency = AdaptiveConcurrency(maximum=8, initial=2)
+
+        concurrency.on_success(True)
+        self.assertEqual(concurrency.limit, 2)
+        concurrency.on_success(True)
+        self.assertEqual(concurrency.limit, 3)
+        concurrency.on_success(False)
+        concurrency.on_success(True)
+        concurrency.on_success(True)
+        self.assertEqual(concurrency.limit, 3)
+        for _ in range(100):
+            concurrency.on_success(True)
+        self.assertEqual(concurrency.limit, 8)
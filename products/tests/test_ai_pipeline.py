@@ -0,0 +1,149 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from products.ai_control import processing_gate
+from products.ai_pipeline import persist_batch_results, run_ai_chunk
+from products.ai_recovery import reap_stale_ai_work
+from products.models import Product, AnnotationBatch, BatchItem, Attribute, AIProvider, AIConsensus
+from products.tests.test_provider_calls import FakeAdapter
+
+
+class AttributelessProductTests(TestCase):
+    """Products without applicable attributes must still leave ai_running."""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='No attributes', status='ai_running')
+        self.batch = AnnotationBatch.objects.create(name='AI batch', batch_type='ai', status='in_progress')
+        BatchItem.objects.create(batch=self.batch, product=self.product)
+
+    def test_marked_ai_done(self):
+        done = persist_batch_results([self.product], {self.product.id: []}, [], log=lambda message: None)
+
+        self.assertEqual(done, [self.product.id])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.status, 'ai_done')
+
+    def test_not_requeued_by_reaper_once_batch_is_stale(self):
+        persist_batch_results([self.product], {self.product.id: []}, [], log=lambda message: None)
+
+        batches, products = reap_stale_ai_work(stale_seconds=0, log=lambda message: None)
+
+        self.assertEqual(products, 0)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.status, 'ai_done')
+
+
+@override_settings(AI_PRODUCT_MAX_ATTEMPTS=2, AI_CACHE_ENABLED=False)
+@mock.patch.object(processing_gate, 'wait_until_running', return_value=True)
+class FailedProviderCallsTests(TestCase):
+    """Products whose provider calls all failed are retried, not marked ai_done."""
+
+    def setUp(self):
+        Attribute.objects.create(name='Color', data_type='text')
+        self.provider = AIProvider.objects.create(name='down', service_name='fake', model='fake', config={})
+        self.adapters = {self.provider.id: FakeAdapter(self.provider, error='provider down')}
+        self.product = Product.objects.create(name='Shirt', status='ai_running')
+
+    def run_pass(self):
+        Product.objects.filter(id=self.product.id).update(status='ai_running')
+        self.product.refresh_from_db()
+        return run_ai_chunk([self.product], [self.provider], self.adapters, log=lambda message: None)
+
+    def test_product_goes_back_to_pending(self, wait):
+        stats = self.run_pass()
+
+        self.assertEqual(stats['done'], 0)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.status, self.product.ai_failures), ('pending_ai', 1))
+
+    def test_gives_up_after_the_last_attempt(self, wait):
+        self.run_pass()
+        stats = self.run_pass()
+
+        self.assertEqual(stats['done'], 1)
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.status, self.product.ai_failures), ('ai_done', 2))
+
+    def test_success_resets_the_failure_count(self, wait):
+        self.run_pass()
+        self.adapters[self.provider.id] = FakeAdapter(self.provider, value='red')
+
+        self.run_pass()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.status, self.product.ai_failures), ('ai_done', 0))
+
+
+class CountingAdapter(FakeAdapter):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def call(self, call):
+        self.calls.append(call)
+        return super().call(call)
+
+
+@override_settings(AI_EARLY_EXIT=True, AI_EARLY_EXIT_AGREEING=2, AI_CACHE_ENABLED=False)
+@mock.patch.object(processing_gate, 'wait_until_running', return_value=True)
+class EarlyExitTests(TestCase):
+    """Confident agreement of the first providers decides a pair without asking the rest."""
+
+    def setUp(self):
+        # FakeAdapter answers with confidence 0.9.
+        self.attribute = Attribute.objects.create(name='Color', data_type='text', early_exit_threshold='0.8')
+        self.providers = [
+            AIProvider.objects.create(name=f'p{order}', service_name='fake', model='fake', config={'query_order': order})
+            for order in (1, 2, 3)
+        ]
+        self.product = Product.objects.create(name='Shirt', status='ai_running')
+
+    def run_with(self, *answers):
+        self.adapters = [
+            CountingAdapter(provider, value=value, error=error)
+            for provider, (value, error) in zip(self.providers, answers)
+        ]
+        return run_ai_chunk(
+            [self.product], self.providers, {adapter.provider.id: adapter for adapter in self.adapters},
+            log=lambda message: None
+        )
+
+    def consensus(self):
+        return AIConsensus.objects.get(product=self.product, attribute=self.attribute, is_active=True)
+
+    def test_agreement_skips_the_second_round(self, wait):
+        stats = self.run_with(('red', None), ('red', None), ('blue', None))
+
+        self.assertEqual((stats['calls'], stats['skipped_calls']), (2, 1))
+        self.assertEqual(self.adapters[2].calls, [])
+        consensus = self.consensus()
+        self.assertEqual((consensus.consensus_value, consensus.method), ('red', 'early_exit'))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.status, 'ai_done')
+
+    def test_disagreement_asks_every_provider(self, wait):
+        stats = self.run_with(('red', None), ('blue', None), ('blue', None))
+
+        self.assertEqual((stats['calls'], stats['skipped_calls']), (3, 0))
+        self.assertEqual(len(self.adapters[2].calls), 1)
+        consensus = self.consensus()
+        self.assertEqual(consensus.consensus_value, 'blue')
+        self.assertNotEqual(consensus.method, 'early_exit')
+
+    def test_confidence_below_the_threshold_asks_every_provider(self, wait):
+        Attribute.objects.filter(id=self.attribute.id).update(early_exit_threshold='0.95')
+
+        stats = self.run_with(('red', None), ('red', None), ('red', None))
+
+        self.assertEqual((stats['calls'], stats['skipped_calls']), (3, 0))
+        self.assertNotEqual(self.consensus().method, 'early_exit')
+
+    def test_errored_first_answer_asks_every_provider(self, wait):
+        stats = self.run_with((None, 'provider down'), ('red', None), ('red', None))
+
+        self.assertEqual((stats['calls'], stats['skipped_calls']), (3, 0))
+        self.assertEqual(len(self.adapters[2].calls), 1)
+        consensus = self.consensus()
+        self.assertEqual(consensus.consensus_value, 'red')
+        self.assertNotEqual(consensus.method, 'early_exit')
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from products.ai_recovery import reap_stale_ai_work
+from products.models import Product, AnnotationBatch, BatchItem, AIProcessingControl
+
+
+class ReaperAfterResumeTests(TestCase):
+    """A batch paused for longer than the stale window survives the resume."""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Paused', status='ai_running')
+        self.batch = AnnotationBatch.objects.create(name='AI batch', batch_type='ai', status='in_progress')
+        BatchItem.objects.create(batch=self.batch, product=self.product)
+        control = AIProcessingControl.get_control()
+        control.is_paused = True
+        control.save()
+        long_ago = timezone.now() - timedelta(hours=1)
+        AnnotationBatch.objects.filter(id=self.batch.id).update(updated_at=long_ago)
+        Product.objects.filter(id=self.product.id).update(updated_at=long_ago)
+
+    def test_resume_renews_the_heartbeat(self):
+        control = AIProcessingControl.get_control()
+        control.is_paused = False
+        control.save()
+
+        batches, products = reap_stale_ai_work(stale_seconds=60, log=lambda message: None)
+
+        self.assertEqual((batches, products), (0, 0))
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'in_progress')
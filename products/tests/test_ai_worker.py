@@ -0,0 +1,108 @@
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from products import ai_pipeline
+from products.ai_control import processing_gate
+from products.ai_worker import AIWorker
+from products.models import Product, Attribute, AIProvider, AIJob, AISuggestion
+from products.tests.test_provider_calls import FakeAdapter
+
+
+def queue_products(count):
+    products = [Product.objects.create(name=f'Product {index}', status='pending_ai') for index in range(count)]
+    AIJob.enqueue([product.id for product in products])
+    return products
+
+
+class JobLeaseTests(TestCase):
+    """Jobs are leased to one worker at a time and re-claimed once the lease expires."""
+
+    def setUp(self):
+        queue_products(3)
+
+    def test_claim_leases_queued_jobs(self):
+        jobs = AIJob.claim('worker-a', 10, lease_seconds=300)
+
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual({(job.status, job.lease_owner, job.attempts) for job in jobs}, {('leased', 'worker-a', 1)})
+        self.assertEqual(AIJob.claim('worker-b', 10, lease_seconds=300), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        job = AIJob.claim('worker-a', 1, lease_seconds=300)[0]
+        AIJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        reclaimed = AIJob.claim('worker-b', 10, lease_seconds=300)
+
+        self.assertIn(job.id, [other.id for other in reclaimed])
+        job.refresh_from_db()
+        self.assertEqual((job.lease_owner, job.attempts), ('worker-b', 2))
+        # The previous owner can neither extend nor close the job any more.
+        self.assertEqual(AIJob.heartbeat('worker-a', [job.id], 300), 0)
+        self.assertEqual(AIJob.finish('worker-a', [job.id]), 0)
+
+
+class SkipLockedClaimTests(TransactionTestCase):
+    """A job locked by another transaction is skipped, not waited for."""
+
+    # Lets the flush between tests cascade into the unmanaged archive tables.
+    available_apps = ['django.contrib.auth', 'django.contrib.contenttypes', 'products']
+
+    def test_locked_job_is_skipped(self):
+        locked, free = queue_products(2)
+        locked_job = AIJob.objects.get(product=locked)
+        holding, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    AIJob.objects.select_for_update().get(id=locked_job.id)
+                    holding.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        try:
+            self.assertTrue(holding.wait(10))
+            jobs = AIJob.claim('worker-a', 10, lease_seconds=300)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual([job.product_id for job in jobs], [free.id])
+
+
+@mock.patch.object(processing_gate, 'wait_until_running', return_value=True)
+class LostLeaseTests(TestCase):
+    """A worker that lost its lease stops before persisting anything."""
+
+    def setUp(self):
+        Attribute.objects.create(name='Color', data_type='text')
+        self.provider = AIProvider.objects.create(name='fake', service_name='fake', model='fake', config={})
+        self.product, = queue_products(1)
+        self.worker = AIWorker(worker_id='worker-a', batch_size=1, log=lambda message: None)
+
+    def test_results_are_dropped_when_the_lease_was_taken(self, wait):
+        run_calls = ai_pipeline.run_cached_provider_calls
+
+        def taken_over_while_calling(*args, **kwargs):
+            # Another worker re-claims the job while the providers answer.
+            AIJob.objects.update(lease_owner='worker-b')
+            return run_calls(*args, **kwargs)
+
+        with mock.patch.object(ai_pipeline, 'get_adapter', lambda provider: FakeAdapter(provider, value='red')), \
+                mock.patch.object(ai_pipeline, 'run_cached_provider_calls', side_effect=taken_over_while_calling):
+            self.assertTrue(self.worker.run_once())
+
+        self.assertFalse(AISuggestion.objects.exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.status, 'ai_running')
+        job = AIJob.objects.get(product=self.product)
+        self.assertEqual((job.status, job.lease_owner), ('leased', 'worker-b'))
+        self.assertEqual(self.worker.processed_products, 0)
@@ -0,0 +1,99 @@
+from django.test import SimpleTestCase, override_settings
+
+from products.consensus import Vote, compute_consensus, mark_missing_providers
+
+
+def votes_for(answers, attribute_id=1):
+    """``{product_id: {provider_id: (value, confidence)}}`` as votes."""
+    return [
+        Vote(product_id, attribute_id, provider_id, value, confidence)
+        for product_id, by_provider in answers.items()
+        for provider_id, (value, confidence) in by_provider.items()
+    ]
+
+
+class ConsensusOutcomeTests(SimpleTestCase):
+
+    def test_weighted_majority_picks_the_heaviest_value(self):
+        votes = votes_for({1: {10: ('red', 0.9), 11: ('blue', 0.6), 12: ('blue', 0.5)}})
+
+        [entry] = compute_consensus(votes, method='weighted_majority')
+
+        self.assertEqual(entry['consensus_value'], 'blue')
+        self.assertEqual(entry['method'], 'weighted_majority')
+        self.assertAlmostEqual(entry['confidence'], 1.1 / 2.0, places=4)
+
+    def test_unanimous_vote_is_certain(self):
+        votes = votes_for({1: {10: ('red', 0.7), 11: ('red', 0.8)}})
+
+        [entry] = compute_consensus(votes, method='weighted_majority')
+
+        self.assertEqual((entry['consensus_value'], entry['confidence']), ('red', 1.0))
+
+    def test_every_pair_gets_one_entry(self):
+        votes = votes_for({1: {10: ('red', 0.9)}, 2: {10: ('blue', 0.9)}}) + votes_for({1: {10: ('S', 0.9)}}, 2)
+
+        entries = compute_consensus(votes, method='calibrated')
+
+        self.assertEqual(
+            sorted((entry['product_id'], entry['attribute_id'], entry['consensus_value']) for entry in entries),
+            [(1, 1, 'red'), (1, 2, 'S'), (2, 1, 'blue')]
+        )
+
+    def test_unknown_method_is_refused(self):
+        with self.assertRaises(ValueError):
+            compute_consensus(votes_for({1: {10: ('red', 0.9)}}), method='coin_flip')
+
+    @override_settings(AI_DAWID_SKENE_MIN_ITEMS=20)
+    def test_dawid_skene_falls_back_on_small_batches(self):
+        votes = votes_for({product_id: {10: ('red', 0.9), 11: ('red', 0.8)} for product_id in range(5)})
+
+        entries = compute_consensus(votes, method='dawid_skene')
+
+        self.assertEqual({entry['method'] for entry in entries}, {'weighted_majority'})
+
+    @override_settings(AI_DAWID_SKENE_MIN_ITEMS=5)
+    def test_dawid_skene_outvotes_an_unreliable_provider(self):
+        # Providers 10 and 11 always agree; 12 disagrees with them on most
+        # products, and on product 0 it is the only confident voter.
+        answers = {
+            product_id: {10: ('red', 0.6), 11: ('red', 0.6), 12: ('blue', 0.99)}
+            for product_id in range(10)
+        }
+        for product_id in range(5, 10):
+            answers[product_id][12] = ('red', 0.99)
+
+        entries = {entry['product_id']: entry for entry in compute_consensus(votes_for(answers), method='dawid_skene')}
+
+        self.assertEqual(entries[0]['method'], 'dawid_skene')
+        self.assertEqual(entries[0]['consensus_value'], 'red')
+        self.assertGreater(entries[9]['confidence'], entries[0]['confidence'])
+
+
+class MissingProviderConfidenceTests(SimpleTestCase):
+
+    def test_lone_vote_is_scaled_by_the_expected_providers(self):
+        votes = votes_for({1: {10: ('red', 0.9)}})
+
+        [entry] = mark_missing_providers(compute_consensus(votes, method='weighted_majority'), votes, {10, 11, 12})
+
+        self.assertEqual(entry['missing_providers'], [11, 12])
+        self.assertAlmostEqual(entry['confidence'], 1 / 3, places=4)
+
+    def test_full_coverage_keeps_the_confidence(self):
+        votes = votes_for({1: {10: ('red', 0.9), 11: ('red', 0.9)}})
+
+        [entry] = mark_missing_providers(compute_consensus(votes, method='weighted_majority'), votes, {10, 11})
+
+        self.assertEqual((entry['missing_providers'], entry['confidence']), ([], 1.0))
+
+    def test_expected_providers_per_pair(self):
+        votes = votes_for({1: {10: ('red', 0.9)}, 2: {10: ('red', 0.9)}})
+        expected = {(1, 1): {10}, (2, 1): {10, 11}}
+
+        entries = mark_missing_providers(compute_consensus(votes, method='weighted_majority'), votes, expected)
+
+        by_product = {entry['product_id']: entry for entry in entries}
+        self.assertEqual(by_product[1]['confidence'], 1.0)
+        self.assertEqual(by_product[2]['missing_providers'], [11])
+        self.assertAlmostEqual(by_product[2]['confidence'], 0.5)
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from products.history import archive_history, ensure_partitions, version_history
+from products.models import Product, Attribute, AIConsensus
+
+
+class ArchiveRoundTripTests(TestCase):
+    """Superseded versions move to the archive and still show up in the history."""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Shirt')
+        self.color = Attribute.objects.create(name='Color', data_type='text')
+        for value in ('red', 'blue', 'green'):
+            AIConsensus.record(
+                product=self.product, attribute=self.color, consensus_value=value, method='weighted_majority'
+            )
+        # Versions 1 and 2 were superseded long ago, in two different months.
+        for version, days in ((1, 200), (2, 120)):
+            AIConsensus.objects.filter(product=self.product, version=version).update(
+                created_at=timezone.now() - timedelta(days=days)
+            )
+
+    def history(self, include_archived=True):
+        rows = version_history('consensus', self.product.id, self.color.id, include_archived=include_archived)
+        return [(row['version'], row['consensus_value'], row['archived_at'] is not None) for row in rows]
+
+    def test_archived_versions_round_trip(self):
+        before = version_history('consensus', self.product.id, self.color.id)
+
+        moved = archive_history(retention_days=90, kinds=('consensus',), log=lambda message: None)
+
+        self.assertEqual(moved, {'consensus': 2})
+        self.assertEqual(
+            list(AIConsensus.objects.filter(product=self.product).values_list('version', flat=True)), [3]
+        )
+        self.assertEqual(self.history(), [(3, 'green', False), (2, 'blue', True), (1, 'red', True)])
+        self.assertEqual(self.history(include_archived=False), [(3, 'green', False)])
+        # Every column survives the move.
+        after = version_history('consensus', self.product.id, self.color.id)
+        for old, new in zip(before, after):
+            self.assertEqual({**old, 'archived_at': None}, {**new, 'archived_at': None})
+
+    def test_second_run_moves_nothing(self):
+        archive_history(retention_days=90, kinds=('consensus',), log=lambda message: None)
+
+        self.assertEqual(archive_history(retention_days=90, kinds=('consensus',), log=lambda message: None),
+                         {'consensus': 0})
+
+    def test_dry_run_only_counts(self):
+        moved = archive_history(retention_days=90, kinds=('consensus',), dry_run=True, log=lambda message: None)
+
+        self.assertEqual(moved, {'consensus': 2})
+        self.assertEqual(AIConsensus.objects.filter(product=self.product).count(), 3)
+
+    def test_existing_partition_is_not_created_again(self):
+        moment = timezone.now() - timedelta(days=400)
+        known = set()
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                ensure_partitions(cursor, 'ai_consensus_archive', [moment])
+            with self.assertNumQueries(1), connection.cursor() as cursor:
+                ensure_partitions(cursor, 'ai_consensus_archive', [moment], known=known)
+
+        self.assertEqual(known, {f'ai_consensus_archive_{moment:%Y%m}'})
@@ -0,0 +1,125 @@
+import shutil
+import socket
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+from django.test import TestCase, SimpleTestCase, override_settings
+
+from products import image_store
+from products.image_store import ImageFetchError, ImageStore, download, prefetch_images
+from products.models import Product, ProductImage, StoredImage
+
+
+def resolves_to(address):
+    """Patch name resolution so that every host resolves to ``address``."""
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, port))]
+    return mock.patch.object(image_store.socket, 'getaddrinfo', side_effect=getaddrinfo)
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.end_headers()
+        self.wfile.write(b'png bytes')
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(AI_IMAGE_ALLOW_PRIVATE_HOSTS=False)
+class DownloadAddressTests(SimpleTestCase):
+    """Image URLs may only reach public addresses."""
+
+    def test_loopback_literal_is_refused(self):
+        with self.assertRaisesMessage(ImageFetchError, 'not a public address'):
+            download('http://127.0.0.1/image.png')
+
+    def test_metadata_address_is_refused(self):
+        with self.assertRaisesMessage(ImageFetchError, 'not a public address'):
+            download('http://169.254.169.254/latest/meta-data/')
+
+    def test_non_http_scheme_is_refused(self):
+        with self.assertRaisesMessage(ImageFetchError, 'not allowed'):
+            download('file:///etc/passwd')
+
+    def test_name_resolving_to_a_private_address_is_refused_before_connecting(self):
+        with resolves_to('10.0.0.5'), mock.patch.object(image_store.socket, 'create_connection') as connect:
+            with self.assertRaisesMessage(ImageFetchError, 'non-public address 10.0.0.5'):
+                download('http://images.example.com/image.png')
+        connect.assert_not_called()
+
+    @override_settings(AI_IMAGE_ALLOW_PRIVATE_HOSTS=True)
+    def test_connects_to_the_checked_address(self):
+        server = HTTPServer(('127.0.0.1', 0), ImageHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        # The connection goes to the checked address, not to a fresh lookup
+        # of the name.
+        with resolves_to('127.0.0.1') as resolve:
+            data, content_type = download(f'http://images.example.com:{server.server_port}/image.png')
+
+        self.assertEqual((data, content_type), (b'png bytes', 'image/png'))
+        self.assertEqual([call.args[0] for call in resolve.call_args_list], ['images.example.com', '127.0.0.1'])
+
+
+class PrefetchTests(TestCase):
+    """Images are stored once per content and fetched again after eviction."""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.store = ImageStore(root)
+        patcher = mock.patch.object(image_store, 'download', return_value=(b'same bytes', 'image/png'))
+        self.download = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def prefetch(self, *products):
+        return prefetch_images(products, log=lambda message: None, store=self.store)
+
+    def test_identical_images_are_stored_once(self):
+        first = Product.objects.create(name='First', image_urls=['https://a.example.com/1.png'])
+        second = Product.objects.create(name='Second', image_urls=['https://b.example.com/2.png'])
+
+        paths = self.prefetch(first, second)
+
+        self.assertEqual(StoredImage.objects.count(), 1)
+        self.assertEqual(paths[first.id], paths[second.id])
+        self.assertEqual(self.download.call_count, 2)
+
+    def test_url_fetched_for_another_product_is_reused(self):
+        first = Product.objects.create(name='First', image_urls=['https://a.example.com/1.png'])
+        second = Product.objects.create(name='Second', image_urls=['https://a.example.com/1.png'])
+
+        self.prefetch(first)
+        self.prefetch(second)
+
+        self.assertEqual(self.download.call_count, 1)
+        self.assertEqual(ProductImage.objects.filter(image__isnull=False).count(), 2)
+
+    def test_evicted_image_is_fetched_again(self):
+        product = Product.objects.create(name='Evicted', image_urls=['https://a.example.com/1.png'])
+        self.prefetch(product)
+        for sha256 in StoredImage.evict(0):
+            self.store.delete(sha256)
+
+        paths = self.prefetch(product)
+
+        self.assertEqual(self.download.call_count, 2)
+        self.assertEqual(len(paths[product.id]), 1)
+
+    def test_failed_fetch_is_not_retried_at_once(self):
+        product = Product.objects.create(name='Broken', image_urls=['https://a.example.com/1.png'])
+        self.download.side_effect = ImageFetchError('HTTP 500')
+
+        self.prefetch(product)
+        paths = self.prefetch(product)
+
+        self.assertEqual(self.download.call_count, 1)
+        self.assertEqual(paths[product.id], [])
@@ -0,0 +1,41 @@
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from products.models import Product, Category
+
+
+class ImportValidationTests(TestCase):
+    """Rows that would not fit the columns are skipped instead of failing the COPY."""
+
+    def run_import(self, text):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', encoding='utf-8') as stream:
+            stream.write(text)
+        self.addCleanup(os.remove, path)
+        out = io.StringIO()
+        call_command('import_products', path, stdout=out)
+        return out.getvalue()
+
+    def test_out_of_range_rows_are_skipped(self):
+        output = self.run_import(
+            'external_sku,name,category,price\n'
+            'ok-1,Fine,Shoes,12.50\n'
+            'big-price,Too expensive,Shoes,100000000\n'
+            'nan-price,Not a number,Shoes,NaN\n'
+            f"{'s' * 121},Long SKU,Shoes,1\n"
+            f"long-category,Long category,{'c' * 81},1\n"
+            'ok-2,Also fine,,99999999.99\n'
+        )
+
+        self.assertEqual(
+            sorted(Product.objects.values_list('external_sku', flat=True)), ['ok-1', 'ok-2']
+        )
+        self.assertFalse(Category.objects.filter(name='c' * 81).exists())
+        self.assertIn('4 skipped', output)
+        self.assertIn('Line 3: skipped, price', output)
+        self.assertIn('Line 5: skipped, external_sku longer than 120 characters', output)
+        self.assertIn('Line 6: skipped, category longer than 80 characters', output)
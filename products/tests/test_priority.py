@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from products.ai_pipeline import claim_ai_batch
+from products.models import Product, Category, AIJob
+
+
+@override_settings(AI_PRIORITY_NEW_DAYS=30, AI_PRIORITY_NEW_BONUS=50, AI_PRIORITY_PRICE_STEP=10, AI_PRIORITY_PRICE_CAP=5)
+class RefreshPrioritiesTests(TestCase):
+
+    def test_score_is_copied_onto_queued_jobs(self):
+        shoes = Category.objects.create(name='Shoes', ai_priority_weight=20)
+        product = Product.objects.create(name='Boot', category=shoes, price='35.00', priority_boost=7, status='pending_ai')
+        old = Product.objects.create(name='Old boot', category=shoes, price='999.00', status='pending_ai')
+        Product.objects.filter(id=old.id).update(created_at=timezone.now() - timedelta(days=60))
+        AIJob.enqueue([product.id, old.id])
+
+        changed = Product.refresh_priorities()
+
+        self.assertEqual(changed, 2)
+        # weight 20 + boost 7 + new 50 + price 3; the old one gets weight 20 + the capped price 5.
+        self.assertEqual(dict(Product.objects.values_list('id', 'priority')), {product.id: 80, old.id: 25})
+        self.assertEqual(dict(AIJob.objects.values_list('product_id', 'priority')), {product.id: 80, old.id: 25})
+
+    def test_only_pending_products_are_scored(self):
+        product = Product.objects.create(name='Done', priority_boost=7, status='ai_done')
+
+        self.assertEqual(Product.refresh_priorities(), 0)
+        product.refresh_from_db()
+        self.assertEqual(product.priority, 0)
+
+
+class ClaimOrderTests(TestCase):
+    """Claims take the highest priority first, but aging slots keep old work moving."""
+
+    def setUp(self):
+        # Oldest first: a low-priority product, then two newer high-priority ones.
+        self.low = Product.objects.create(name='Low', priority=1, status='pending_ai')
+        self.high = Product.objects.create(name='High', priority=100, status='pending_ai')
+        self.medium = Product.objects.create(name='Medium', priority=50, status='pending_ai')
+        AIJob.enqueue([self.low.id, self.high.id, self.medium.id])
+
+    def claimed_products(self, limit):
+        return [job.product_id for job in AIJob.claim('worker', limit, lease_seconds=300)]
+
+    @override_settings(AI_PRIORITY_AGING_SHARE=0)
+    def test_jobs_are_claimed_in_priority_order(self):
+        order = [self.claimed_products(1) for _ in range(3)]
+
+        self.assertEqual(order, [[self.high.id], [self.medium.id], [self.low.id]])
+
+    @override_settings(AI_PRIORITY_AGING_SHARE=0.5)
+    def test_aged_job_overtakes_a_newer_higher_priority_one(self):
+        self.assertEqual(set(self.claimed_products(2)), {self.low.id, self.high.id})
+        self.assertEqual(self.claimed_products(2), [self.medium.id])
+
+    @override_settings(AI_PRIORITY_AGING_SHARE=0)
+    def test_batch_claims_in_priority_order(self):
+        batch, products = claim_ai_batch(2, name='AI batch')
+
+        self.assertEqual({product.id for product in products}, {self.high.id, self.medium.id})
+
+    @override_settings(AI_PRIORITY_AGING_SHARE=0.5)
+    def test_batch_claim_keeps_an_aging_slot(self):
+        batch, products = claim_ai_batch(2, name='AI batch')
+
+        self.assertEqual({product.id for product in products}, {self.low.id, self.high.id})
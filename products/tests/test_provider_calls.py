@@ -0,0 +1,76 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from products.ai_control import processing_gate
+from products.ai_limits import get_limiter
+from products.ai_pipeline import run_provider_calls
+from products.ai_providers import ProviderAdapter, ProviderCall, ProviderResult
+from products.models import Product, Attribute, AIProvider
+
+
+class FakeAdapter(ProviderAdapter):
+    def __init__(self, provider, value=None, delay=0, error=None):
+        super().__init__(provider)
+        self.value, self.delay, self.error = value, delay, error
+
+    def call(self, call):
+        time.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return ProviderResult(call, self.value, 0.9, {'value': self.value}, None)
+
+
+@mock.patch.object(processing_gate, 'wait_until_running', return_value=True)
+class RunProviderCallsTests(SimpleTestCase):
+    def make_call(self, provider):
+        return ProviderCall(Product(id=1, name='Shirt'), Attribute(id=1, name='Color', data_type='text'), provider)
+
+    def test_hedged_answer_is_recorded_for_the_primary_provider(self, wait):
+        primary = AIProvider(id=91001, name='primary', config={})
+        backup = AIProvider(id=91002, name='backup', config={})
+        adapter = FakeAdapter(primary, error='boom')
+        adapter.backup = FakeAdapter(backup, value='blue')
+
+        result, = run_provider_calls([self.make_call(primary)], {primary.id: adapter})
+
+        self.assertIsNone(result.error)
+        self.assertEqual(result.suggested_value, 'blue')
+        self.assertEqual(result.call.provider.id, primary.id)
+        self.assertEqual(result.raw_response['answered_by'], backup.id)
+
+    def test_late_answer_after_deadline_keeps_breaker_open(self, wait):
+        provider = AIProvider(id=91003, name='slow', config={
+            'deadline_seconds': 0.1, 'breaker_failures': 1, 'breaker_reset_seconds': 60
+        })
+        adapter = FakeAdapter(provider, value='red', delay=0.3)
+
+        result, = run_provider_calls([self.make_call(provider)], {provider.id: adapter})
+        self.assertIn('deadline', result.error)
+        # Let the abandoned request finish in the background.
+        time.sleep(0.4)
+
+        self.assertEqual(get_limiter(provider).breaker.state, 'open')
+
+    def test_late_failure_after_deadline_is_counted_once(self, wait):
+        provider = AIProvider(id=91004, name='slow and broken', config={
+            'deadline_seconds': 0.1, 'breaker_failures': 3, 'breaker_reset_seconds': 60
+        })
+        adapter = FakeAdapter(provider, delay=0.3, error='boom')
+
+        result, = run_provider_calls([self.make_call(provider)], {provider.id: adapter})
+        self.assertIn('deadline', result.error)
+        time.sleep(0.4)
+
+        self.assertEqual(get_limiter(provider).breaker.consecutive_failures, 1)
+
+    def test_gate_is_started_on_the_calling_thread(self, wait):
+        threads = []
+        wait.side_effect = lambda *args: threads.append(threading.current_thread()) or True
+        provider = AIProvider(id=91005, name='fast', config={})
+
+        run_provider_calls([self.make_call(provider)], {provider.id: FakeAdapter(provider, value='red')})
+
+        self.assertIs(threads[0], threading.current_thread())
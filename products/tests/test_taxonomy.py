@@ -0,0 +1,33 @@
+from django.test import TestCase, override_settings
+
+from products.models import Category, Attribute, CategoryAttributeMapping
+from products.taxonomy import TaxonomyResolver
+
+
+@override_settings(TAXONOMY_CHECK_SECONDS=0)
+class TaxonomyVersionTests(TestCase):
+    """Mapping changes reach every process through the shared version stamp."""
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Shoes')
+        self.color = Attribute.objects.create(name='Color', data_type='text')
+        self.size = Attribute.objects.create(name='Size', data_type='text')
+        CategoryAttributeMapping.objects.create(category=self.category, attribute=self.color)
+        # Two resolvers stand for two processes.
+        self.web, self.worker = TaxonomyResolver(), TaxonomyResolver()
+
+    def test_change_is_visible_after_invalidation(self):
+        self.assertEqual(self.worker.current().attribute_ids_for(self.category.id), {self.color.id})
+
+        CategoryAttributeMapping.objects.create(category=self.category, attribute=self.size)
+        self.web.invalidate()
+
+        self.assertEqual(self.worker.current().attribute_ids_for(self.category.id), {self.color.id, self.size.id})
+
+    @override_settings(TAXONOMY_CHECK_SECONDS=3600)
+    def test_stamp_is_read_at_most_once_per_interval(self):
+        self.worker.current()
+        self.web.invalidate()
+
+        with self.assertNumQueries(0):
+            self.worker.current()
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.test import TestCase
+
+from products.models import Product, Attribute, AIConsensus, FinalAttribute, AttributeVersionHead
+
+
+class VersionedRecordTests(TestCase):
+    """Every record is a new version, and each pair keeps exactly one active row."""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='Shirt')
+        self.color = Attribute.objects.create(name='Color', data_type='text')
+        self.size = Attribute.objects.create(name='Size', data_type='text')
+
+    def consensus(self, attribute, value):
+        return {
+            'product_id': self.product.id, 'attribute_id': attribute.id,
+            'consensus_value': value, 'method': 'weighted_majority',
+        }
+
+    def final(self, attribute, value):
+        return {
+            'product_id': self.product.id, 'attribute_id': attribute.id,
+            'final_value': value, 'source': 'human',
+        }
+
+    def head(self, attribute):
+        return AttributeVersionHead.objects.get(product=self.product, attribute=attribute)
+
+    def assert_history(self, model, attribute, expected):
+        """``expected`` is ``[(version, is_active), ...]`` of the pair, oldest first."""
+        rows = model.objects.filter(product=self.product, attribute=attribute).order_by('version')
+        self.assertEqual([(row.version, row.is_active) for row in rows], expected)
+
+    def test_consensus_versions_advance(self):
+        for value in ('red', 'blue', 'green'):
+            with transaction.atomic():
+                AIConsensus.record_many([self.consensus(self.color, value), self.consensus(self.size, 'M')])
+
+        self.assert_history(AIConsensus, self.color, [(1, False), (2, False), (3, True)])
+        self.assert_history(AIConsensus, self.size, [(1, False), (2, False), (3, True)])
+        active = AIConsensus.objects.get(product=self.product, attribute=self.color, is_active=True)
+        self.assertEqual(active.consensus_value, 'green')
+        self.assertEqual((self.head(self.color).consensus_version, self.head(self.color).final_version), (3, 0))
+
+    def test_later_entry_for_a_pair_wins_within_one_call(self):
+        with transaction.atomic():
+            created = AIConsensus.record_many([self.consensus(self.color, 'red'), self.consensus(self.color, 'blue')])
+
+        self.assertEqual([(row.consensus_value, row.version) for row in created], [('blue', 1)])
+        self.assert_history(AIConsensus, self.color, [(1, True)])
+
+    def test_single_and_bulk_records_share_the_head(self):
+        AIConsensus.record(product=self.product, attribute=self.color, consensus_value='red', method='weighted_majority')
+        with transaction.atomic():
+            AIConsensus.record_many([self.consensus(self.color, 'blue')])
+        AIConsensus.record(product=self.product, attribute=self.color, consensus_value='green', method='weighted_majority')
+
+        self.assert_history(AIConsensus, self.color, [(1, False), (2, False), (3, True)])
+
+    def test_final_versions_advance_independently_of_consensus(self):
+        with transaction.atomic():
+            AIConsensus.record_many([self.consensus(self.color, 'red')])
+        for value in ('red', 'blue'):
+            with transaction.atomic():
+                FinalAttribute.record_many([self.final(self.color, value)])
+
+        self.assert_history(FinalAttribute, self.color, [(1, False), (2, True)])
+        self.assertEqual(
+            FinalAttribute.objects.get(product=self.product, attribute=self.color, is_active=True).final_value, 'blue'
+        )
+        self.assertEqual((self.head(self.color).consensus_version, self.head(self.color).final_version), (1, 2))
+        self.assertEqual(AttributeVersionHead.objects.count(), 1)
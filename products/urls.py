@@ -16,6 +16,7 @@ router.register(r'overlaps', OverlapComparisonViewSet, basename='overlap')
 router.register(r'missing-value-flags', MissingValueFlagViewSet, basename='missingvalueflag')
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 router.register(r'ai-processing', AIProcessingViewSet, basename='aiprocessing')
+router.register(r'images', StoredImageViewSet, basename='storedimage')
 
 urlpatterns = [
     path('', include(router.urls)),
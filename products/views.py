@@ -1,15 +1,27 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.authentication import BaseAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from django.conf import settings
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.contrib.auth.models import User, Group
-from django.db.models import Q, Count, Avg, Max
+from django.db.models import Q, Count, Avg, Max, Sum
 from django.utils import timezone
-from django.db import transaction, close_old_connections
-import random
-import threading
-import time
+from django.db import transaction
 from .models import *
 from .serializers import *
+from .ai_pipeline import claim_ai_batch
+from .ai_batching import AdaptiveBatchSizer
+from .progress import (
+    event_stream, make_stream_token, product_status_counts, publish_batch, publish_status_delta,
+    stream_token_user_id
+)
+from .image_store import ImageStore
+from .history import ARCHIVES, version_history
+from .taxonomy import taxonomy
 
 
 def _is_attribute_applicable(product, attribute_id):
@@ -29,7 +41,7 @@ def _required_attribute_ids(product):
     mapped_ids = CategoryAttributeMapping.get_attribute_ids_for_product(product)
     if mapped_ids:
         return mapped_ids
-    return list(Attribute.objects.values_list('id', flat=True))
+    return list(taxonomy.current().attribute_ids)
 
 class IsAdmin(permissions.BasePermission):
     def has_permission(self, request, view):
@@ -60,6 +72,37 @@ class ProductViewSet(viewsets.ModelViewSet):
             ).values_list('product_id', flat=True)
             return Product.objects.filter(id__in=batch_items)
         return Product.objects.none()
+    
+    def perform_create(self, serializer):
+        product = serializer.save()
+        Product.refresh_priorities([product.id])
+    
+    def perform_update(self, serializer):
+        product = serializer.save()
+        Product.refresh_priorities([product.id])
+    
+    @action(detail=True, methods=['get'], permission_classes=[IsAdmin])
+    def history(self, request, pk=None):
+        """Consensus and final attribute versions of a product, including archived ones unless ?archived=false"""
+        product = self.get_object()
+        attribute_id = request.query_params.get('attribute_id')
+        if attribute_id is not None and not attribute_id.isdigit():
+            return Response({"error": "attribute_id must be an integer"}, status=400)
+        kinds = request.query_params.getlist('kind') or list(ARCHIVES)
+        unknown = [kind for kind in kinds if kind not in ARCHIVES]
+        if unknown:
+            return Response({"error": f"Unknown history kind: {', '.join(unknown)}"}, status=400)
+        include_archived = request.query_params.get('archived', 'true').lower() not in ('false', '0', 'no')
+        
+        return Response({
+            kind: version_history(
+                kind,
+                product.id,
+                attribute_id=int(attribute_id) if attribute_id is not None else None,
+                include_archived=include_archived
+            )
+            for kind in kinds
+        })
 
 class AttributeViewSet(viewsets.ModelViewSet):
     queryset = Attribute.objects.all()
@@ -128,29 +171,26 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'], permission_classes=[IsAdmin])
     def start_auto_ai_processing(self, request):
         """Start automated AI processing - processes all pending products in batches"""
-        batch_size = request.data.get('batch_size', 10)
-        
-        allowed_sizes = [10, 15, 20, 25, 30]
-        if batch_size not in allowed_sizes:
-            return Response({"error": f"batch_size must be one of {allowed_sizes}"}, status=400)
+        # Workers size batches adaptively; a batch_size here is only used for the estimate.
+        serializer = StartAutoAISerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        batch_size = serializer.validated_data.get('batch_size')
+        estimate_size = batch_size or AdaptiveBatchSizer().size
         
         pending_count = Product.objects.filter(status='pending_ai').count()
         
         if pending_count == 0:
             return Response({"message": "No pending products for AI processing"}, status=400)
         
-        # Start automated processing in background
-        thread = threading.Thread(
-            target=self.auto_process_all_batches,
-            args=(batch_size,)
-        )
-        thread.daemon = True
-        thread.start()
+        # Queue the products; run_ai_worker processes drain the queue
+        queued_count = AIJob.enqueue_pending()
         
         return Response({
-            "message": f"Automated AI processing started for {pending_count} products",
-            "batch_size": batch_size,
-            "estimated_batches": (pending_count + batch_size - 1) // batch_size
+            "message": f"Automated AI processing queued for {pending_count} products",
+            "batch_size": batch_size or "adaptive",
+            "queued_jobs": queued_count,
+            "estimated_batches": (pending_count + estimate_size - 1) // estimate_size
         })
     
     @action(detail=False, methods=['post'], permission_classes=[IsAdmin])
@@ -187,32 +227,19 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
         
         batch_size = serializer.validated_data['batch_size']
         
-        pending_products = list(Product.objects.filter(status='pending_ai')[:batch_size])
-        
-        if not pending_products:
-            return Response({"message": "No pending products for AI processing"}, status=400)
-        
-        batch = AnnotationBatch.objects.create(
-            name=f"AI Batch - {timezone.now().strftime('%Y-%m-%d %H:%M')}",
-            batch_type='ai',
-            status='in_progress',
-            batch_size=len(pending_products)
-        )
-        
-        product_ids = [product.id for product in pending_products]
-        
-        for product in pending_products:
-            BatchItem.objects.create(batch=batch, product=product)
-        
-        Product.objects.filter(id__in=product_ids).update(status='ai_running')
-        
-        # Start processing in background
-        thread = threading.Thread(target=self.process_ai_batch, args=(batch.id, product_ids))
-        thread.daemon = True
-        thread.start()
+        with transaction.atomic():
+            batch, pending_products = claim_ai_batch(
+                batch_size,
+                name=f"AI Batch - {timezone.now().strftime('%Y-%m-%d %H:%M')}"
+            )
+            if batch is None:
+                return Response({"message": "No pending products for AI processing"}, status=400)
+            
+            # Queue the batch; a run_ai_worker process picks it up
+            AIJob.enqueue([product.id for product in pending_products], batch=batch)
         
         return Response({
-            "message": f"AI batch started with {len(pending_products)} products",
+            "message": f"AI batch queued with {len(pending_products)} products",
             "batch_id": batch.id
         })
     
@@ -242,7 +269,8 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
         for product in ai_done_products:
             BatchItem.objects.create(batch=batch, product=product)
         
-        Product.objects.filter(id__in=product_ids).update(status='assigned')
+        assigned = Product.objects.filter(id__in=product_ids, status='ai_done').update(status='assigned')
+        publish_status_delta('ai_done', 'assigned', assigned)
         
         return Response({
             "message": f"Annotator review batch created with {len(ai_done_products)} products",
@@ -355,8 +383,10 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
                             # Use BatchItemViewSet's validation method
                             batch_item_viewset = BatchItemViewSet()
                             if batch_item_viewset.validate_status_transition(product.status, 'reviewed'):
+                                previous_status = product.status
                                 product.status = 'reviewed'
                                 product.save()
+                                publish_status_delta(previous_status, 'reviewed', 1)
                                 products_updated += 1
                 
                 # Mark batch as reviewed and ready for finalization (keep status as completed)
@@ -399,8 +429,10 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
                     if product.status in ['in_review', 'reviewed']:
                         batch_item_viewset = BatchItemViewSet()
                         if batch_item_viewset.validate_status_transition(product.status, 'assigned'):
+                            previous_status = product.status
                             product.status = 'assigned'
                             product.save()
+                            publish_status_delta(previous_status, 'assigned', 1)
             
             return Response({
                 "message": f"Batch {batch.name} rejected and reset for rework",
@@ -510,7 +542,8 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
         
         # Update product statuses
         product_ids = [p.id for p in ai_done_products]
-        Product.objects.filter(id__in=product_ids).update(status='assigned')
+        assigned = Product.objects.filter(id__in=product_ids, status='ai_done').update(status='assigned')
+        publish_status_delta('ai_done', 'assigned', assigned)
         
         # Mark parent batch as completed
         parent_batch.status = 'completed'
@@ -521,206 +554,6 @@ class AnnotationBatchViewSet(viewsets.ModelViewSet):
             "parent_batch_id": parent_batch.id,
             "assigned_batches": created_batches
         })
-    
-    def auto_process_all_batches(self, batch_size):
-        """Automatically process all pending products in batches"""
-        from .models import AIProcessingControl
-        # IMPORTANT: this runs in a background thread. Make sure this thread
-        # does not leak database connections by explicitly closing any
-        # inherited/old connections before and after the processing loop.
-        close_old_connections()
-        try:
-            while True:
-                # Check if processing is paused
-                control = AIProcessingControl.get_control()
-                if control.is_paused:
-                    print("AI processing is paused. Waiting...")
-                    time.sleep(5)  # Check every 5 seconds
-                    continue
-                
-                # Check for pending products with race condition protection
-                with transaction.atomic():
-                    pending_products = list(
-                        Product.objects.select_for_update()
-                        .filter(status='pending_ai')[:batch_size]
-                    )
-                    
-                    if not pending_products:
-                        print("No more pending products. Auto-processing completed.")
-                        break
-                    
-                    product_ids = [product.id for product in pending_products]
-                    
-                    # Create batch
-                    batch = AnnotationBatch.objects.create(
-                        name=f"Auto AI Batch - {timezone.now().strftime('%Y-%m-%d %H:%M')}",
-                        batch_type='ai',
-                        status='in_progress',
-                        batch_size=len(pending_products)
-                    )
-                    
-                    for product in pending_products:
-                        BatchItem.objects.create(batch=batch, product=product)
-                    
-                    # Update status atomically
-                    Product.objects.filter(id__in=product_ids).update(status='ai_running')
-                
-                print(f"Processing batch {batch.id} with {len(pending_products)} products")
-                
-                # Process this batch synchronously
-                self.simulate_ai_processing(batch.id, product_ids)
-                
-                # Small delay between batches
-                time.sleep(1)
-                
-        except Exception as e:
-            print(f"Error in auto_process_all_batches: {e}")
-        finally:
-            # Ensure any DB connections held by this worker thread are
-            # released back to Django/psycopg2 and do not consume slots.
-            close_old_connections()
-    
-    def process_ai_batch(self, batch_id, product_ids):
-        """Process AI batch with proper error handling"""
-        try:
-            thread = threading.Thread(
-                target=self.simulate_ai_processing,
-                args=(batch_id, product_ids),
-            )
-            thread.daemon = True
-            thread.start()
-        except Exception as e:
-            batch = AnnotationBatch.objects.get(id=batch_id)
-            batch.status = 'completed'
-            batch.progress = 100
-            batch.save()
-            print(f"AI processing error: {e}")
-    
-    def simulate_ai_processing(self, batch_id, product_ids):
-        """Simulate AI processing - replace with actual AI calls"""
-        # This method is executed inside a background thread created by
-        # process_ai_batch / auto_process_all_batches. We must ensure that
-        # any database connections used here are properly managed to avoid
-        # exhausting PostgreSQL connection slots.
-        close_old_connections()
-        try:
-            batch = AnnotationBatch.objects.get(id=batch_id)
-            products = Product.objects.filter(id__in=product_ids)
-            
-            ai_providers = list(AIProvider.objects.filter(is_active=True))
-            
-            print(f"Starting AI batch {batch_id} processing for {len(products)} products")
-            
-            for index, product in enumerate(products):
-                print(f"Processing product {index+1}/{len(products)}: {product.name}")
-                
-                time.sleep(2)  # Simulate processing time
-                
-                applicable_attributes = list(product.get_applicable_attributes())
-                if not applicable_attributes:
-                    continue
-                
-                for attribute in applicable_attributes:
-                    for provider in ai_providers:
-                        suggested_value = self.generate_ai_suggestion(product, attribute, provider)
-                        confidence = round(random.uniform(0.7, 0.95), 4)
-                        
-                        AISuggestion.objects.create(
-                            product=product,
-                            attribute=attribute,
-                            provider=provider,
-                            suggested_value=suggested_value,
-                            confidence_score=confidence,
-                            raw_response={
-                                'model': provider.model,
-                                'suggestion': suggested_value,
-                                'confidence': float(confidence)
-                            }
-                        )
-                    
-                    # Create consensus
-                    suggestions = AISuggestion.objects.filter(product=product, attribute=attribute)
-                    if suggestions:
-                        consensus_value = self.build_consensus(suggestions)
-                        AIConsensus.record(
-                            product=product,
-                            attribute=attribute,
-                            consensus_value=consensus_value,
-                            method='weighted_majority',
-                            confidence=round(random.uniform(0.8, 0.98), 4)
-                        )
-                
-                product.status = 'ai_done'
-                product.save()
-                
-                progress = ((index + 1) / len(products)) * 100
-                batch.progress = progress
-                batch.save()
-                
-                print(f"Completed product {index+1}/{len(products)} - Progress: {progress}%")
-            
-            batch.status = 'completed'
-            batch.progress = 100
-            batch.save()
-            
-            print(f"AI batch {batch_id} completed successfully")
-            
-        except Exception as e:
-            try:
-                batch = AnnotationBatch.objects.get(id=batch_id)
-                batch.status = 'completed'
-                batch.save()
-            except:
-                pass
-            print(f"Background AI processing error: {e}")
-        finally:
-            # Close DB connections held by this thread so they do not linger
-            # after processing finishes.
-            close_old_connections()
-    
-    def generate_ai_suggestion(self, product, attribute, provider):
-        """Generate realistic AI suggestions based on product information"""
-        if attribute.name == 'Color':
-            colors = ['Red', 'Blue', 'Green', 'Black', 'White', 'Yellow', 'Pink', 'Purple', 'Orange', 'Gray']
-            return random.choice(colors)
-        elif attribute.name == 'Size':
-            sizes = ['XS', 'S', 'M', 'L', 'XL', 'XXL']
-            return random.choice(sizes)
-        elif attribute.name == 'Material':
-            materials = ['Cotton', 'Polyester', 'Silk', 'Wool', 'Linen', 'Denim', 'Leather', 'Nylon']
-            return random.choice(materials)
-        elif attribute.name == 'Sleeve Length':
-            sleeves = ['Short', 'Long', 'Sleeveless', 'Three-Quarter']
-            return random.choice(sleeves)
-        elif attribute.name == 'Gender':
-            return random.choice(['Men', 'Women', 'Unisex'])
-        elif attribute.name == 'Season':
-            seasons = ['Spring', 'Summer', 'Fall', 'Winter', 'All Season']
-            return random.choice(seasons)
-        elif attribute.name == 'Pattern':
-            patterns = ['Solid', 'Striped', 'Printed', 'Floral', 'Checkered', 'Plaid', 'Graphic']
-            return random.choice(patterns)
-        elif attribute.name == 'Fit':
-            fits = ['Slim', 'Regular', 'Loose', 'Oversized', 'Skinny']
-            return random.choice(fits)
-        elif attribute.name == 'Neckline':
-            necklines = ['Round', 'V-Neck', 'Collar', 'Boat Neck', 'Square']
-            return random.choice(necklines)
-        else:
-            return f"AI suggested {attribute.name}"
-    
-    def build_consensus(self, suggestions):
-        """Build consensus from multiple AI provider suggestions"""
-        if not suggestions:
-            return ""
-        
-        value_counts = {}
-        for suggestion in suggestions:
-            value = suggestion.suggested_value
-            confidence = float(suggestion.confidence_score)
-            value_counts[value] = value_counts.get(value, 0) + confidence
-        
-        return max(value_counts.items(), key=lambda x: x[1])[0]
 
 class BatchItemViewSet(viewsets.ModelViewSet):
     queryset = BatchItem.objects.all()
@@ -729,10 +562,12 @@ class BatchItemViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         user = self.request.user
+        # The serializer nests the product; the actions read the batch.
+        items = BatchItem.objects.select_related('product', 'batch')
         if user.groups.filter(name='Admin').exists():
-            return BatchItem.objects.all()
+            return items
         elif user.groups.filter(name='Annotator').exists():
-            return BatchItem.objects.filter(batch__assigned_to=user)
+            return items.filter(batch__assigned_to=user)
         return BatchItem.objects.none()
     
     @action(detail=True, methods=['post'], permission_classes=[IsAnnotator])
@@ -748,8 +583,10 @@ class BatchItemViewSet(viewsets.ModelViewSet):
             
             # Set product to in_review when work starts (validate transition)
             if self.validate_status_transition(batch_item.product.status, 'in_review'):
+                previous_status = batch_item.product.status
                 batch_item.product.status = 'in_review'
                 batch_item.product.save()
+                publish_status_delta(previous_status, 'in_review', 1)
         
         serializer = self.get_serializer(batch_item)
         return Response(serializer.data)
@@ -775,6 +612,7 @@ class BatchItemViewSet(viewsets.ModelViewSet):
                 if batch.items.filter(status='done').count() == batch.items.count():
                     batch.status = 'completed'
                     batch.save()
+                    publish_batch(batch)
                     
                     # Automatically approve all annotations in this completed batch
                     batch_items = batch.items.filter(status='done')
@@ -822,27 +660,37 @@ class BatchItemViewSet(viewsets.ModelViewSet):
                 if total_items > 0 and completed_items == total_items:
                     # Validate status transition
                     if self.validate_status_transition(product.status, 'reviewed'):
+                        previous_status = product.status
                         product.status = 'reviewed'
                         product.save()
+                        publish_status_delta(previous_status, 'reviewed', 1)
                         
                         # Also check for overlaps
                         self.check_for_overlaps(product)
                 elif completed_items > 0:
                     # At least one review is done, but not all
                     if self.validate_status_transition(product.status, 'in_review'):
+                        previous_status = product.status
                         product.status = 'in_review'
                         product.save()
+                        publish_status_delta(previous_status, 'in_review', 1)
         
         serializer = self.get_serializer(batch_item)
         return Response(serializer.data)
     
     def update_batch_progress(self, batch):
         """Update batch progress percentage"""
-        total_items = batch.items.count()
-        completed_items = batch.items.filter(status='done').count()
-        if total_items > 0:
-            batch.progress = (completed_items / total_items) * 100
-            batch.save()
+        totals = batch.items.aggregate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='done'))
+        )
+        if totals['total'] > 0:
+            batch.progress = (totals['completed'] / totals['total']) * 100
+            AnnotationBatch.objects.filter(id=batch.id).update(
+                progress=batch.progress,
+                updated_at=timezone.now()
+            )
+            publish_batch(batch)
     
     def validate_status_transition(self, current_status, new_status):
         """Validate if status transition is allowed"""
@@ -1058,6 +906,7 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
                 finalized_count = 0
                 finalized_products = []
                 errors = []
+                decisions = []
                 
                 for product in products_to_finalize:
                     # If product is in 'reviewed' status, automatically approve any 'suggested' annotations
@@ -1113,7 +962,6 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
                     
                     # Finalize each attribute
                     for attr_id, annotations in annotations_by_attr.items():
-                        attribute_obj = annotations[0].attribute
                         final_value = None
                         source = 'human'
                         
@@ -1169,14 +1017,14 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
                                 source = 'human'
                         
                         if final_value:
-                            FinalAttribute.record(
-                                product=product,
-                                attribute=attribute_obj,
-                                final_value=final_value,
-                                source=source,
-                                decided_by=request.user,
-                                confidence_score=1.0
-                            )
+                            decisions.append({
+                                'product_id': product.id,
+                                'attribute_id': attr_id,
+                                'final_value': final_value,
+                                'source': source,
+                                'decided_by': request.user,
+                                'confidence_score': 1.0
+                            })
                     
                     # Mark product as finalized
                     product.status = 'finalized'
@@ -1188,6 +1036,10 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
                         'product_name': product.name
                     })
                 
+                # Every finalized attribute is written in one set-based round trip.
+                FinalAttribute.record_many(decisions)
+                publish_status_delta('reviewed', 'finalized', finalized_count)
+                
                 if finalized_count == 0:
                     error_message = "No products were finalized."
                     if errors:
@@ -1248,8 +1100,8 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
             human_annotations = HumanAnnotation.objects.filter(
                 product=product,
                 status='approved'
-            )
-            applicable_attr_ids = CategoryAttributeMapping.get_attribute_ids_for_product(product)
+            ).select_related('attribute', 'annotator')
+            applicable_attr_ids = CategoryAttributeMapping.attribute_ids_for_products([product])[product.id]
             if applicable_attr_ids:
                 human_annotations = human_annotations.filter(attribute_id__in=applicable_attr_ids)
             
@@ -1269,7 +1121,7 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
             ai_consensus_list = AIConsensus.objects.filter(
                 product=product,
                 is_active=True
-            )
+            ).select_related('attribute')
             if applicable_attr_ids:
                 ai_consensus_list = ai_consensus_list.filter(attribute_id__in=applicable_attr_ids)
             
@@ -1340,45 +1192,59 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
         """Finalize all products in reviewed status"""
         try:
             with transaction.atomic():
-                reviewed_products = Product.objects.filter(status='reviewed')
+                reviewed_products = list(Product.objects.filter(status='reviewed'))
                 
-                if not reviewed_products.exists():
+                if not reviewed_products:
                     return Response({
                         "message": "No reviewed products to finalize"
                     }, status=200)
                 
+                # Applicability, annotations and attribute names for every
+                # product at once; the loop below works in memory.
+                applicable_by_product = CategoryAttributeMapping.attribute_ids_for_products(reviewed_products)
+                required_by_product = CategoryAttributeMapping.attribute_ids_for_products(
+                    reviewed_products,
+                    required_only=True
+                )
+                annotations_by_product = {}
+                for annotation in HumanAnnotation.objects.filter(
+                    product_id__in=[product.id for product in reviewed_products]
+                ).only('id', 'product_id', 'attribute_id', 'status', 'annotated_value').order_by('id'):
+                    annotations_by_product.setdefault(annotation.product_id, []).append(annotation)
+                attribute_names = dict(Attribute.objects.values_list('id', 'name'))
+                all_attribute_ids = taxonomy.current().attribute_ids
+                
                 finalized_count = 0
                 finalized_products = []
                 errors = []
+                decisions = []
                 
                 for product in reviewed_products:
+                    applicable_attr_ids = applicable_by_product[product.id]
+                    all_annotations = [
+                        annotation for annotation in annotations_by_product.get(product.id, [])
+                        if not applicable_attr_ids or annotation.attribute_id in applicable_attr_ids
+                    ]
                     # Get all approved human annotations for this product
-                    human_annotations = HumanAnnotation.objects.filter(
-                        product=product,
-                        status='approved'
-                    )
-                    applicable_attr_ids = CategoryAttributeMapping.get_attribute_ids_for_product(product)
-                    if applicable_attr_ids:
-                        human_annotations = human_annotations.filter(attribute_id__in=applicable_attr_ids)
+                    human_annotations = [annotation for annotation in all_annotations if annotation.status == 'approved']
                     
-                    if not human_annotations.exists():
-                        all_annotations = HumanAnnotation.objects.filter(product=product)
-                        if applicable_attr_ids:
-                            all_annotations = all_annotations.filter(attribute_id__in=applicable_attr_ids)
-                        if all_annotations.exists():
+                    if not human_annotations:
+                        if all_annotations:
                             errors.append(f"Product '{product.name}' has annotations but none are approved.")
                         else:
                             errors.append(f"Product '{product.name}' has no annotations.")
                         continue
                     
                     # Validate that all required attributes are annotated
-                    annotated_attribute_ids = set(human_annotations.values_list('attribute_id', flat=True))
-                    required_attr_ids = _required_attribute_ids(product)
-                    required_attributes = Attribute.objects.filter(id__in=required_attr_ids)
-                    missing_attributes = required_attributes.exclude(id__in=annotated_attribute_ids)
+                    annotated_attribute_ids = {annotation.attribute_id for annotation in human_annotations}
+                    required_attr_ids = required_by_product[product.id] or applicable_attr_ids or all_attribute_ids
+                    missing_names = sorted(
+                        attribute_names[attr_id]
+                        for attr_id in required_attr_ids - annotated_attribute_ids
+                        if attr_id in attribute_names
+                    )
                     
-                    if missing_attributes.exists():
-                        missing_names = list(missing_attributes.values_list('name', flat=True))
+                    if missing_names:
                         errors.append(f"Product '{product.name}' - missing annotations for attributes: {', '.join(missing_names)}")
                         continue
                     
@@ -1403,18 +1269,14 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
                             final_value = annotations[0].annotated_value
                             source = 'human'
                         
-                        attribute_obj = annotations[0].attribute
-                        FinalAttribute.record(
-                            product=product,
-                            attribute=attribute_obj,
-                            final_value=final_value,
-                            source=source,
-                            decided_by=request.user,
-                            confidence_score=1.0
-                        )
-                    
-                    product.status = 'finalized'
-                    product.save()
+                        decisions.append({
+                            'product_id': product.id,
+                            'attribute_id': attr_id,
+                            'final_value': final_value,
+                            'source': source,
+                            'decided_by': request.user,
+                            'confidence_score': 1.0
+                        })
                     
                     finalized_count += 1
                     finalized_products.append({
@@ -1422,6 +1284,13 @@ class FinalAttributeViewSet(viewsets.ModelViewSet):
                         'product_name': product.name
                     })
                 
+                FinalAttribute.record_many(decisions)
+                finalized = Product.objects.filter(
+                    id__in=[finalized['product_id'] for finalized in finalized_products],
+                    status='reviewed'
+                ).update(status='finalized', updated_at=timezone.now())
+                publish_status_delta('reviewed', 'finalized', finalized)
+                
                 response_data = {
                     "message": f"Successfully finalized {finalized_count} product(s)",
                     "finalized_count": finalized_count,
@@ -1916,34 +1785,152 @@ class MissingValueFlagViewSet(viewsets.ModelViewSet):
             "flag": MissingValueFlagSerializer(flag).data
         })
 
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF accept ``Accept: text/event-stream`` for streaming actions."""
+    media_type = 'text/event-stream'
+    format = 'sse'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class StreamTokenAuthentication(BaseAuthentication):
+    """Authenticates ``?token=`` from ``stream-token``, for EventSource clients."""
+
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        user = User.objects.filter(id=stream_token_user_id(token), is_active=True).first()
+        if user is None:
+            raise AuthenticationFailed('Invalid or expired stream token')
+        return user, None
+
+
 class AIProcessingViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated & IsAdmin]
     
-    @action(detail=False, methods=['get'])
-    def status(self, request):
-        """Get current AI processing status"""
-        from .models import AIProcessingControl
-        
+    def _status_snapshot(self):
         control = AIProcessingControl.get_control()
         ai_running_batches = AnnotationBatch.objects.filter(
             batch_type='ai',
             status='in_progress'
         ).count()
+        counts = product_status_counts()
+        cache_stats = AIResponseCache.objects.aggregate(entries=Count('id'), hits=Sum('hit_count'))
         
-        pending_products = Product.objects.filter(status='pending_ai').count()
-        ai_running_products = Product.objects.filter(status='ai_running').count()
-        ai_done_products = Product.objects.filter(status='ai_done').count()
-        
-        return Response({
+        return {
             'active_batches': ai_running_batches,
-            'pending_products': pending_products,
-            'processing_products': ai_running_products,
-            'completed_products': ai_done_products,
+            'pending_products': counts['pending_ai'],
+            'processing_products': counts['ai_running'],
+            'completed_products': counts['ai_done'],
+            'products_by_status': counts,
             'is_processing': ai_running_batches > 0 and not control.is_paused,
             'is_paused': control.is_paused,
-            'paused_at': control.paused_at.isoformat() if control.paused_at else None
+            'paused_at': control.paused_at.isoformat() if control.paused_at else None,
+            'response_cache': {
+                'entries': cache_stats['entries'],
+                'hits': cache_stats['hits'] or 0
+            }
+        }
+    
+    @action(detail=False, methods=['get'])
+    def status(self, request):
+        """Get current AI processing status"""
+        return Response(self._status_snapshot())
+    
+    @action(detail=False, methods=['post'], url_path='stream-token')
+    def stream_token(self, request):
+        """Short-lived token that opens ``stream`` as ``?token=``, for EventSource."""
+        return Response({
+            'token': make_stream_token(request.user),
+            'expires_in': getattr(settings, 'AI_STREAM_TOKEN_SECONDS', 60)
+        })
+    
+    @action(
+        detail=False,
+        methods=['get'],
+        renderer_classes=[EventStreamRenderer, JSONRenderer],
+        authentication_classes=[StreamTokenAuthentication, JWTAuthentication]
+    )
+    def stream(self, request):
+        """
+        Server-Sent Events: a status snapshot, then batch progress and
+        product-status deltas as they happen. ``?batch_id=`` limits batch
+        events to one batch. Authenticates with the JWT header or with
+        ``?token=`` from ``stream-token``; ends after AI_STREAM_MAX_SECONDS.
+        """
+        batch_id = request.query_params.get('batch_id')
+        try:
+            batch_id = int(batch_id) if batch_id else None
+        except ValueError:
+            return Response({"error": "batch_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        def snapshot():
+            data = self._status_snapshot()
+            batches = AnnotationBatch.objects.filter(status='in_progress')
+            if batch_id is not None:
+                batches = AnnotationBatch.objects.filter(id=batch_id)
+            data['batches'] = list(batches.values('id', 'batch_type', 'status', 'progress'))
+            return data
+        
+        response = StreamingHttpResponse(event_stream(snapshot, batch_id=batch_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @action(detail=False, methods=['get'], url_path='stage-timings')
+    def stage_timings(self, request):
+        """
+        Per-stage timings of recent AI batches (``?limit=``, default 20) or of
+        one batch (``?batch_id=``), with the stage totals across them.
+        """
+        stats = AIBatchStats.objects.select_related('batch')
+        batch_id = request.query_params.get('batch_id')
+        try:
+            if batch_id:
+                stats = stats.filter(batch_id=int(batch_id))
+            else:
+                stats = stats[:max(1, min(int(request.query_params.get('limit', 20)), 200))]
+        except ValueError:
+            return Response({"error": "batch_id and limit must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        stats = list(stats)
+        
+        stages = {}
+        for row in stats:
+            for stage, timing in row.stages.items():
+                totals = stages.setdefault(stage, {'seconds': 0.0, 'count': 0})
+                totals['seconds'] += timing['seconds']
+                totals['count'] += timing['count']
+        total_seconds = sum(totals['seconds'] for totals in stages.values())
+        for totals in stages.values():
+            totals['seconds'] = round(totals['seconds'], 4)
+            totals['share'] = round(totals['seconds'] / total_seconds, 4) if total_seconds else 0.0
+        
+        return Response({
+            'batches': AIBatchStatsSerializer(stats, many=True).data,
+            'stages': dict(sorted(stages.items(), key=lambda item: -item[1]['seconds'])),
+            'slowest_stage': max(stages, key=lambda stage: stages[stage]['seconds']) if stages else None,
         })
 
+class StoredImageViewSet(viewsets.ViewSet):
+    """Product images from the local image store, by SHA-256."""
+    
+    def retrieve(self, request, pk=None):
+        image = StoredImage.objects.filter(sha256=pk).first()
+        if image is None:
+            raise Http404("Image not in the local store")
+        try:
+            # Eviction may delete the file at any time, so open instead of checking first.
+            stream = open(ImageStore().path(image.sha256), 'rb')
+        except FileNotFoundError:
+            raise Http404("Image not in the local store")
+        StoredImage.touch([image.id])
+        response = FileResponse(stream, content_type=image.content_type or None)
+        # Content-addressed, so the bytes behind a name never change.
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+
 class AIProviderViewSet(viewsets.ModelViewSet):
     """ViewSet for managing AI providers (admin only)"""
     queryset = AIProvider.objects.all()